@@ -1,71 +1,132 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+from app.core.pagination import decode_cursor, keyset_after, next_cursor
+from app.core.serialization import discovery_row_to_dict, query_discovery_rows
+from app.core.sse import SSE_HEADERS
 from app.db.database import get_db
-from app.models.element import DiscoveryHistory, Element, player_elements
+from app.models.element import DiscoveryHistory, DBElement, player_elements
 from app.schemas.element import DiscoveryHistory as DiscoveryHistorySchema
 from app.schemas.element import DiscoveryHistoryList, DiscoveryHistoryCreate
+from app.services.discovery_feed import DiscoveryFeed
+from app.services.player_cache import ensure_player, get_player_id
 
 router = APIRouter()
+discovery_feed = DiscoveryFeed()
+discovery_feed.attach()
+
+def paginate_discoveries(query, skip: int, limit: int, cursor: Optional[str]):
+    """
+    Order a discovery query newest first and return one page of it.
+    
+    With a cursor the page starts strictly after the `(discovered_at, id)` it
+    encodes, otherwise `skip` is used as a plain offset.
+    """
+    query = query.order_by(DiscoveryHistory.discovered_at.desc(), DiscoveryHistory.id.desc())
+    if cursor:
+        values = decode_cursor(cursor, 2)
+        query = query.filter(
+            keyset_after([DiscoveryHistory.discovered_at, DiscoveryHistory.id], values, descending=True)
+        )
+    else:
+        query = query.offset(skip)
+    
+    rows = query.limit(limit).all()
+    return {
+        "discoveries": [discovery_row_to_dict(row) for row in rows],
+        "next_cursor": next_cursor(rows, limit, "discovered_at", "id"),
+    }
 
 @router.get("/", response_model=DiscoveryHistoryList)
-def get_discoveries(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_discoveries(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
     """
     Get all element discoveries with pagination.
     """
-    discoveries = db.query(DiscoveryHistory).order_by(DiscoveryHistory.discovered_at.desc()).offset(skip).limit(limit).all()
-    return {"discoveries": discoveries}
+    return paginate_discoveries(query_discovery_rows(db), skip, limit, cursor)
 
 @router.get("/first", response_model=DiscoveryHistoryList)
-def get_first_discoveries(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_first_discoveries(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
     """
     Get all first discoveries (elements that were discovered for the first time).
     """
-    discoveries = db.query(DiscoveryHistory).filter(
+    query = query_discovery_rows(db).filter(
         DiscoveryHistory.is_first_discovery == True
-    ).order_by(DiscoveryHistory.discovered_at.desc()).offset(skip).limit(limit).all()
+    )
+    
+    return paginate_discoveries(query, skip, limit, cursor)
+
+@router.get("/first/stream")
+async def stream_first_discoveries(request: Request, last_id: Optional[int] = None):
+    """
+    Push first discoveries as Server-Sent Events as soon as they are committed.
+    
+    Each `discovery` event has the `DiscoveryHistory` fields and the discovery
+    id as its SSE id. To resume, pass the last id seen as `last_id` (browsers
+    send it as `Last-Event-ID` automatically); recent discoveries are replayed
+    from memory. Clients that fall too far behind are disconnected and should
+    reconnect the same way.
+    """
+    if last_id is None:
+        header = request.headers.get("last-event-id", "")
+        last_id = int(header) if header.isdigit() else None
     
-    return {"discoveries": discoveries}
+    subscriber = discovery_feed.subscribe(last_id)
+    return StreamingResponse(discovery_feed.stream(subscriber), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.get("/player/{player_name}", response_model=DiscoveryHistoryList)
-def get_player_discoveries(player_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_player_discoveries(
+    player_name: str, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
     """
     Get all discoveries by a specific player.
     """
-    discoveries = db.query(DiscoveryHistory).filter(
-        DiscoveryHistory.player_name == player_name
-    ).order_by(DiscoveryHistory.discovered_at.desc()).offset(skip).limit(limit).all()
+    player_id = get_player_id(db, player_name)
+    if player_id is None:
+        return {"discoveries": [], "next_cursor": None}
+    
+    query = query_discovery_rows(db).filter(
+        DiscoveryHistory.player_id == player_id
+    )
     
-    return {"discoveries": discoveries}
+    return paginate_discoveries(query, skip, limit, cursor)
 
 @router.get("/player/{player_name}/first", response_model=DiscoveryHistoryList)
-def get_player_first_discoveries(player_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_player_first_discoveries(
+    player_name: str, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
     """
     Get all first discoveries by a specific player (elements they discovered first).
     """
-    discoveries = db.query(DiscoveryHistory).filter(
-        DiscoveryHistory.player_name == player_name,
+    player_id = get_player_id(db, player_name)
+    if player_id is None:
+        return {"discoveries": [], "next_cursor": None}
+    
+    query = query_discovery_rows(db).filter(
+        DiscoveryHistory.player_id == player_id,
         DiscoveryHistory.is_first_discovery == True
-    ).order_by(DiscoveryHistory.discovered_at.desc()).offset(skip).limit(limit).all()
+    )
     
-    return {"discoveries": discoveries}
+    return paginate_discoveries(query, skip, limit, cursor)
 
 @router.get("/element/{element_id}", response_model=DiscoveryHistoryList)
-def get_element_discoveries(element_id: int, db: Session = Depends(get_db)):
+def get_element_discoveries(
+    element_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
     """
     Get discovery history for a specific element.
     """
     # Check if element exists
-    element = db.query(Element).filter(Element.id == element_id).first()
+    element = db.query(DBElement.id).filter(DBElement.id == element_id).first()
     if not element:
         raise HTTPException(status_code=404, detail="Element not found")
     
-    discoveries = db.query(DiscoveryHistory).filter(
+    query = query_discovery_rows(db).filter(
         DiscoveryHistory.element_id == element_id
-    ).order_by(DiscoveryHistory.discovered_at.desc()).all()
+    )
     
-    return {"discoveries": discoveries}
+    return paginate_discoveries(query, skip, limit, cursor)
 
 @router.get("/element/{element_id}/first", response_model=DiscoveryHistorySchema)
 def get_element_first_discovery(element_id: int, db: Session = Depends(get_db)):
@@ -73,11 +134,11 @@ def get_element_first_discovery(element_id: int, db: Session = Depends(get_db)):
     Get the first discovery of a specific element.
     """
     # Check if element exists
-    element = db.query(Element).filter(Element.id == element_id).first()
+    element = db.query(DBElement.id).filter(DBElement.id == element_id).first()
     if not element:
         raise HTTPException(status_code=404, detail="Element not found")
     
-    discovery = db.query(DiscoveryHistory).filter(
+    discovery = query_discovery_rows(db).filter(
         DiscoveryHistory.element_id == element_id,
         DiscoveryHistory.is_first_discovery == True
     ).first()
@@ -85,7 +146,7 @@ def get_element_first_discovery(element_id: int, db: Session = Depends(get_db)):
     if not discovery:
         raise HTTPException(status_code=404, detail="No first discovery record found for this element")
     
-    return discovery
+    return discovery_row_to_dict(discovery)
 
 @router.post("/", response_model=DiscoveryHistorySchema)
 def create_discovery(discovery: DiscoveryHistoryCreate, db: Session = Depends(get_db)):
@@ -93,7 +154,7 @@ def create_discovery(discovery: DiscoveryHistoryCreate, db: Session = Depends(ge
     Record a new element discovery.
     """
     # Check if element exists
-    element = db.query(Element).filter(Element.id == discovery.element_id).first()
+    element = db.query(DBElement.id).filter(DBElement.id == discovery.element_id).first()
     if not element:
         raise HTTPException(status_code=404, detail="Element not found")
     
@@ -106,7 +167,7 @@ def create_discovery(discovery: DiscoveryHistoryCreate, db: Session = Depends(ge
     # Create discovery record
     db_discovery = DiscoveryHistory(
         element_id=discovery.element_id,
-        player_name=discovery.player_name,
+        player_id=ensure_player(db, discovery.player_name) if discovery.player_name else None,
         is_first_discovery=is_first
     )
     db.add(db_discovery)
@@ -116,6 +177,6 @@ def create_discovery(discovery: DiscoveryHistoryCreate, db: Session = Depends(ge
         pass
         
     db.commit()
-    db.refresh(db_discovery)
     
-    return db_discovery 
\ No newline at end of file
+    row = query_discovery_rows(db).filter(DiscoveryHistory.id == db_discovery.id).one()
+    return discovery_row_to_dict(row) 
\ No newline at end of file
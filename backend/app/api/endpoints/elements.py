@@ -1,110 +1,179 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import logging
+import math
+
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Callable, List, Optional
 
+from app.core.http_cache import cached_json, make_etag, not_modified
+from app.core.pagination import decode_cursor, next_cursor
+from app.core.services import get_generation_queue, get_llm_service, get_rate_limiter
+from app.core.sse import SSE_HEADERS, sse_event
+from app.core.serialization import ELEMENT_COLUMNS, element_to_dict, elements_to_dicts, fast_json
 from app.db.database import get_db
-from app.models.element import DBElement, element_combinations, PlayerStats, DiscoveryHistory, player_elements
-from app.schemas.element import ElementCreate, Element as ElementSchema, ElementList, CombinationRequest, CombinationResponse, PlayerElementList
-from app.services.llm_service import LLMService
+from app.db.versions import bump_language_version, get_language_version
+from app.models.element import DBElement, PlayerStats, player_elements
+from app.schemas.element import ElementCreate, Element as ElementSchema, ElementList, CombinationRequest, CombinationResponse, PlayerElementList, PlayerElementDelta, BatchCombinationRequest, CombinationJob
+from app.services.combination_service import (
+    combination_result,
+    combine_batch,
+    find_known_results,
+    pair_key,
+    record_player_success,
+    store_llm_result,
+)
+from app.services.game_session import GameSession
+from app.services.generation_queue import QueueFull
+from app.services.idempotency import IdempotencyStore, request_fingerprint
+from app.services.player_cache import ensure_player, get_player_id
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-llm_service = LLMService()
+idempotency_store = IdempotencyStore()
 
 @router.get("/", response_model=ElementList)
 def get_elements(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
     language: str = "en",
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     Get all elements with pagination.
     
-    - **skip**: Number of elements to skip
+    - **skip**: Number of elements to skip (ignored when a cursor is given)
     - **limit**: Maximum number of elements to return
     - **language**: Language code ("en", "ru", etc.)
+    - **cursor**: Opaque `next_cursor` token from the previous page
+    
+    Supports `If-None-Match`/`If-Modified-Since`; unchanged pages return 304.
     """
-    # Get elements for the specified language
-    elements = db.query(DBElement).filter(
+    # Answer conditional requests from the language version alone
+    version, updated_at = get_language_version(db, language)
+    etag = make_etag("elements", language, version, skip, limit, cursor)
+    cached = not_modified(request, etag, updated_at)
+    if cached is not None:
+        return cached
+    
+    # Get elements for the specified language as plain rows
+    query = db.query(*ELEMENT_COLUMNS).filter(
         DBElement.language == language
-    ).offset(skip).limit(limit).all()
-    
-    # Convert elements to dictionaries to avoid serialization issues with relationships
-    element_dicts = []
-    for element in elements:
-        element_dict = {
-            "id": element.id,
-            "name": element.name,
-            "emoji": element.emoji,
-            "is_basic": element.is_basic,
-            "language": element.language,
-            "created_at": element.created_at,
-            "created_by": element.created_by,
-            "discovered_by": None  # Set discovered_by to None to avoid serialization issues
-        }
-        element_dicts.append(element_dict)
-    
-    return {"elements": element_dicts}
+    ).order_by(DBElement.id)
+    
+    if cursor:
+        after_id, = decode_cursor(cursor, 1)
+        query = query.filter(DBElement.id > after_id)
+    else:
+        query = query.offset(skip)
+    
+    elements = query.limit(limit).all()
+    
+    # Rows are shaped to match ElementList, so skip re-validating them
+    return cached_json(
+        request,
+        {"elements": elements_to_dicts(elements), "next_cursor": next_cursor(elements, limit, "id")},
+        etag,
+        updated_at,
+    )
 
 @router.get("/player/{player_name}", response_model=PlayerElementList)
-def get_player_elements(player_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_player_elements(
+    request: Request,
+    player_name: str,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """
     Get all elements unlocked by a specific player.
+    
+    Pass the returned `next_cursor` as **cursor** to fetch the following page.
+    Supports `If-None-Match`/`If-Modified-Since`; unchanged pages return 304.
     """
-    # Get player stats or create if not exists
-    player = db.query(PlayerStats).filter(PlayerStats.player_name == player_name).first()
-    if not player:
-        player = PlayerStats(player_name=player_name)
-        db.add(player)
-        db.commit()
-        db.refresh(player)
+    # Create the player if needed; only the inventory version is read
+    player_id = ensure_player(db, player_name)
+    db.commit()
+    player = db.query(PlayerStats.inventory_version, PlayerStats.inventory_updated_at).filter(
+        PlayerStats.id == player_id
+    ).one()
+    
+    # Answer conditional requests from the inventory version alone
+    etag = make_etag("player_elements", player_name, player.inventory_version, skip, limit, cursor)
+    cached = not_modified(request, etag, player.inventory_updated_at)
+    if cached is not None:
+        return cached
     
-    # Get all elements unlocked by the player
-    elements = db.query(DBElement).join(
+    # Get all elements unlocked by the player as plain rows
+    query = db.query(*ELEMENT_COLUMNS).join(
         player_elements, 
         DBElement.id == player_elements.c.element_id
     ).filter(
-        player_elements.c.player_name == player_name
-    ).offset(skip).limit(limit).all()
-    
-    # Convert elements to dictionaries to handle the discovered_by relationship
-    element_dicts = []
-    for element in elements:
-        element_dict = {
-            "id": element.id,
-            "name": element.name,
-            "emoji": element.emoji,
-            "description": element.description,
-            "is_basic": bool(element.is_basic),
-            "created_at": element.created_at,
-            "discovered_by": None  # Set discovered_by to None for now
-        }
-        element_dicts.append(element_dict)
-    
-    return {"elements": element_dicts}
+        player_elements.c.player_id == player_id
+    ).order_by(player_elements.c.element_id)
+    
+    if cursor:
+        after_id, = decode_cursor(cursor, 1)
+        query = query.filter(player_elements.c.element_id > after_id)
+    else:
+        query = query.offset(skip)
+    
+    elements = query.limit(limit).all()
+    
+    return cached_json(
+        request,
+        {"elements": elements_to_dicts(elements), "next_cursor": next_cursor(elements, limit, "id")},
+        etag,
+        player.inventory_updated_at,
+    )
+
+@router.get("/player/{player_name}/delta", response_model=PlayerElementDelta)
+def get_player_elements_delta(player_name: str, since: int = 0, db: Session = Depends(get_db)):
+    """
+    Get the elements a player unlocked after inventory version **since**.
+    
+    Returns the player's current `version`; pass it as **since** on the next
+    sync. `since=0` returns the whole inventory.
+    """
+    # Unknown players have an empty inventory; the player cache answers them without a query
+    player_id = get_player_id(db, player_name)
+    version = 0
+    if player_id is not None:
+        version = db.query(PlayerStats.inventory_version).filter(PlayerStats.id == player_id).scalar() or 0
+    
+    if since >= version:
+        return fast_json({"version": version, "elements": []})
+    
+    query = db.query(*ELEMENT_COLUMNS).join(
+        player_elements,
+        DBElement.id == player_elements.c.element_id
+    ).filter(
+        player_elements.c.player_id == player_id
+    )
+    if since > 0:
+        query = query.filter(player_elements.c.seq > since)
+    
+    elements = query.order_by(player_elements.c.seq, player_elements.c.element_id).all()
+    
+    return fast_json({"version": version, "elements": elements_to_dicts(elements)})
 
 @router.get("/{element_id}", response_model=ElementSchema)
 def get_element(element_id: int, db: Session = Depends(get_db)):
     """
     Get a specific element by ID.
     """
-    element = db.query(DBElement).filter(DBElement.id == element_id).first()
+    element = db.query(*ELEMENT_COLUMNS).filter(DBElement.id == element_id).first()
     if element is None:
         raise HTTPException(status_code=404, detail="Element not found")
     
-    # Convert element to dictionary to handle the discovered_by relationship
-    element_dict = {
-        "id": element.id,
-        "name": element.name,
-        "emoji": element.emoji,
-        "is_basic": bool(element.is_basic),
-        "language": element.language,
-        "created_at": element.created_at,
-        "created_by": element.created_by,
-        "discovered_by": None  # Set discovered_by to None to avoid serialization issues
-    }
-    
-    return element_dict
+    return fast_json(element_to_dict(element))
 
 @router.post("/", response_model=ElementSchema)
 def create_element(element: ElementCreate, db: Session = Depends(get_db)):
@@ -114,242 +183,408 @@ def create_element(element: ElementCreate, db: Session = Depends(get_db)):
     db_element = DBElement(
         name=element.name,
         emoji=element.emoji,
-        is_basic=element.is_basic
+        is_basic=element.is_basic,
+        language=element.language
     )
     db.add(db_element)
+    bump_language_version(db, db_element.language)
     db.commit()
     db.refresh(db_element)
     return db_element
 
-@router.post("/combine", response_model=CombinationResponse)
-def combine_elements(combination: CombinationRequest, db: Session = Depends(get_db)):
+def load_combination_pair(db: Session, combination: CombinationRequest):
     """
-    Combine two elements to create a new one.
+    Load both elements of a combination request with one query.
     
-    - **element1_id**: ID of the first element
-    - **element2_id**: ID of the second element
-    - **player_name**: Name of the player (optional)
-    - **lang**: Language code ("en" or "ru")
-    - **prompt_name**: Name of the prompt template to use
+    Raises 404 if either is missing and 400 if they are not in the request's language.
     """
-    # Get the elements
-    element1 = db.query(DBElement).filter(DBElement.id == combination.element1_id).first()
-    element2 = db.query(DBElement).filter(DBElement.id == combination.element2_id).first()
+    elements = {
+        element.id: element
+        for element in db.query(DBElement).filter(
+            DBElement.id.in_([combination.element1_id, combination.element2_id])
+        ).all()
+    }
+    element1 = elements.get(combination.element1_id)
+    element2 = elements.get(combination.element2_id)
     
     if not element1 or not element2:
         raise HTTPException(status_code=404, detail="One or both elements not found")
     
-    # Get the language from the request
-    lang = combination.lang if hasattr(combination, 'lang') else "en"
-    
     # Ensure elements are in the correct language
+    lang = combination.lang
     if element1.language != lang or element2.language != lang:
         raise HTTPException(
             status_code=400, 
             detail=f"Elements must be in the same language as the request ({lang})"
         )
     
-    # Get the element names
-    element1_name = element1.name
-    element2_name = element2.name
+    return element1, element2
+
+def llm_retry_after(player_name: Optional[str], client_ip: Optional[str], element1_name: str, element2_name: str, lang: str, prompt_name: str = "default") -> float:
+    """
+    Take a rate limit token for a combination that has to be generated.
     
-    # Check if the combination already exists for this language
-    # Sort element IDs to ensure consistent keys
-    sorted_ids = sorted([combination.element1_id, combination.element2_id])
-    existing_combination = db.query(element_combinations).filter(
-        (element_combinations.c.element1_id == sorted_ids[0]) &
-        (element_combinations.c.element2_id == sorted_ids[1]) &
-        (element_combinations.c.language == lang)
-    ).first()
-    
-    # If the combination exists, return the result
-    if existing_combination:
-        result_element = db.query(DBElement).filter(DBElement.id == existing_combination.result_id).first()
-        
-        # Check if this is a new unlock for the player
-        is_new_unlock = False
-        if combination.player_name:
-            is_new_unlock = unlock_element_for_player(db, combination.player_name, result_element.id)
-            update_player_stats(db, combination.player_name, successful_combinations=1)
-            if is_new_unlock:
-                update_player_stats(db, combination.player_name, elements_unlocked=1)
-            
-        return {
-            "element1_id": combination.element1_id,
-            "element2_id": combination.element2_id,
-            "result_id": result_element.id,
-            "result": result_element.to_dict(),  # Use to_dict() instead of the object directly
-            "is_new_discovery": False,
-            "is_first_discovery": False
-        }
-    
-    # If the combination doesn't exist, use the LLM to determine the result
-    llm_result = llm_service.combine_elements(
-        element1_name, 
-        element2_name,
-        lang=lang,
-        prompt_name=combination.prompt_name if hasattr(combination, 'prompt_name') else "default"
+    Combinations the LLM cache can answer are free. Returns 0 if the
+    request may go ahead, otherwise the seconds until it can be retried.
+    """
+    if get_llm_service().is_cached(element1_name, element2_name, lang, prompt_name):
+        return 0.0
+    return get_rate_limiter().acquire(player_name, client_ip)
+
+def check_llm_rate_limit(request: Request, combination: CombinationRequest, element1: DBElement, element2: DBElement):
+    """Raise 429 with Retry-After if generating this combination is over the rate limit."""
+    client_ip = request.client.host if request.client else None
+    retry_after = llm_retry_after(
+        combination.player_name, client_ip, element1.name, element2.name, combination.lang, combination.prompt_name
     )
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many new combinations, try again shortly",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def with_idempotency(request: Request, idempotency_key: Optional[str], payload, handler: Callable[[], Response]) -> Response:
+    """
+    Run `handler` once per `Idempotency-Key` and client.
     
-    # Check if the combination is valid
-    if "valid" in llm_result and llm_result["valid"] == False:
-        # Return the refusal response
-        return {
-            "element1_id": combination.element1_id,
-            "element2_id": combination.element2_id,
-            "result_id": None,
-            "result": None,
-            "is_new_discovery": False,
-            "is_first_discovery": False,
-            "error": llm_result.get("reason", "This combination is not possible.")
-        }
-    
-    # Check if the resulting element already exists
-    if "result" not in llm_result:
-        # Return an error response
-        return {
-            "element1_id": combination.element1_id,
-            "element2_id": combination.element2_id,
-            "result_id": None,
-            "result": None,
-            "is_new_discovery": False,
-            "is_first_discovery": False,
-            "error": "Failed to generate a new element."
-        }
-    
-    # Check if the resulting element already exists in this language
-    result_element = db.query(DBElement).filter(
-        (DBElement.name == llm_result["result"]) & 
-        (DBElement.language == lang)
-    ).first()
+    Without a key the handler simply runs. With one, a retry gets the stored
+    response of the first request (or waits for it while it is still running).
+    Keys are scoped to the player, or to the client IP for anonymous requests,
+    so clients that happen to pick the same key never see each other's responses.
+    """
+    if not idempotency_key:
+        return handler()
+    if payload.player_name:
+        client = f"player:{payload.player_name}"
+    else:
+        client = f"ip:{request.client.host if request.client else ''}"
+    scope = f"{request.url.path}\0{client}"
+    fingerprint = request_fingerprint(request.url.path, payload.model_dump_json())
+    return idempotency_store.run(scope, idempotency_key, fingerprint, handler)
+
+@router.post("/combine", response_model=CombinationResponse)
+def combine_elements(
+    combination: CombinationRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Combine two elements to create a new one.
     
+    - **element1_id**: ID of the first element
+    - **element2_id**: ID of the second element
+    - **player_name**: Name of the player (optional)
+    - **lang**: Language code ("en" or "ru")
+    - **prompt_name**: Name of the prompt template to use
+    
+    Combinations that need the LLM are rate limited per player, per IP and
+    globally; over the limit the endpoint returns 429 with Retry-After.
+    
+    Send an `Idempotency-Key` header to make retries safe: a retry with the
+    same key returns the first attempt's result (waiting for it if it is
+    still generating) instead of combining again.
+    """
+    return with_idempotency(request, idempotency_key, combination, lambda: run_combination(combination, request, db))
+
+def run_combination(combination: CombinationRequest, request: Request, db: Session) -> Response:
+    """Resolve or generate one combination and record it for the player."""
+    element1, element2 = load_combination_pair(db, combination)
+    lang = combination.lang
+    
+    # Check if the combination already exists for this language
+    key = pair_key(combination.element1_id, combination.element2_id)
+    result_element = find_known_results(db, [key], lang).get(key)
     is_new_discovery = False
-    is_first_discovery = False
-    
-    if not result_element:
-        # Create the new element
-        result_element = DBElement(
-            name=llm_result["result"],
-            emoji=llm_result.get("emoji", "✨"),
-            is_basic=False,
-            language=lang,  # Set the language
-            created_by=combination.player_name
-        )
-        db.add(result_element)
-        db.flush()  # Get the ID
-        is_new_discovery = True
-        is_first_discovery = True
+    
+    if result_element is None:
+        check_llm_rate_limit(request, combination, element1, element2)
         
-        # Record the discovery
-        discovery = DiscoveryHistory(
-            element_id=result_element.id,
-            player_name=combination.player_name,
-            is_first_discovery=True
+        # If the combination doesn't exist, use the LLM to determine the result
+        llm_result = get_llm_service().combine_elements(
+            element1.name, 
+            element2.name,
+            lang=lang,
+            prompt_name=combination.prompt_name
         )
-        db.add(discovery)
-    
-    # Record the combination
-    db.execute(
-        element_combinations.insert().values(
-            element1_id=sorted_ids[0],
-            element2_id=sorted_ids[1],
-            result_id=result_element.id,
-            language=lang,  # Set the language
-            discovered_by=combination.player_name
+        
+        result_element, is_new_discovery, error = store_llm_result(
+            db, key, lang, llm_result, combination.player_name
         )
-    )
+        if error:
+            db.rollback()
+            return fast_json(combination_result(combination.element1_id, combination.element2_id, error=error))
     
     # Unlock the element for the player
-    if combination.player_name:
-        is_new_unlock = unlock_element_for_player(db, combination.player_name, result_element.id)
-        update_player_stats(db, combination.player_name, successful_combinations=1)
-        if is_new_unlock:
-            update_player_stats(db, combination.player_name, elements_unlocked=1)
-    
+    record_player_success(db, combination.player_name, result_element.id)
     db.commit()
     
-    return {
-        "element1_id": combination.element1_id,
-        "element2_id": combination.element2_id,
-        "result_id": result_element.id,
-        "result": result_element.to_dict(),  # Use to_dict() instead of the object directly
-        "is_new_discovery": is_new_discovery,
-        "is_first_discovery": is_first_discovery
-    }
+    return fast_json(combination_result(
+        combination.element1_id,
+        combination.element2_id,
+        result_element,
+        is_new_discovery=is_new_discovery,
+        is_first_discovery=is_new_discovery
+    ))
 
-def update_player_stats(db: Session, player_name: str, **kwargs):
+@router.post("/combine/stream")
+def combine_elements_stream(combination: CombinationRequest, request: Request, db: Session = Depends(get_db)):
     """
-    Update player statistics.
+    Combine two elements, streaming progress as Server-Sent Events.
+    
+    Known recipes produce a single `result` event. New pairs emit
+    `generating` immediately, then `token` events (`{"text": ...}`) as the
+    LLM writes, then the final `result` event as soon as the model's JSON
+    object is complete. `result` carries the `CombinationResponse` fields.
+    Models whose endpoint cannot stream send the whole completion as one
+    `token` event.
+    
+    Generation is rate limited like `/combine` (429 before the stream starts).
     """
-    if not player_name:
-        return
+    element1, element2 = load_combination_pair(db, combination)
+    lang = combination.lang
+    key = pair_key(combination.element1_id, combination.element2_id)
+    result_element = find_known_results(db, [key], lang).get(key)
+    if result_element is None:
+        check_llm_rate_limit(request, combination, element1, element2)
+    
+    def events():
+        if result_element is not None:
+            record_player_success(db, combination.player_name, result_element.id)
+            db.commit()
+            yield sse_event("result", combination_result(combination.element1_id, combination.element2_id, result_element))
+            return
         
-    # Get or create player stats
-    stats = db.query(PlayerStats).filter(PlayerStats.player_name == player_name).first()
-    if not stats:
-        # Initialize a new PlayerStats object with default values
-        stats = PlayerStats(
-            player_name=player_name,
-            elements_discovered=0,
-            elements_unlocked=0,
-            combinations_tried=0,
-            successful_combinations=0,
-            failed_combinations=0
-        )
-        db.add(stats)
-        db.flush()  # Flush to get the ID without committing
-    
-    # Update stats
-    for key, value in kwargs.items():
-        if hasattr(stats, key):
-            current_value = getattr(stats, key)
-            if current_value is None:
-                setattr(stats, key, value)
+        yield sse_event("generating", {"element1_id": combination.element1_id, "element2_id": combination.element2_id})
+        
+        llm_result = None
+        for event in get_llm_service().stream_combine_elements(
+            element1.name, element2.name, lang=lang, prompt_name=combination.prompt_name
+        ):
+            if event["type"] == "token":
+                yield sse_event("token", {"text": event["text"]})
             else:
-                setattr(stats, key, current_value + value)
+                llm_result = event["result"]
+        
+        stored_element, is_new_discovery, error = store_llm_result(
+            db, key, lang, llm_result, combination.player_name
+        )
+        if error:
+            db.rollback()
+            yield sse_event("result", combination_result(combination.element1_id, combination.element2_id, error=error))
+            return
+        
+        record_player_success(db, combination.player_name, stored_element.id)
+        db.commit()
+        yield sse_event("result", combination_result(
+            combination.element1_id,
+            combination.element2_id,
+            stored_element,
+            is_new_discovery=is_new_discovery,
+            is_first_discovery=is_new_discovery
+        ))
     
-    db.commit()
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
-def record_discovery(db: Session, element_id: int, player_name: str, is_first_discovery: bool = False):
+@router.post("/combine/jobs", response_model=CombinationJob, status_code=202)
+def combine_elements_job(
+    combination: CombinationRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """
-    Record a new element discovery in the history.
+    Combine two elements without waiting for the LLM.
+    
+    Known recipes are answered straight away with status `completed` (200).
+    Unknown pairs are queued for generation and return 202 with a `job_id`
+    to poll at `/combine/jobs/{job_id}`. Requests for a pair that is already
+    queued join the existing job. Returns 503 when the queue is full and
+    429 when a new generation is over the rate limit.
+    
+    Retries with the same `Idempotency-Key` get the first response back.
     """
-    if not player_name:
-        return
-        
-    discovery = DiscoveryHistory(
-        element_id=element_id,
-        player_name=player_name,
-        is_first_discovery=is_first_discovery
+    return with_idempotency(request, idempotency_key, combination, lambda: submit_combination_job(combination, request, db))
+
+def submit_combination_job(combination: CombinationRequest, request: Request, db: Session) -> Response:
+    """Answer a known combination or queue its generation."""
+    element1, element2 = load_combination_pair(db, combination)
+    lang = combination.lang
+    
+    key = pair_key(combination.element1_id, combination.element2_id)
+    result_element = find_known_results(db, [key], lang).get(key)
+    if result_element is not None:
+        record_player_success(db, combination.player_name, result_element.id)
+        db.commit()
+        return fast_json({
+            "job_id": None,
+            "status": "completed",
+            "result": combination_result(combination.element1_id, combination.element2_id, result_element),
+        })
+    
+    if get_generation_queue().find(combination.element1_id, combination.element2_id, lang, combination.prompt_name) is None:
+        check_llm_rate_limit(request, combination, element1, element2)
+    
+    try:
+        job = get_generation_queue().submit(
+            combination.element1_id,
+            combination.element2_id,
+            element1.name,
+            element2.name,
+            lang=lang,
+            prompt_name=combination.prompt_name,
+            player_name=combination.player_name
+        )
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many pending generations, try again shortly",
+            headers={"Retry-After": "5"}
+        )
+    
+    return fast_json(
+        job.to_dict(),
+        status_code=202,
+        headers={"Location": f"/api/elements/combine/jobs/{job.id}"}
     )
-    db.add(discovery)
-    db.commit()
 
-def unlock_element_for_player(db: Session, player_name: str, element_id: int) -> bool:
+@router.get("/combine/jobs/{job_id}", response_model=CombinationJob)
+def get_combine_job(job_id: str):
     """
-    Unlock an element for a player. Returns True if this is a new unlock.
+    Get the status of a generation job, and its result once it has completed.
+    
+    Finished jobs are kept for a limited time (`GENERATION_JOB_RETENTION` jobs).
     """
-    if not player_name:
-        return False
-        
-    # Check if the player already has this element
-    existing = db.execute(
-        player_elements.select().where(
-            (player_elements.c.player_name == player_name) &
-            (player_elements.c.element_id == element_id)
-        )
-    ).first()
+    job = get_generation_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return fast_json(job.to_dict())
+
+@router.post("/combine/batch")
+def combine_elements_batch(batch: BatchCombinationRequest, request: Request, db: Session = Depends(get_db)):
+    """
+    Combine many pairs of elements in one request.
     
-    if existing:
-        return False
-        
-    # Add the element to the player's unlocked elements
-    db.execute(
-        player_elements.insert().values(
-            player_name=player_name,
-            element_id=element_id
-        )
+    Known recipes are resolved with a single query and unknown pairs are sent
+    to the LLM concurrently. Results are streamed back as NDJSON, one
+    `CombinationResponse` object per line with the `index` of its pair, in
+    completion order. All unlocks and stats are written in one transaction.
+    
+    Each distinct unknown pair takes a rate limit token; pairs over the limit
+    get an error line with `retry_after` seconds instead of a result.
+    """
+    pairs = [(pair.element1_id, pair.element2_id) for pair in batch.pairs]
+    client_ip = request.client.host if request.client else None
+    results = combine_batch(
+        db, get_llm_service(), pairs,
+        lang=batch.lang,
+        player_name=batch.player_name,
+        prompt_name=batch.prompt_name,
+        limit=lambda name1, name2: math.ceil(llm_retry_after(batch.player_name, client_ip, name1, name2, batch.lang, batch.prompt_name))
     )
-    db.commit()
     
-    return True 
\ No newline at end of file
+    return StreamingResponse(
+        (orjson.dumps(result) + b"\n" for result in results),
+        media_type="application/x-ndjson"
+    )
+
+@router.websocket("/ws/{player_name}")
+async def game_session(websocket: WebSocket, player_name: str):
+    """
+    Low-latency game session for one player.
+    
+    Client messages: `{"type": "combine", "request_id": ..., "element1_id": 1,
+    "element2_id": 2, "lang": "en", "prompt_name": "default"}`.
+    
+    Known recipes are answered with `{"type": "result", "request_id": ..., ...}`
+    carrying the `CombinationResponse` fields. Unknown pairs are answered with
+    `{"type": "generating", "request_id": ...}` right away and the `result`
+    message is pushed once the LLM finishes, while other messages keep being
+    processed. New generations are rate limited like `/combine`; over the
+    limit the reply is an `error` message with `retry_after` seconds.
+    """
+    await websocket.accept()
+    client_ip = websocket.client.host if websocket.client else None
+    session = GameSession(player_name)
+    db_lock = asyncio.Lock()
+    send_lock = asyncio.Lock()
+    generating = {}  # (lang, pair) -> list of (request_id, element1_id, element2_id) waiting on it
+    tasks = set()
+    
+    async def send(message):
+        async with send_lock:
+            await websocket.send_bytes(orjson.dumps(message))
+    
+    async def generate(lang_key, names, prompt_name):
+        lang, _ = lang_key
+        try:
+            llm_result = await run_in_threadpool(
+                get_llm_service().combine_elements, names[0], names[1], lang=lang, prompt_name=prompt_name
+            )
+        except Exception as e:
+            logger.error(f"LLM call failed for {names}: {e}")
+            llm_result = {"valid": False, "reason": "Failed to generate a new element."}
+        
+        for request_id, element1_id, element2_id in generating.pop(lang_key):
+            async with db_lock:
+                response = await run_in_threadpool(session.store_generated, element1_id, element2_id, lang, llm_result)
+            try:
+                await send({"type": "result", "request_id": request_id, **response})
+            except (WebSocketDisconnect, RuntimeError):
+                pass  # Client left; the result is stored and shows up on its next sync
+    
+    try:
+        async with db_lock:
+            await run_in_threadpool(session.load)
+        
+        while True:
+            message = orjson.loads(await websocket.receive_text())
+            if not isinstance(message, dict):
+                await send({"type": "error", "request_id": None, "error": "Messages must be JSON objects"})
+                continue
+            request_id = message.get("request_id")
+            if message.get("type") != "combine":
+                await send({"type": "error", "request_id": request_id, "error": "Unknown message type"})
+                continue
+            
+            try:
+                element1_id = int(message["element1_id"])
+                element2_id = int(message["element2_id"])
+            except (KeyError, TypeError, ValueError):
+                await send({"type": "error", "request_id": request_id, "error": "element1_id and element2_id are required"})
+                continue
+            lang = message.get("lang", "en")
+            prompt_name = message.get("prompt_name", "default")
+            
+            async with db_lock:
+                response, names = await run_in_threadpool(session.resolve, element1_id, element2_id, lang)
+            if response is not None:
+                await send({"type": "result", "request_id": request_id, **response})
+                continue
+            
+            lang_key = (lang, pair_key(element1_id, element2_id))
+            if lang_key not in generating:
+                retry_after = await run_in_threadpool(llm_retry_after, player_name, client_ip, names[0], names[1], lang, prompt_name)
+                if retry_after:
+                    await send({"type": "error", "request_id": request_id, "error": "Rate limit exceeded", "retry_after": math.ceil(retry_after)})
+                    continue
+            
+            await send({"type": "generating", "request_id": request_id})
+            waiting = generating.setdefault(lang_key, [])
+            waiting.append((request_id, element1_id, element2_id))
+            if len(waiting) == 1:
+                task = asyncio.create_task(generate(lang_key, names, prompt_name))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    except ValueError:
+        # Not valid JSON
+        await websocket.close(code=1003)
+    finally:
+        # Let in-flight generations finish so their results are stored
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        async with db_lock:
+            await run_in_threadpool(session.close)
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+from app.core.pagination import decode_cursor, next_cursor
 from app.db.database import get_db
 from app.models.element import PlayerStats
 from app.schemas.element import PlayerStats as PlayerStatsSchema, PlayerStatsList, PlayerStatsCreate
@@ -10,12 +11,21 @@ from app.db.init_db import add_basic_elements_to_player
 router = APIRouter()
 
 @router.get("/", response_model=PlayerStatsList)
-def get_player_stats(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_player_stats(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
     """
     Get all player statistics with pagination.
+    
+    Pass the returned `next_cursor` as **cursor** to fetch the following page.
     """
-    stats = db.query(PlayerStats).offset(skip).limit(limit).all()
-    return {"stats": stats}
+    query = db.query(PlayerStats).order_by(PlayerStats.id)
+    if cursor:
+        after_id, = decode_cursor(cursor, 1)
+        query = query.filter(PlayerStats.id > after_id)
+    else:
+        query = query.offset(skip)
+    
+    stats = query.limit(limit).all()
+    return {"stats": stats, "next_cursor": next_cursor(stats, limit, "id")}
 
 @router.get("/{player_name}", response_model=PlayerStatsSchema)
 def get_player_stats_by_name(player_name: str, db: Session = Depends(get_db)):
@@ -24,17 +34,10 @@ def get_player_stats_by_name(player_name: str, db: Session = Depends(get_db)):
     """
     stats = db.query(PlayerStats).filter(PlayerStats.player_name == player_name).first()
     if stats is None:
-        # If player doesn't exist, create a new entry with default values
-        stats = PlayerStats(player_name=player_name)
-        db.add(stats)
+        # If player doesn't exist, create it (an upsert, so concurrent requests don't clash) with basic elements
+        add_basic_elements_to_player(db, player_name)
         db.commit()
-        db.refresh(stats)
-        
-        # Add basic elements to the new player
-        elements_added = add_basic_elements_to_player(player_name)
-        if elements_added > 0:
-            # Refresh stats to get updated values
-            db.refresh(stats)
+        stats = db.query(PlayerStats).filter(PlayerStats.player_name == player_name).one()
     
     return stats
 
@@ -51,13 +54,11 @@ def create_player_stats(stats: PlayerStatsCreate, db: Session = Depends(get_db))
     # Create new player stats
     db_stats = PlayerStats(player_name=stats.player_name)
     db.add(db_stats)
-    db.commit()
-    db.refresh(db_stats)
-    
-    # Add basic elements to the new player
-    add_basic_elements_to_player(stats.player_name)
+    db.flush()
     
-    # Refresh stats to get updated values
+    # Add basic elements to the new player in the same transaction
+    add_basic_elements_to_player(db, stats.player_name)
+    db.commit()
     db.refresh(db_stats)
     
     return db_stats
@@ -78,16 +79,10 @@ def increment_player_stats(
     # Get or create player stats
     stats = db.query(PlayerStats).filter(PlayerStats.player_name == player_name).first()
     if stats is None:
-        stats = PlayerStats(player_name=player_name)
-        db.add(stats)
+        # Create the player with basic elements in the same transaction
+        add_basic_elements_to_player(db, player_name)
         db.commit()
-        db.refresh(stats)
-        
-        # Add basic elements to the new player
-        add_basic_elements_to_player(player_name)
-        
-        # Refresh stats to get updated values
-        db.refresh(stats)
+        stats = db.query(PlayerStats).filter(PlayerStats.player_name == player_name).one()
     
     # Increment stats
     stats.elements_discovered += elements_discovered
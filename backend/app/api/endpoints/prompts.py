@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Dict, List, Optional, Any
 
+from app.core.services import get_llm_service, get_prompt_service, get_prompt_test_runner, get_prompt_tester
+from app.core.sse import SSE_HEADERS
 from app.db.database import get_db
-from app.services.prompt_service import PromptService
-from app.services.prompt_tester import PromptTester
+from app.services.prompt_stats import compare_prompts
+from app.services.prompt_test_jobs import PromptJobQueueFull
 from pydantic import BaseModel
 
 router = APIRouter()
-prompt_service = PromptService()
-prompt_tester = PromptTester(prompt_service=prompt_service)
 
 class PromptCreate(BaseModel):
     lang: str
@@ -25,71 +26,196 @@ class TestPromptRequest(BaseModel):
     lang: str
     name: str
     test_cases: Optional[List[TestCase]] = None
+    # Reuse stored results of unchanged test cases while the template is unchanged
+    incremental: bool = True
 
 @router.get("/")
-def list_prompts(lang: Optional[str] = None):
+def list_prompts(lang: Optional[str] = None, prompt_service=Depends(get_prompt_service)):
     """
     List all available prompts.
     """
     return prompt_service.list_prompts(lang)
 
+@router.get("/versions")
+def prompt_versions(prompt_service=Depends(get_prompt_service)):
+    """
+    Current version of each language's prompts; it increases whenever a prompt of the language is saved.
+    """
+    prompt_service.reload(force=True)
+    return dict(prompt_service.versions)
+
+# Test run routes are declared before "/{lang}/{name}", which would otherwise match them
+
+@router.get("/test/runs")
+def list_test_runs(limit: int = 50, prompt_tester=Depends(get_prompt_tester)):
+    """
+    List stored prompt test runs, newest first.
+    """
+    return prompt_tester.result_store.list_runs(limit)
+
+@router.get("/test/runs/{run_id}")
+def get_test_run(run_id: str, prompt_tester=Depends(get_prompt_tester)):
+    """
+    Get a stored test run with the success rate of each prompt.
+    """
+    run = prompt_tester.result_store.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return run
+
+@router.get("/test/runs/{run_id}/cases")
+def get_test_run_cases(
+    run_id: str,
+    lang: Optional[str] = None,
+    name: Optional[str] = None,
+    case_key: Optional[str] = None,
+    prompt_tester=Depends(get_prompt_tester)
+):
+    """
+    Get the stored test cases of a run, optionally for one prompt or one case.
+    """
+    if not prompt_tester.result_store.has_run(run_id):
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return prompt_tester.result_store.get_cases(run_id, lang, name, case_key)
+
+@router.get("/test/runs/{run_id}/report")
+def get_test_run_report(run_id: str, prompt_tester=Depends(get_prompt_tester)):
+    """
+    Get latency percentiles (p50/p95), token counts, cost and parse paths for each prompt of a run.
+    """
+    if not prompt_tester.result_store.has_run(run_id):
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return prompt_tester.result_store.run_report(run_id)
+
+@router.get("/test/runs/{run_id}/compare-prompts")
+def compare_test_run_prompts(
+    run_id: str,
+    a: str,
+    b: str,
+    other_run_id: Optional[str] = None,
+    prompt_tester=Depends(get_prompt_tester)
+):
+    """
+    Compare two prompts ("lang/name") on the test cases they share, with significance tests.
+    
+    Prompt `b` is taken from `other_run_id` when given, otherwise from the same run.
+    """
+    store = prompt_tester.result_store
+    other_run_id = other_run_id or run_id
+    for candidate in (run_id, other_run_id):
+        if not store.has_run(candidate):
+            raise HTTPException(status_code=404, detail=f"Test run not found: {candidate}")
+    
+    cases = []
+    for run, prompt in ((run_id, a), (other_run_id, b)):
+        lang, _, name = prompt.partition("/")
+        prompt_cases = store.get_cases(run, lang, name)
+        if not prompt_cases:
+            raise HTTPException(status_code=404, detail=f"No results for prompt {prompt} in run {run}")
+        cases.append(prompt_cases)
+    return {"a": a, "b": b, **compare_prompts(*cases)}
+
+@router.get("/test/runs/{run_id}/compare/{other_run_id}")
+def compare_test_runs(run_id: str, other_run_id: str, prompt_tester=Depends(get_prompt_tester)):
+    """
+    Compare the per-prompt success rates of two runs and list the cases whose outcome changed.
+    """
+    for candidate in (run_id, other_run_id):
+        if not prompt_tester.result_store.has_run(candidate):
+            raise HTTPException(status_code=404, detail=f"Test run not found: {candidate}")
+    return prompt_tester.result_store.compare_runs(run_id, other_run_id)
+
 @router.get("/{lang}/{name}")
-def get_prompt(lang: str, name: str):
+def get_prompt(lang: str, name: str, prompt_service=Depends(get_prompt_service)):
     """
     Get a specific prompt.
     """
     try:
-        return {"prompt": prompt_service.get_prompt(lang, name)}
+        return {"prompt": prompt_service.get_prompt(lang, name), "version": prompt_service.get_version(lang)}
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Prompt not found: {str(e)}")
 
 @router.post("/")
-def create_prompt(prompt: PromptCreate):
+def create_prompt(prompt: PromptCreate, prompt_service=Depends(get_prompt_service)):
     """
     Create a new prompt.
     """
     try:
-        prompt_service.add_prompt(prompt.lang, prompt.name, prompt.prompt)
-        return {"status": "success", "message": f"Prompt {prompt.lang}/{prompt.name} created"}
+        version = prompt_service.add_prompt(prompt.lang, prompt.name, prompt.prompt)
+        return {"status": "success", "message": f"Prompt {prompt.lang}/{prompt.name} created", "version": version}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create prompt: {str(e)}")
 
-@router.post("/test")
-def test_prompt(request: TestPromptRequest):
+def submit_test_job(runner, **job_args) -> JSONResponse:
+    """Queue a prompt test job and answer 202 with its status URL."""
+    try:
+        job = runner.submit(**job_args)
+    except PromptJobQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many prompt test runs are queued, try again later",
+            headers={"Retry-After": "30"}
+        )
+    return JSONResponse(
+        status_code=202,
+        content=job.to_dict(),
+        headers={"Location": f"/api/prompts/test/jobs/{job.id}"}
+    )
+
+@router.post("/test", status_code=202)
+def test_prompt(request: TestPromptRequest, runner=Depends(get_prompt_test_runner)):
     """
-    Test a prompt with various element combinations.
+    Start testing a prompt with various element combinations.
+    
+    The test runs in the background with its own copy of the test cases
+    (the ones given, or the current default cases). Poll the job at the
+    `Location` URL or follow its progress at `/test/jobs/{job_id}/stream`.
     """
-    # If custom test cases are provided, use them
+    test_cases = None
     if request.test_cases:
-        # Save the original test cases
-        original_test_cases = prompt_tester.test_cases.copy()
-        
-        # Set the custom test cases
-        prompt_tester.clear_test_cases()
-        for test_case in request.test_cases:
-            prompt_tester.add_test_case(test_case.element1, test_case.element2, test_case.expected)
-        
-        # Run the test
-        result = prompt_tester.test_prompt(request.lang, request.name)
-        
-        # Restore the original test cases
-        prompt_tester.test_cases = original_test_cases
-    else:
-        # Use the default test cases
-        result = prompt_tester.test_prompt(request.lang, request.name)
+        test_cases = [(case.element1, case.element2, case.expected) for case in request.test_cases]
+    return submit_test_job(
+        runner, lang=request.lang, name=request.name, test_cases=test_cases, incremental=request.incremental
+    )
+
+@router.post("/test/all", status_code=202)
+def test_all_prompts(lang: Optional[str] = None, incremental: bool = True, runner=Depends(get_prompt_test_runner)):
+    """
+    Start testing all available prompts in the background.
     
-    return result
+    Only test cases whose template or content changed since they were last
+    stored are sent to the LLM, unless `incremental` is false.
+    """
+    return submit_test_job(runner, lang=lang, incremental=incremental)
 
-@router.post("/test/all")
-def test_all_prompts(lang: Optional[str] = None):
+@router.get("/test/jobs/{job_id}")
+def get_test_job(job_id: str, runner=Depends(get_prompt_test_runner)):
     """
-    Test all available prompts and return the results.
+    Get the status, progress and (once completed) results of a prompt test job.
+    
+    Finished jobs are kept for a limited time (`PROMPT_TEST_JOB_RETENTION` jobs);
+    their results stay available as stored runs under `/test/runs`.
     """
-    results = prompt_tester.test_all_prompts(lang)
-    return results
+    job = runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Prompt test job not found")
+    return job.to_dict()
+
+@router.get("/test/jobs/{job_id}/stream")
+def stream_test_job(job_id: str, runner=Depends(get_prompt_test_runner)):
+    """
+    Stream the progress of a prompt test job as Server-Sent Events.
+    
+    Sends `progress` events (cases done, total and running success rate)
+    as the job advances and ends with a `completed` or `failed` event.
+    """
+    job = runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Prompt test job not found")
+    return StreamingResponse(runner.stream(job), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.post("/test/add-case")
-def add_test_case(test_case: TestCase):
+def add_test_case(test_case: TestCase, prompt_tester=Depends(get_prompt_tester)):
     """
     Add a new test case for prompt testing.
     """
@@ -97,7 +223,7 @@ def add_test_case(test_case: TestCase):
     return {"status": "success", "message": "Test case added", "test_cases_count": len(prompt_tester.test_cases)}
 
 @router.post("/test/clear-cases")
-def clear_test_cases():
+def clear_test_cases(prompt_tester=Depends(get_prompt_tester)):
     """
     Clear all test cases.
     """
@@ -109,13 +235,11 @@ def combine_elements_with_prompt(
     element1: str = Body(...),
     element2: str = Body(...),
     lang: str = Body("en"),
-    prompt_name: str = Body("default")
+    prompt_name: str = Body("default"),
+    llm_service=Depends(get_llm_service)
 ):
     """
     Combine two elements using a specific prompt.
     """
-    from app.services.llm_service import LLMService
-    llm_service = LLMService()
-    
     result = llm_service.combine_elements(element1, element2, lang, prompt_name)
     return result 
\ No newline at end of file
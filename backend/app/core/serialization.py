@@ -0,0 +1,97 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from app.models.element import DBElement, DiscoveryHistory, PlayerStats
+
+# Columns needed to render the `Element` schema. Querying these directly
+# returns lightweight rows instead of tracked ORM instances.
+ELEMENT_COLUMNS = (
+    DBElement.id,
+    DBElement.name,
+    DBElement.emoji,
+    DBElement.is_basic,
+    DBElement.language,
+    DBElement.created_at,
+)
+
+
+def element_to_dict(element: Any) -> Dict[str, Any]:
+    """
+    Shape an element row (or a `DBElement`) exactly like the `Element` schema.
+
+    The output is already valid for the schema, so it can be sent without
+    running it back through Pydantic.
+    """
+    return {
+        "id": element.id,
+        "name": element.name,
+        "emoji": element.emoji,
+        "is_basic": bool(element.is_basic),
+        "language": element.language,
+        "created_at": element.created_at,
+        "discovered_by": None,
+    }
+
+
+def elements_to_dicts(elements: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Shape a sequence of element rows with `element_to_dict`."""
+    return [element_to_dict(element) for element in elements]
+
+
+def query_discovery_rows(db: Session):
+    """
+    Build a single SELECT that projects each discovery together with its element.
+
+    Serializing `DiscoveryHistory.element` through `from_attributes` would
+    lazy-load one element per discovery, so the feeds select flat rows instead.
+    The player's name is joined in by id.
+    """
+    return db.query(
+        DiscoveryHistory.id,
+        DiscoveryHistory.element_id,
+        PlayerStats.player_name,
+        DiscoveryHistory.discovered_at,
+        DiscoveryHistory.is_first_discovery,
+        DBElement.name.label("element_name"),
+        DBElement.emoji.label("element_emoji"),
+        DBElement.is_basic.label("element_is_basic"),
+        DBElement.language.label("element_language"),
+        DBElement.created_at.label("element_created_at"),
+    ).join(DBElement, DBElement.id == DiscoveryHistory.element_id).outerjoin(
+        PlayerStats, PlayerStats.id == DiscoveryHistory.player_id
+    )
+
+
+def discovery_row_to_dict(row) -> dict:
+    """
+    Shape a row from `query_discovery_rows` like the `DiscoveryHistory` schema.
+    """
+    return {
+        "id": row.id,
+        "element_id": row.element_id,
+        "player_name": row.player_name,
+        "discovered_at": row.discovered_at,
+        "is_first_discovery": bool(row.is_first_discovery),
+        "element": {
+            "id": row.element_id,
+            "name": row.element_name,
+            "emoji": row.element_emoji,
+            "is_basic": bool(row.element_is_basic),
+            "language": row.element_language,
+            "created_at": row.element_created_at,
+            "discovered_by": None  # Not loaded to avoid per-row relationship queries
+        },
+    }
+
+
+def fast_json(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """
+    Return pre-shaped content as an orjson-encoded response.
+
+    Returning a Response from an endpoint skips FastAPI's `response_model`
+    validation, so only pass content built by the helpers above (or other
+    plain dicts that already match the declared schema).
+    """
+    return ORJSONResponse(content=content, status_code=status_code, headers=headers)
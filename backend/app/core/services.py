@@ -0,0 +1,87 @@
+"""
+Process-wide registry of the LLM, prompt and rate limiting services.
+
+Each service is built on first use and then shared by every request,
+WebSocket session and background worker in the process. Nothing is
+constructed at import time, so importing the API does not create provider
+clients or Redis connections.
+"""
+
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict
+
+if TYPE_CHECKING:
+    from app.services.generation_queue import GenerationQueue
+    from app.services.llm_service import LLMService
+    from app.services.prompt_service import PromptService
+    from app.services.prompt_test_jobs import PromptTestRunner
+    from app.services.prompt_tester import PromptTester
+    from app.services.rate_limiter import RateLimiter
+
+_instances: Dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def _get_or_create(name: str, factory: Callable[[], Any]) -> Any:
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def get_prompt_service() -> "PromptService":
+    def build():
+        from app.services.prompt_service import PromptService
+        return PromptService()
+    return _get_or_create("prompt_service", build)
+
+
+def get_llm_service() -> "LLMService":
+    def build():
+        from app.services.llm_service import LLMService
+        return LLMService(prompt_service=get_prompt_service())
+    return _get_or_create("llm_service", build)
+
+
+def get_prompt_tester() -> "PromptTester":
+    def build():
+        from app.services.prompt_tester import PromptTester
+        return PromptTester(prompt_service=get_prompt_service(), llm_service=get_llm_service())
+    return _get_or_create("prompt_tester", build)
+
+
+def get_prompt_test_runner() -> "PromptTestRunner":
+    def build():
+        from app.services.prompt_test_jobs import PromptTestRunner
+        return PromptTestRunner(get_prompt_tester())
+    return _get_or_create("prompt_test_runner", build)
+
+
+def get_generation_queue() -> "GenerationQueue":
+    def build():
+        from app.services.generation_queue import GenerationQueue
+        return GenerationQueue(get_llm_service().combine_elements)
+    return _get_or_create("generation_queue", build)
+
+
+def get_rate_limiter() -> "RateLimiter":
+    def build():
+        from app.services.rate_limiter import create_rate_limiter
+        return create_rate_limiter()
+    return _get_or_create("rate_limiter", build)
+
+
+def override_service(name: str, instance: Any) -> None:
+    """Replace a registered service, e.g. with a stub in tests or scripts."""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset_services() -> None:
+    """Forget every built service so the next use builds it again."""
+    with _lock:
+        _instances.clear()
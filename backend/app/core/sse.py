@@ -0,0 +1,19 @@
+from typing import Any, Optional
+
+import orjson
+
+# Headers that keep proxies from buffering an event stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Any, event_id: Optional[Any] = None) -> bytes:
+    """Encode one Server-Sent Events message with a JSON payload."""
+    message = b""
+    if event_id is not None:
+        message += b"id: " + str(event_id).encode("utf-8") + b"\n"
+    message += b"event: " + event.encode("utf-8") + b"\n"
+    message += b"data: " + orjson.dumps(data) + b"\n\n"
+    return message
@@ -1,9 +1,18 @@
+import os
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, exists, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal, Base, engine
 from app.models.element import DBElement, PlayerStats, player_elements
+from app.db.upsert import insert_ignoring_conflicts
+from app.db.versions import bump_language_version
+from app.services.player_cache import ensure_player
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Players provisioned per transaction by the basic-element backfill
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "5000"))
 
 # Language-specific basic elements
 LANGUAGE_BASIC_ELEMENTS = {
@@ -21,6 +30,71 @@ LANGUAGE_BASIC_ELEMENTS = {
     ]
 }
 
+# Columns added to tables that can predate them, with the constraints of each
+# column's ALTER TABLE; create_all only creates missing tables, so upgrade_schema
+# adds these to existing ones
+_ADDED_COLUMNS = {
+    "player_stats": {
+        "inventory_version": "NOT NULL DEFAULT 0",
+        # SQLite cannot add a column defaulting to CURRENT_TIMESTAMP; NULL means no Last-Modified yet
+        "inventory_updated_at": "",
+    },
+    # Rows unlocked before delta sync count as part of version 0
+    "player_elements": {
+        "seq": "NOT NULL DEFAULT 0",
+    },
+}
+
+def create_tables(bind: Engine = engine):
+    """Create any missing tables and upgrade existing ones. Called on application startup, not at import."""
+    with bind.connect() as connection:
+        require_player_ids(connection)
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        upgrade_schema(connection)
+
+def require_player_ids(connection: Connection) -> None:
+    """
+    Refuse to start on a database whose player tables are still keyed by name.
+    
+    Copying every inventory row can take long, so it is left to the migration
+    script instead of being done on startup.
+    """
+    if "player_elements" not in inspect(connection).get_table_names():
+        return
+    if "player_name" in {column["name"] for column in inspect(connection).get_columns("player_elements")}:
+        raise RuntimeError(
+            "Players are still keyed by name; stop the API and run "
+            "python -m app.scripts.migrate_player_ids first"
+        )
+
+def upgrade_schema(connection: Connection) -> None:
+    """
+    Bring tables created by an earlier version of the models up to date.
+    
+    Adds the `_ADDED_COLUMNS` a table is missing, then the model indexes
+    whose columns all exist. Every step checks what is already there, so it
+    is safe to run on each startup.
+    """
+    tables = set(inspect(connection).get_table_names())
+    for table_name, added in _ADDED_COLUMNS.items():
+        if table_name not in tables:
+            continue
+        table = Base.metadata.tables[table_name]
+        existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+        for name, constraints in added.items():
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type} {constraints}".rstrip()))
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in existing for column in index.columns):
+                index.create(connection, checkfirst=True)
+
 def init_db():
     db = SessionLocal()
     try:
@@ -37,80 +111,98 @@ def init_db():
                 element = DBElement(**element_data)
                 db.add(element)
                 elements_added += 1
+            bump_language_version(db, lang)
         
         db.commit()
         print(f"Added {elements_added} basic elements across all languages to the database.")
         
         # Make basic elements available to all existing players
-        players = db.query(PlayerStats).all()
-        for player in players:
-            # Get all basic elements
-            basic_elements = db.query(DBElement).filter(DBElement.is_basic == True).all()
-            
-            for element in basic_elements:
-                # Add basic elements to player's unlocked elements
-                db.execute(
-                    player_elements.insert().values(
-                        player_name=player.player_name,
-                        element_id=element.id
-                    )
-                )
-            # Update player stats
-            player.elements_unlocked += len(basic_elements)
-        
-        db.commit()
+        players, _ = backfill_basic_elements(db)
         if players:
-            print(f"Made basic elements available to {len(players)} existing players.")
+            print(f"Made basic elements available to {players} existing players.")
     finally:
         db.close()
 
-def add_basic_elements_to_player(player_name: str, language: str = "en"):
+def provision_basic_elements(db: Session, players, languages: Optional[Iterable[str]] = None) -> int:
     """
-    Add basic elements to a new player for the specified language.
+    Unlock the basic elements of `languages` (all if None) for the players matching `players`.
+
+    Two set-based statements regardless of the number of players: an UPDATE
+    bumping the inventory version and unlocked count of each player missing
+    some of the elements, then an INSERT ... SELECT ... ON CONFLICT DO NOTHING
+    of the elements, stamped with the player's new version. Returns the
+    number of unlocked rows. Runs inside the caller's transaction; the
+    caller commits.
     """
-    db = SessionLocal()
-    try:
-        # Get basic elements for the specified language
-        basic_elements = db.query(DBElement).filter(
-            (DBElement.is_basic == True) & 
-            (DBElement.language == language)
-        ).all()
-        
-        # Get or create player
-        player = db.query(PlayerStats).filter(PlayerStats.player_name == player_name).first()
-        if not player:
-            player = PlayerStats(player_name=player_name)
-            db.add(player)
-            db.flush()
-        
-        # Add basic elements to player's unlocked elements
-        elements_added = 0
-        for element in basic_elements:
-            # Check if player already has this element
-            existing = db.execute(
-                player_elements.select().where(
-                    (player_elements.c.player_name == player_name) &
-                    (player_elements.c.element_id == element.id)
-                )
-            ).first()
-            
-            if not existing:
-                db.execute(
-                    player_elements.insert().values(
-                        player_name=player_name,
-                        element_id=element.id
-                    )
-                )
-                elements_added += 1
-        
-        # Update player stats
-        if elements_added > 0:
-            player.elements_unlocked += elements_added
-        
+    basic = DBElement.is_basic == True
+    if languages is not None:
+        basic = and_(basic, DBElement.language.in_(list(languages)))
+    owned = exists().where(
+        (player_elements.c.player_id == PlayerStats.id) &
+        (player_elements.c.element_id == DBElement.id)
+    ).correlate_except(player_elements)
+    missing = select(func.count(DBElement.id)).where(basic).where(~owned).correlate(PlayerStats).scalar_subquery()
+    # Players already holding every element keep their version, so clients see no change
+    db.execute(
+        update(PlayerStats)
+        .where(players)
+        .where(missing > 0)
+        .values(
+            inventory_version=PlayerStats.inventory_version + 1,
+            inventory_updated_at=datetime.now(timezone.utc),
+            elements_unlocked=PlayerStats.elements_unlocked + missing,
+            # Provisioning is not player activity
+            last_active=PlayerStats.last_active,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    rows = (
+        select(PlayerStats.id, DBElement.id, PlayerStats.inventory_version)
+        .join(DBElement, basic)
+        .where(players)
+    )
+    statement = insert_ignoring_conflicts(db, player_elements)
+    if statement is None:
+        # No ON CONFLICT; filter out the owned rows instead
+        statement, rows = insert(player_elements), rows.where(~owned)
+    return db.execute(statement.from_select(["player_id", "element_id", "seq"], rows)).rowcount
+
+def add_basic_elements_to_player(db: Session, player_name: str, languages: Optional[Iterable[str]] = None) -> int:
+    """
+    Add the basic elements of `languages` (all if None) to a player, creating the player if needed.
+    
+    Returns the number of elements added; elements the player already has
+    are skipped. Runs inside the caller's transaction; the caller commits.
+    """
+    return provision_basic_elements(db, PlayerStats.id == ensure_player(db, player_name, provision=False), languages)
+
+def backfill_basic_elements(
+    db: Session,
+    languages: Optional[Iterable[str]] = None,
+    chunk_size: int = BACKFILL_CHUNK_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[int, int]:
+    """
+    Give every player the basic elements of `languages` (all if None) they are missing.
+    
+    Players are provisioned in ranges of `chunk_size` ids, each in its own
+    transaction, so memory use and lock times stay flat for any number of
+    players and an interrupted backfill can simply be run again. Calls
+    `progress(players_done, elements_added)` after each chunk and returns
+    the same pair at the end. Commits.
+    """
+    languages = list(languages) if languages is not None else None
+    max_id = db.query(func.max(PlayerStats.id)).scalar() or 0
+    players_done = elements_added = 0
+    for start in range(0, max_id, chunk_size):
+        in_chunk = (PlayerStats.id > start) & (PlayerStats.id <= start + chunk_size)
+        elements_added += provision_basic_elements(db, in_chunk, languages)
         db.commit()
-        return elements_added
-    finally:
-        db.close()
+        players_done += db.query(func.count(PlayerStats.id)).filter(in_chunk).scalar()
+        if progress is not None:
+            progress(players_done, elements_added)
+    return players_done, elements_added
 
 if __name__ == "__main__":
+    create_tables()
     init_db() 
\ No newline at end of file
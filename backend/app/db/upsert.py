@@ -0,0 +1,23 @@
+from typing import Optional
+
+from sqlalchemy import Table
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import Insert
+
+def insert_ignoring_conflicts(db: Session, table: Table) -> Optional[Insert]:
+    """
+    An `INSERT INTO table ... ON CONFLICT DO NOTHING` for the session's database.
+
+    Rows that would violate a primary key or unique constraint are skipped,
+    so the statement is idempotent and safe against concurrent inserts of
+    the same key. Returns None for dialects without `ON CONFLICT`; callers
+    then have to filter out existing rows themselves.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(table).on_conflict_do_nothing()
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.db.upsert import insert_ignoring_conflicts
+from app.models.element import LanguageVersion, PlayerStats
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def bump_language_version(db: Session, language: str) -> None:
+    """
+    Record that the element library for a language has changed.
+    
+    The first version of a language is created with an insert that ignores
+    conflicts, so concurrent first elements of a new language do not fail.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    statement = insert_ignoring_conflicts(db, LanguageVersion.__table__)
+    if statement is not None:
+        db.execute(statement.values(language=language, version=0, updated_at=_utcnow()))
+    
+    result = db.execute(
+        update(LanguageVersion)
+        .where(LanguageVersion.language == language)
+        .values(version=LanguageVersion.version + 1, updated_at=_utcnow())
+    )
+    if result.rowcount == 0:
+        # No ON CONFLICT; create the first version directly
+        db.add(LanguageVersion(language=language, version=1, updated_at=_utcnow()))
+        db.flush()
+
+def bump_inventory_version(db: Session, player_id: int) -> int:
+    """
+    Record that a player's unlocked elements have changed.
+    
+    Returns the new version, which callers store as the `seq` of the rows
+    they unlock so clients can sync deltas. Runs inside the caller's
+    transaction; the caller commits.
+    """
+    statement = (
+        update(PlayerStats)
+        .where(PlayerStats.id == player_id)
+        .values(inventory_version=PlayerStats.inventory_version + 1, inventory_updated_at=_utcnow())
+    )
+    if db.get_bind().dialect.update_returning:
+        return db.execute(statement.returning(PlayerStats.inventory_version)).scalar_one()
+    
+    db.execute(statement)
+    return db.query(PlayerStats.inventory_version).filter(PlayerStats.id == player_id).scalar()
+
+def get_language_version(db: Session, language: str) -> Tuple[int, Optional[datetime]]:
+    """
+    Return `(version, updated_at)` for a language's element library.
+    """
+    row = db.query(LanguageVersion.version, LanguageVersion.updated_at).filter(
+        LanguageVersion.language == language
+    ).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
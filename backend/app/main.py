@@ -1,10 +1,9 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.api import api_router
-from app.db.database import Base, engine
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from app.db.init_db import create_tables
+from app.services.warmup import start_warm_up, warmup_state
 
 app = FastAPI(
     title="Infinite Alchemist API",
@@ -24,6 +23,12 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router, prefix="/api")
 
+@app.on_event("startup")
+def create_database_tables():
+    # Done on startup rather than at import so importing the app stays cheap
+    create_tables()
+    start_warm_up()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Infinite Alchemist API"}
@@ -32,6 +37,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Report ready (200) once the startup warm-up has finished, 503 until then."""
+    return JSONResponse(warmup_state.to_dict(), status_code=200 if warmup_state.ready.is_set() else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
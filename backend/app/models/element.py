@@ -1,10 +1,21 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table, Boolean, Index
+from sqlalchemy.dialects.sqlite import DATETIME as SQLiteDateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
 from typing import Optional, List, Dict, Any
 from dataclasses import dataclass, field
 
+# Timestamp column type used for keyset pagination. SQLite stores server-side
+# CURRENT_TIMESTAMP values without microseconds, so bound parameters must use
+# the same text format for cursor comparisons to be exact.
+Timestamp = DateTime(timezone=True).with_variant(
+    SQLiteDateTime(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite",
+)
+
 # Association table for element combinations
 element_combinations = Table(
     "element_combinations",
@@ -14,16 +25,22 @@ element_combinations = Table(
     Column("result_id", Integer, ForeignKey("elements.id"), primary_key=True),
     Column("language", String, primary_key=True),  # "en", "ru", etc.
     Column("created_at", DateTime(timezone=True), server_default=func.now()),
-    Column("discovered_by", String, nullable=True),
+    Column("discovered_by_id", Integer, ForeignKey("player_stats.id"), nullable=True),
 )
 
-# Association table for player-unlocked elements
+# Association table for player-unlocked elements, keyed by integer player id
+# (the name lives only in player_stats) to keep the rows and indexes small
 player_elements = Table(
     "player_elements",
     Base.metadata,
-    Column("player_name", String, primary_key=True),
+    Column("player_id", Integer, ForeignKey("player_stats.id"), primary_key=True),
     Column("element_id", Integer, ForeignKey("elements.id"), primary_key=True),
     Column("unlocked_at", DateTime(timezone=True), server_default=func.now()),
+    # Player's inventory_version at the time of the unlock, for delta sync
+    Column("seq", Integer, nullable=False, server_default="0"),
+    Index("ix_player_elements_player_id_seq", "player_id", "seq"),
+    # Store the rows in primary key order on SQLite instead of in a rowid table plus a PK index
+    sqlite_with_rowid=False,
 )
 
 class DBElement(Base):
@@ -38,6 +55,11 @@ class DBElement(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     created_by = Column(String, nullable=True)
     
+    __table_args__ = (
+        # Keyset pagination of a language's elements by id
+        Index("ix_elements_language_id", "language", "id"),
+    )
+    
     # Relationships
     discovered_by = relationship("DiscoveryHistory", back_populates="element")
     
@@ -105,21 +127,44 @@ class PlayerStats(Base):
     successful_combinations = Column(Integer, default=0)
     failed_combinations = Column(Integer, default=0)
     
+    # Bumped whenever the player's unlocked elements change (used for ETags)
+    inventory_version = Column(Integer, default=0, nullable=False)
+    inventory_updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    
     def __repr__(self):
         return f"<PlayerStats(player_name='{self.player_name}', elements_discovered={self.elements_discovered})>"
 
+# Per-language library version, bumped whenever an element is added
+class LanguageVersion(Base):
+    __tablename__ = "language_versions"
+    
+    language = Column(String, primary_key=True)  # "en", "ru", etc.
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<LanguageVersion(language='{self.language}', version={self.version})>"
+
 # Discovery history to track when elements were discovered
 class DiscoveryHistory(Base):
     __tablename__ = "discovery_history"
     
     id = Column(Integer, primary_key=True, index=True)
     element_id = Column(Integer, ForeignKey("elements.id"), index=True)
-    player_name = Column(String, index=True)
-    discovered_at = Column(DateTime(timezone=True), server_default=func.now())
+    player_id = Column(Integer, ForeignKey("player_stats.id"), nullable=True)
+    discovered_at = Column(Timestamp, server_default=func.now())
     is_first_discovery = Column(Boolean, default=False)  # Whether this was the first global discovery
     
+    __table_args__ = (
+        # Keyset pagination of the discovery feeds by (discovered_at, id)
+        Index("ix_discovery_history_discovered_at_id", "discovered_at", "id"),
+        Index("ix_discovery_history_first_discovered_at_id", "is_first_discovery", "discovered_at", "id"),
+        Index("ix_discovery_history_player_id_discovered_at_id", "player_id", "discovered_at", "id"),
+        Index("ix_discovery_history_element_discovered_at_id", "element_id", "discovered_at", "id"),
+    )
+    
     # Relationship to the element
     element = relationship("DBElement", back_populates="discovered_by")
     
     def __repr__(self):
-        return f"<DiscoveryHistory(element_id={self.element_id}, player_name='{self.player_name}')>" 
\ No newline at end of file
+        return f"<DiscoveryHistory(element_id={self.element_id}, player_id={self.player_id})>" 
\ No newline at end of file
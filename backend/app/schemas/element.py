@@ -29,6 +29,16 @@ class CombinationRequest(BaseModel):
             }
         }
 
+class ElementPair(BaseModel):
+    element1_id: int
+    element2_id: int
+
+class BatchCombinationRequest(BaseModel):
+    pairs: List[ElementPair] = Field(..., min_length=1, max_length=100)
+    player_name: Optional[str] = None
+    lang: str = "en"
+    prompt_name: str = "default"
+
 class CombinationResponse(BaseModel):
     element1_id: int
     element2_id: int
@@ -38,6 +48,11 @@ class CombinationResponse(BaseModel):
     is_first_discovery: bool = False
     error: Optional[str] = None
 
+class CombinationJob(BaseModel):
+    job_id: Optional[str] = None  # None when the result was known and returned straight away
+    status: str  # "queued", "running", "completed" or "failed"
+    result: Optional[CombinationResponse] = None
+
 class Element(ElementBase):
     id: int
     created_at: datetime
@@ -53,6 +68,7 @@ CombinationResponse.model_rebuild()
 
 class ElementList(BaseModel):
     elements: List[Element]
+    next_cursor: Optional[str] = None  # Opaque token for the next page, None on the last page
 
 # Player elements schema
 class PlayerElementBase(BaseModel):
@@ -67,6 +83,11 @@ class PlayerElement(PlayerElementBase):
 
 class PlayerElementList(BaseModel):
     elements: List[Element]
+    next_cursor: Optional[str] = None
+
+class PlayerElementDelta(BaseModel):
+    version: int  # Player's current inventory version, pass back as `since`
+    elements: List[Element]
 
 # Player statistics schemas
 class PlayerStatsBase(BaseModel):
@@ -90,6 +111,7 @@ class PlayerStats(PlayerStatsBase):
 
 class PlayerStatsList(BaseModel):
     stats: List[PlayerStats]
+    next_cursor: Optional[str] = None
 
 # Discovery history schemas
 class DiscoveryHistoryBase(BaseModel):
@@ -109,4 +131,5 @@ class DiscoveryHistory(DiscoveryHistoryBase):
         from_attributes = True
 
 class DiscoveryHistoryList(BaseModel):
-    discoveries: List[DiscoveryHistory] 
\ No newline at end of file
+    discoveries: List[DiscoveryHistory]
+    next_cursor: Optional[str] = None 
\ No newline at end of file
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Give every existing player the basic elements they are missing.
+
+Players are processed in chunks of ids, one transaction per chunk, so the
+backfill streams through any number of players and can be interrupted and
+run again safely.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.db.database import SessionLocal
+from app.db.init_db import BACKFILL_CHUNK_SIZE, backfill_basic_elements
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    """Backfill the basic elements of every player."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lang", action="append", default=None,
+                        help="only add the basic elements of this language (repeatable; default: all languages)")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE,
+                        help=f"players per transaction (default: {BACKFILL_CHUNK_SIZE})")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def report(players: int, elements: int) -> None:
+        elapsed = time.perf_counter() - started
+        logger.info(f"{players} players done, {elements} elements added ({players / elapsed:.0f} players/s)")
+
+    db = SessionLocal()
+    try:
+        players, elements = backfill_basic_elements(db, args.lang, args.chunk_size, progress=report)
+    finally:
+        db.close()
+    logger.info(f"Backfill finished: {elements} elements added for {players} players "
+                f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Benchmark player_elements keyed by player name against keyed by player id.
+
+Builds both layouts in SQLite files with the same inventory rows and
+reports table and index sizes (from the dbstat virtual table) and the time
+of the two hot lookups: the ownership check of one (player, element) pair
+when a player unlocks an element, and a player's inventory delta after a
+version (the `(player, seq)` index).
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.models.element import player_elements
+
+# The layout before player ids, for comparison
+NAME_KEYED_SCHEMA = [
+    """CREATE TABLE player_elements (
+        player_name VARCHAR NOT NULL,
+        element_id INTEGER NOT NULL,
+        unlocked_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        seq INTEGER DEFAULT '0' NOT NULL,
+        PRIMARY KEY (player_name, element_id)
+    )""",
+    "CREATE INDEX ix_player_elements_player_seq ON player_elements (player_name, seq)",
+]
+
+def id_keyed_schema():
+    """The current layout, generated from the model."""
+    dialect = sqlite.dialect()
+    return [str(CreateTable(player_elements).compile(dialect=dialect))] + [
+        str(CreateIndex(index).compile(dialect=dialect)) for index in player_elements.indexes
+    ]
+
+def player_key(layout: str, player: int):
+    return f"player_{player:08d}" if layout == "name" else player
+
+def build(path: str, layout: str, players: int, per_player: int) -> float:
+    """Fill a database with `players` inventories of `per_player` elements, in unlock order per player."""
+    connection = sqlite3.connect(path)
+    for statement in NAME_KEYED_SCHEMA if layout == "name" else id_keyed_schema():
+        connection.execute(statement)
+    column, key = ("player_name", "'player_' || printf('%08d', p.i)") if layout == "name" else ("player_id", "p.i")
+    started = time.perf_counter()
+    connection.execute(f"""
+        WITH RECURSIVE
+            p(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM p WHERE i < {players}),
+            e(j) AS (SELECT 1 UNION ALL SELECT j + 1 FROM e WHERE j < {per_player})
+        INSERT INTO player_elements ({column}, element_id, seq)
+        SELECT {key}, e.j, (e.j + 3) / 4 FROM p, e
+    """)
+    connection.commit()
+    elapsed = time.perf_counter() - started
+    connection.execute("ANALYZE")
+    connection.close()
+    return elapsed
+
+def sizes(path: str):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE '%player_elements%' GROUP BY name ORDER BY name"
+        ).fetchall()
+    finally:
+        connection.close()
+
+def time_lookups(path: str, layout: str, players: int, per_player: int, lookups: int):
+    """Return microseconds per ownership check and per delta query, on random players."""
+    column = "player_name" if layout == "name" else "player_id"
+    connection = sqlite3.connect(path)
+    rng = random.Random(42)
+    targets = [(player_key(layout, rng.randint(1, players)), rng.randint(1, per_player)) for _ in range(lookups)]
+    try:
+        started = time.perf_counter()
+        for player, element in targets:
+            connection.execute(
+                f"SELECT 1 FROM player_elements WHERE {column} = ? AND element_id = ?", (player, element)
+            ).fetchone()
+        owned = (time.perf_counter() - started) / lookups * 1e6
+
+        started = time.perf_counter()
+        for player, element in targets:
+            connection.execute(
+                f"SELECT element_id, seq FROM player_elements WHERE {column} = ? AND seq > ? ORDER BY seq",
+                (player, per_player // 8)
+            ).fetchall()
+        delta = (time.perf_counter() - started) / lookups * 1e6
+    finally:
+        connection.close()
+    return owned, delta
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000, help="inventory rows per layout (default: 10M)")
+    parser.add_argument("--per-player", type=int, default=100, help="elements per player (default: 100)")
+    parser.add_argument("--lookups", type=int, default=20000, help="random lookups timed per query (default: 20000)")
+    args = parser.parse_args()
+
+    players = max(1, args.rows // args.per_player)
+    print(f"{players} players x {args.per_player} elements = {players * args.per_player} rows per layout")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in ("name", "id"):
+            path = os.path.join(directory, f"{layout}.db")
+            build_time = build(path, layout, players, args.per_player)
+            owned, delta = time_lookups(path, layout, players, args.per_player, args.lookups)
+            print(f"\nkeyed by player {layout}: built in {build_time:.1f}s, file {os.path.getsize(path) / 2**20:.1f} MiB")
+            for name, size in sizes(path):
+                print(f"  {name:<45} {size / 2**20:10.1f} MiB")
+            print(f"  ownership check {owned:8.2f} us   inventory delta {delta:8.2f} us")
+
+if __name__ == "__main__":
+    main()
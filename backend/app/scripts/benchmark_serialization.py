@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Benchmark element list serialization.
+
+Compares the previous response path (ORM objects -> hand-built dicts ->
+`ElementList` validation -> `jsonable_encoder` -> `json.dumps`) with the
+projected-row path (column rows -> pre-shaped dicts -> orjson) on an
+in-memory database.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.serialization import ELEMENT_COLUMNS, elements_to_dicts
+from app.db.database import Base
+from app.models.element import DBElement
+from app.schemas.element import ElementList
+
+def build_session(count: int):
+    """Create an in-memory database holding `count` elements."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.bulk_insert_mappings(DBElement, [
+        {"name": f"Element {i}", "emoji": "✨", "is_basic": i < 4, "language": "en"}
+        for i in range(count)
+    ])
+    db.commit()
+    return Session
+
+def previous_path(Session, count: int) -> bytes:
+    db = Session()
+    try:
+        elements = db.query(DBElement).filter(DBElement.language == "en").limit(count).all()
+        element_dicts = [
+            {
+                "id": element.id,
+                "name": element.name,
+                "emoji": element.emoji,
+                "is_basic": element.is_basic,
+                "language": element.language,
+                "created_at": element.created_at,
+                "created_by": element.created_by,
+                "discovered_by": None,
+            }
+            for element in elements
+        ]
+        validated = ElementList.model_validate({"elements": element_dicts})
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode("utf-8")
+    finally:
+        db.close()
+
+def fast_path(Session, count: int) -> bytes:
+    db = Session()
+    try:
+        elements = db.query(*ELEMENT_COLUMNS).filter(DBElement.language == "en").limit(count).all()
+        return orjson.dumps({"elements": elements_to_dicts(elements), "next_cursor": None})
+    finally:
+        db.close()
+
+def measure(func, Session, count: int, repeat: int) -> float:
+    """Return the best wall time in milliseconds over `repeat` runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(Session, count)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--elements", type=int, default=10_000, help="Number of elements per response")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per path (best time is reported)")
+    args = parser.parse_args()
+
+    Session = build_session(args.elements)
+
+    # Warm up both paths once
+    previous_path(Session, args.elements)
+    fast_path(Session, args.elements)
+
+    previous_ms = measure(previous_path, Session, args.elements, args.repeat)
+    fast_ms = measure(fast_path, Session, args.elements, args.repeat)
+
+    print(f"Elements per response: {args.elements}")
+    print(f"Previous path:  {previous_ms:8.1f} ms")
+    print(f"Projected path: {fast_ms:8.1f} ms")
+    print(f"Speedup:        {previous_ms / fast_ms:8.1f}x")
+
+if __name__ == "__main__":
+    main()
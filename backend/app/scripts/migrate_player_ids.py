@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+Migrate an existing database from player names to integer player ids.
+
+Rebuilds `player_elements` keyed by `(player_id, element_id)`, and replaces
+`discovery_history.player_name` with `player_id` and
+`element_combinations.discovered_by` with `discovered_by_id`. Columns added
+since the first release (e.g. `player_elements.seq`) are added first, so
+databases of any earlier version can be migrated. Players only referenced
+by name get a `player_stats` row first. Rows are copied in
+chunks, one transaction each, and every step checks what is already done,
+so an interrupted migration can simply be run again. Stop the API while it
+runs. SQLite needs version 3.35 or newer (for DROP COLUMN).
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import column, distinct, exists, func, insert, inspect, select, table, text, update
+from sqlalchemy.orm import Session
+
+from app.db.database import Base, SessionLocal
+from app.db.init_db import upgrade_schema
+from app.models.element import DiscoveryHistory, PlayerStats, player_elements
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rows (or players, for player_elements) copied per transaction
+MIGRATION_CHUNK_SIZE = 50000
+
+def columns_of(db: Session, table_name: str) -> set:
+    return {info["name"] for info in inspect(db.connection()).get_columns(table_name)}
+
+def add_missing_players(db: Session, name_column) -> None:
+    """Create a `player_stats` row for every name in `name_column` without one."""
+    names = (
+        select(distinct(name_column))
+        .where(name_column.isnot(None))
+        .where(~exists().where(PlayerStats.player_name == name_column))
+    )
+    added = db.execute(insert(PlayerStats).from_select(["player_name"], names)).rowcount
+    if added:
+        logger.info(f"Created {added} players referenced only by name")
+
+def in_chunks(db: Session, id_column, chunk_size: int, step) -> None:
+    """Call `step(in_chunk)` for consecutive ranges of `id_column`, committing after each."""
+    max_id = db.execute(select(func.max(id_column))).scalar() or 0
+    for start in range(0, max_id, chunk_size):
+        step((id_column > start) & (id_column <= start + chunk_size))
+        db.commit()
+        logger.info(f"{id_column}: {min(start + chunk_size, max_id)}/{max_id}")
+
+def migrate_player_elements(db: Session, chunk_size: int) -> None:
+    tables = inspect(db.connection()).get_table_names()
+    if "player_name" in columns_of(db, "player_elements"):
+        add_missing_players(db, table("player_elements", column("player_name")).c.player_name)
+        db.execute(text("DROP INDEX IF EXISTS ix_player_elements_player_seq"))
+        db.execute(text("ALTER TABLE player_elements RENAME TO player_elements_old"))
+        player_elements.create(db.connection())
+        db.commit()
+    elif "player_elements_old" not in tables:
+        logger.info("player_elements is already keyed by player id")
+        return
+
+    old = table("player_elements_old", column("player_name"), column("element_id"), column("unlocked_at"), column("seq"))
+    rows = (
+        select(PlayerStats.id, old.c.element_id, old.c.unlocked_at, old.c.seq)
+        .join(old, old.c.player_name == PlayerStats.player_name)
+    )
+    copied = ~exists().where(
+        (player_elements.c.player_id == PlayerStats.id) & (player_elements.c.element_id == old.c.element_id)
+    )
+
+    def copy(in_chunk):
+        db.execute(insert(player_elements).from_select(
+            ["player_id", "element_id", "unlocked_at", "seq"], rows.where(in_chunk).where(copied)
+        ))
+
+    in_chunks(db, PlayerStats.id, chunk_size, copy)
+    db.execute(text("DROP TABLE player_elements_old"))
+    db.commit()
+
+def migrate_name_column(db: Session, table_name: str, name: str, id_name: str, chunk_column: str, old_indexes, new_indexes, chunk_size: int) -> None:
+    """Replace the player name column `name` of a table with the player id column `id_name`."""
+    columns = columns_of(db, table_name)
+    if name not in columns:
+        logger.info(f"{table_name}.{name} is already replaced by {id_name}")
+        return
+
+    target = table(table_name, column(name), column(id_name), column(chunk_column))
+    add_missing_players(db, target.c[name])
+    if id_name not in columns:
+        db.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {id_name} INTEGER REFERENCES player_stats(id)"))
+    db.commit()
+
+    player_id = select(PlayerStats.id).where(PlayerStats.player_name == target.c[name]).scalar_subquery()
+
+    def fill(in_chunk):
+        db.execute(
+            update(target)
+            .where(in_chunk)
+            .where(target.c[name].isnot(None))
+            .where(target.c[id_name].is_(None))
+            .values({id_name: player_id})
+        )
+
+    in_chunks(db, target.c[chunk_column], chunk_size, fill)
+    for index_name in old_indexes:
+        db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+    db.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {name}"))
+    for index in new_indexes:
+        index.create(db.connection(), checkfirst=True)
+    db.commit()
+
+def migrate(db: Session, chunk_size: int = MIGRATION_CHUNK_SIZE) -> None:
+    """Run every step of the migration on the session's database."""
+    # The copies below read and write columns that older databases lack
+    Base.metadata.create_all(bind=db.get_bind())
+    upgrade_schema(db.connection())
+    db.commit()
+
+    migrate_player_elements(db, chunk_size)
+    migrate_name_column(
+        db, "discovery_history", "player_name", "player_id", "id",
+        ["ix_discovery_history_player_name", "ix_discovery_history_player_discovered_at_id"],
+        [index for index in DiscoveryHistory.__table__.indexes if "player_id" in index.columns],
+        chunk_size,
+    )
+    migrate_name_column(
+        db, "element_combinations", "discovered_by", "discovered_by_id", "element1_id",
+        [], [], chunk_size,
+    )
+
+def main():
+    """Migrate player names to player ids."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=MIGRATION_CHUNK_SIZE,
+                        help=f"rows or players per transaction (default: {MIGRATION_CHUNK_SIZE})")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        migrate(db, args.chunk_size)
+    finally:
+        db.close()
+    logger.info(f"Migration finished in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
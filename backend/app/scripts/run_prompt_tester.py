@@ -4,6 +4,7 @@ Script to run the prompt tester with additional combinations.
 This script tests both valid combinations and combinations that should be refused.
 """
 
+import argparse
 import os
 import sys
 import json
@@ -13,7 +14,8 @@ import logging
 # Add the parent directory to the path so we can import app modules
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from app.services.prompt_tester import PromptTester
+from app.services.prompt_cassette import CASSETTE_MODES, PROMPT_CASSETTE_MODE, PROMPT_CASSETTE_PATH, Cassette, ReplayLLM
+from app.services.prompt_tester import PROMPT_TEST_WORKERS, PromptTester
 from app.services.prompt_service import PromptService
 from app.services.llm_service import LLMService
 
@@ -24,12 +26,30 @@ logger = logging.getLogger(__name__)
 
 def main():
     """Run the prompt tester with additional combinations."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=PROMPT_TEST_WORKERS,
+                        help=f"maximum number of LLM requests in flight (default: {PROMPT_TEST_WORKERS})")
+    parser.add_argument("--lang", default=None, help="only test the prompts of this language")
+    parser.add_argument("--cassette", choices=CASSETTE_MODES, default=PROMPT_CASSETTE_MODE,
+                        help="replay recorded LLM responses instead of calling the provider "
+                             f"(default: {PROMPT_CASSETTE_MODE})")
+    parser.add_argument("--cassette-path", default=PROMPT_CASSETTE_PATH,
+                        help="JSON lines file the responses are recorded to and replayed from")
+    parser.add_argument("--full", action="store_true",
+                        help="run every test case again instead of reusing stored results of unchanged prompts")
+    args = parser.parse_args()
+    
     logger.info("Initializing prompt tester...")
     
     # Initialize services
     prompt_service = PromptService()
-    llm_service = LLMService()
-    prompt_tester = PromptTester(prompt_service, llm_service)
+    if args.cassette == "replay":
+        # Replays run offline, without credentials or provider clients
+        llm_service = ReplayLLM()
+    else:
+        llm_service = LLMService(prompt_service=prompt_service)
+    cassette = Cassette(args.cassette_path, args.cassette)
+    prompt_tester = PromptTester(prompt_service, llm_service, workers=args.workers, cassette=cassette)
     
     # Add more test cases to the prompt tester
     # Format: (element1, element2, expected_result)
@@ -96,32 +116,48 @@ def main():
         prompt_tester.add_test_case(element1, element2, expected)
     
     # Run the tests
-    logger.info("Running prompt tests...")
-    results = prompt_tester.test_all_prompts()
+    logger.info(f"Running prompt tests with {args.workers} workers...")
+    results = prompt_tester.test_all_prompts(args.lang, incremental=not args.full)
     
     # Print the results
     logger.info("Test results:")
-    for language, language_results in results.items():
-        for prompt_name, prompt_results in language_results.items():
-            success_count = sum(1 for r in prompt_results if r.get("success", False))
-            total_count = len(prompt_results)
-            success_rate = (success_count / total_count) * 100 if total_count > 0 else 0
-            
-            logger.info(f"Language: {language}, Prompt: {prompt_name}")
-            logger.info(f"Success rate: {success_rate:.2f}% ({success_count}/{total_count})")
-            
-            # Print details of failed tests
-            failed_tests = [r for r in prompt_results if not r.get("success", False)]
-            if failed_tests:
-                logger.info("Failed tests:")
-                for test in failed_tests:
-                    element1 = test.get("element1", "Unknown")
-                    element2 = test.get("element2", "Unknown")
-                    expected = test.get("expected", "Unknown")
-                    error = test.get("error", "No error message")
-                    
-                    logger.info(f"  {element1} + {element2} = {expected} (Error: {error})")
+    for prompt_result in results:
+        prompt_results = prompt_result["test_cases"]
+        success_count = sum(1 for r in prompt_results if r.get("success", False))
+        total_count = len(prompt_results)
+        success_rate = (success_count / total_count) * 100 if total_count > 0 else 0
+        
+        logger.info(f"Language: {prompt_result['lang']}, Prompt: {prompt_result['name']}")
+        logger.info(f"Success rate: {success_rate:.2f}% ({success_count}/{total_count})")
+        
+        # Print details of failed tests
+        failed_tests = [r for r in prompt_results if not r.get("success", False)]
+        if failed_tests:
+            logger.info("Failed tests:")
+            for test in failed_tests:
+                element1 = test.get("element1", "Unknown")
+                element2 = test.get("element2", "Unknown")
+                expected = test.get("expected", "Unknown")
+                error = test.get("error", "No error message")
+                
+                logger.info(f"  {element1} + {element2} = {expected} (Error: {error})")
+    
+    if results:
+        logger.info("Latency, tokens and cost:")
+        for report in prompt_tester.result_store.run_report(results[0]["run_id"]):
+            p50, p95 = report["latency_p50_ms"], report["latency_p95_ms"]
+            latency = f"p50 {p50:.0f} ms, p95 {p95:.0f} ms" if p50 is not None else "no latency"
+            tokens = report["completion_tokens_mean"]
+            logger.info(
+                f"  {report['lang']}/{report['name']}: {latency}, "
+                f"{tokens or 0:.0f} completion tokens on average, cost ${report['cost']:.4f}, "
+                f"parse paths {report['parse_paths']}"
+            )
     
+    if cassette.mode != "off":
+        logger.info(f"Cassette ({cassette.mode}): {cassette.hits} replayed, {cassette.recorded} recorded in {cassette.path}")
+    if results:
+        logger.info(f"Results stored as run {results[0]['run_id']} in {prompt_tester.result_store.path}")
     logger.info("Prompt testing completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,374 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.core.serialization import ELEMENT_COLUMNS, element_to_dict
+from app.db.versions import bump_inventory_version, bump_language_version
+from app.models.element import DBElement, DiscoveryHistory, PlayerStats, element_combinations, player_elements
+from app.services.element_cache import recipe_cache
+from app.services.player_cache import ensure_player
+
+logger = logging.getLogger(__name__)
+
+# How many unknown pairs of one batch are sent to the LLM at the same time
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+Pair = Tuple[int, int]
+
+def pair_key(element1_id: int, element2_id: int) -> Pair:
+    """Return the order-independent key under which a combination is stored."""
+    return (element1_id, element2_id) if element1_id <= element2_id else (element2_id, element1_id)
+
+def combination_result(
+    element1_id: int,
+    element2_id: int,
+    result_element: Optional[Any] = None,
+    is_new_discovery: bool = False,
+    is_first_discovery: bool = False,
+    error: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Shape a combination outcome like the `CombinationResponse` schema."""
+    return {
+        "element1_id": element1_id,
+        "element2_id": element2_id,
+        "result_id": result_element.id if result_element is not None else None,
+        "result": element_to_dict(result_element) if result_element is not None else None,
+        "is_new_discovery": is_new_discovery,
+        "is_first_discovery": is_first_discovery,
+        "error": error,
+    }
+
+def update_player_stats(db: Session, player_name: str, **kwargs):
+    """
+    Add the given amounts to a player's statistics, creating the player if needed.
+
+    One UPDATE by id; the player's id usually comes from the player cache.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if not player_name:
+        return
+
+    counters = {
+        key: func.coalesce(getattr(PlayerStats, key), 0) + value
+        for key, value in kwargs.items()
+        if key in PlayerStats.__table__.c
+    }
+    player_id = ensure_player(db, player_name)
+    if counters:
+        db.execute(
+            update(PlayerStats)
+            .where(PlayerStats.id == player_id)
+            .values(counters)
+            .execution_options(synchronize_session=False)
+        )
+
+def record_discovery(db: Session, element_id: int, player_name: str, is_first_discovery: bool = False):
+    """
+    Record a new element discovery in the history.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if not player_name:
+        return
+
+    discovery = DiscoveryHistory(
+        element_id=element_id,
+        player_id=ensure_player(db, player_name),
+        is_first_discovery=is_first_discovery
+    )
+    db.add(discovery)
+
+def unlock_elements_for_player(db: Session, player_name: str, element_ids: List[int]) -> List[int]:
+    """
+    Unlock several elements for a player at once.
+
+    Returns the ids that were newly unlocked. All of them share one inventory
+    version. Runs inside the caller's transaction; the caller commits.
+    """
+    if not player_name or not element_ids:
+        return []
+
+    player_id = ensure_player(db, player_name)
+    wanted = set(element_ids)
+    owned = {
+        row.element_id
+        for row in db.execute(
+            player_elements.select().where(
+                (player_elements.c.player_id == player_id) &
+                (player_elements.c.element_id.in_(wanted))
+            )
+        )
+    }
+    new_ids = sorted(wanted - owned)
+    if not new_ids:
+        return []
+
+    seq = bump_inventory_version(db, player_id)
+    db.execute(
+        player_elements.insert(),
+        [{"player_id": player_id, "element_id": element_id, "seq": seq} for element_id in new_ids]
+    )
+    return new_ids
+
+def unlock_element_for_player(db: Session, player_name: str, element_id: int) -> bool:
+    """
+    Unlock an element for a player. Returns True if this is a new unlock.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    return bool(unlock_elements_for_player(db, player_name, [element_id]))
+
+def record_player_success(db: Session, player_name: Optional[str], result_id: int) -> bool:
+    """
+    Unlock a combination result for a player and count the success.
+
+    Returns True if the element was newly unlocked. Runs inside the caller's
+    transaction; the caller commits.
+    """
+    if not player_name:
+        return False
+
+    is_new_unlock = unlock_element_for_player(db, player_name, result_id)
+    update_player_stats(
+        db, player_name,
+        successful_combinations=1,
+        elements_unlocked=1 if is_new_unlock else 0
+    )
+    return is_new_unlock
+
+def find_known_results(db: Session, pairs: List[Pair], lang: str) -> Dict[Pair, Any]:
+    """
+    Look up the stored results of many combinations.
+
+    `pairs` must already be normalized with `pair_key`. Results come from the
+    process-wide recipe cache where possible; the rest are loaded with a
+    single query and cached. Each result is a projected element row with
+    the `ELEMENT_COLUMNS` fields.
+    """
+    if not pairs:
+        return {}
+
+    results = {}
+    missing = []
+    for key in set(pairs):
+        row = recipe_cache.get(lang, key)
+        if row is None:
+            missing.append(key)
+        else:
+            results[key] = row
+    if not missing:
+        return results
+
+    rows = db.query(
+        element_combinations.c.element1_id,
+        element_combinations.c.element2_id,
+        *ELEMENT_COLUMNS,
+    ).join(
+        DBElement, DBElement.id == element_combinations.c.result_id
+    ).filter(
+        element_combinations.c.language == lang,
+        tuple_(element_combinations.c.element1_id, element_combinations.c.element2_id).in_(missing),
+    ).all()
+
+    found = {(row.element1_id, row.element2_id): row for row in rows}
+    recipe_cache.put_many(((lang, key), row) for key, row in found.items())
+    results.update(found)
+    return results
+
+def store_llm_result(
+    db: Session,
+    key: Pair,
+    lang: str,
+    llm_result: Dict[str, Any],
+    player_name: Optional[str] = None,
+) -> Tuple[Optional[DBElement], bool, Optional[str]]:
+    """
+    Persist the outcome of an LLM combination for the pair `key`.
+
+    Returns `(result_element, is_new_discovery, error)`. Refusals and
+    unparseable responses are not stored and return an error message
+    instead. Runs inside the caller's transaction; the caller commits.
+    """
+    # Check if the combination is valid
+    if "valid" in llm_result and llm_result["valid"] == False:
+        return None, False, llm_result.get("reason", "This combination is not possible.")
+
+    # Check that the LLM actually produced an element
+    if "result" not in llm_result:
+        return None, False, "Failed to generate a new element."
+
+    # Check if the resulting element already exists in this language
+    result_element = db.query(DBElement).filter(
+        (DBElement.name == llm_result["result"]) &
+        (DBElement.language == lang)
+    ).first()
+
+    player_id = ensure_player(db, player_name) if player_name else None
+    is_new_discovery = False
+    if not result_element:
+        # Create the new element
+        result_element = DBElement(
+            name=llm_result["result"],
+            emoji=llm_result.get("emoji", "✨"),
+            is_basic=False,
+            language=lang,
+            created_by=player_name
+        )
+        db.add(result_element)
+        db.flush()  # Get the ID
+        bump_language_version(db, lang)
+        is_new_discovery = True
+
+        # Record the discovery
+        db.add(DiscoveryHistory(
+            element_id=result_element.id,
+            player_id=player_id,
+            is_first_discovery=True
+        ))
+
+    # Record the combination
+    db.execute(
+        element_combinations.insert().values(
+            element1_id=key[0],
+            element2_id=key[1],
+            result_id=result_element.id,
+            language=lang,
+            discovered_by_id=player_id
+        )
+    )
+
+    return result_element, is_new_discovery, None
+
+def combine_batch(
+    db: Session,
+    llm_service,
+    pairs: List[Pair],
+    lang: str = "en",
+    player_name: Optional[str] = None,
+    prompt_name: str = "default",
+    max_workers: int = BATCH_LLM_CONCURRENCY,
+    limit: Optional[Callable[[str, str], float]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Combine many pairs of elements, yielding one result per pair as it is ready.
+
+    Elements and known recipes are resolved with one query each and yielded
+    first. Unknown pairs are deduplicated and sent to the LLM concurrently,
+    and their results are yielded as they complete. Every yielded dict has
+    the `CombinationResponse` fields plus the `index` of its pair in `pairs`.
+
+    `limit(element1_name, element2_name)` is called for each distinct pair
+    before it is sent to the LLM and returns 0 to allow it, or the seconds
+    to wait; pairs over the limit get an error and a `retry_after` field.
+
+    All writes (new elements, recipes, unlocks and player stats) happen in
+    one transaction that is committed after the last result. If the commit
+    fails a final `{"error": ...}` line is yielded.
+    """
+    # Load every referenced element in one query
+    element_ids = {element_id for pair in pairs for element_id in pair}
+    elements = {
+        element.id: element
+        for element in db.query(DBElement).filter(DBElement.id.in_(element_ids)).all()
+    } if element_ids else {}
+
+    valid: List[Tuple[int, Pair]] = []
+    for index, (element1_id, element2_id) in enumerate(pairs):
+        element1 = elements.get(element1_id)
+        element2 = elements.get(element2_id)
+        if not element1 or not element2:
+            error = "One or both elements not found"
+        elif element1.language != lang or element2.language != lang:
+            error = f"Elements must be in the same language as the request ({lang})"
+        else:
+            valid.append((index, pair_key(element1_id, element2_id)))
+            continue
+        yield {"index": index, **combination_result(element1_id, element2_id, error=error)}
+
+    known = find_known_results(db, [key for _, key in valid], lang)
+
+    unlocked_ids: List[int] = []
+    successful = 0
+
+    # Known recipes are answered straight away
+    pending: Dict[Pair, List[int]] = {}
+    for index, key in valid:
+        result_element = known.get(key)
+        if result_element is None:
+            pending.setdefault(key, []).append(index)
+            continue
+        unlocked_ids.append(result_element.id)
+        successful += 1
+        yield {"index": index, **combination_result(pairs[index][0], pairs[index][1], result_element)}
+
+    # Pairs over the rate limit are answered without the LLM
+    if limit is not None:
+        for key in list(pending):
+            retry_after = limit(elements[key[0]].name, elements[key[1]].name)
+            if not retry_after:
+                continue
+            for index in pending.pop(key):
+                yield {
+                    "index": index,
+                    **combination_result(pairs[index][0], pairs[index][1], error="Rate limit exceeded"),
+                    "retry_after": retry_after,
+                }
+
+    # Unknown recipes go to the LLM, each distinct pair once
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            futures = {
+                executor.submit(
+                    llm_service.combine_elements,
+                    elements[key[0]].name,
+                    elements[key[1]].name,
+                    lang=lang,
+                    prompt_name=prompt_name,
+                ): key
+                for key in pending
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    llm_result = future.result()
+                except Exception as e:
+                    logger.error(f"LLM call failed for {key}: {e}")
+                    llm_result = {"valid": False, "reason": "Failed to generate a new element."}
+
+                result_element, is_new_discovery, error = store_llm_result(db, key, lang, llm_result, player_name)
+                if result_element is not None:
+                    unlocked_ids.append(result_element.id)
+
+                # Only the first request for a pair counts as its discovery
+                for position, index in enumerate(pending[key]):
+                    if result_element is not None:
+                        successful += 1
+                    first = is_new_discovery and position == 0
+                    yield {
+                        "index": index,
+                        **combination_result(
+                            pairs[index][0], pairs[index][1], result_element,
+                            is_new_discovery=first, is_first_discovery=first, error=error,
+                        ),
+                    }
+
+    # Unlocks and stats for the whole batch
+    if player_name:
+        new_unlocks = unlock_elements_for_player(db, player_name, unlocked_ids)
+        if successful or new_unlocks:
+            update_player_stats(
+                db, player_name,
+                successful_combinations=successful,
+                elements_unlocked=len(new_unlocks),
+            )
+
+    try:
+        db.commit()
+    except Exception as e:
+        logger.error(f"Failed to commit combination batch: {e}")
+        db.rollback()
+        yield {"error": "Failed to save combination results."}
@@ -0,0 +1,155 @@
+"""
+Server-Sent Events feed of world-first discoveries.
+
+The feed lives in process memory: discoveries are picked up from the
+commits of this process's sessions and replayed from this process's buffer.
+With several workers, each subscriber only sees the discoveries committed
+by the worker serving its stream, and a reconnect to another worker cannot
+replay what the first one buffered. Deployments that need every
+discovery should run a single worker or have clients poll
+`/api/discoveries/first` instead.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.serialization import discovery_row_to_dict, query_discovery_rows
+from app.core.sse import sse_event
+from app.models.element import DiscoveryHistory
+
+logger = logging.getLogger(__name__)
+
+# Number of recent first discoveries kept for replay
+DISCOVERY_FEED_BUFFER = int(os.getenv("DISCOVERY_FEED_BUFFER", "1000"))
+# Undelivered events after which a subscriber is disconnected
+DISCOVERY_FEED_MAX_PENDING = int(os.getenv("DISCOVERY_FEED_MAX_PENDING", "100"))
+# Seconds between keep-alive comments on an idle stream
+DISCOVERY_FEED_KEEPALIVE = float(os.getenv("DISCOVERY_FEED_KEEPALIVE", "15"))
+
+_PENDING_KEY = "pending_first_discoveries"
+
+class Subscriber:
+    """One connected feed client, drained by its own response coroutine."""
+
+    def __init__(self, last_id: int = 0):
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+        self.last_id = last_id
+        self.dropped = False
+
+class DiscoveryFeed:
+    """
+    Push feed of first discoveries with a replay buffer.
+
+    Committed first discoveries are picked up from SQLAlchemy session
+    events, shaped like the `DiscoveryHistory` schema and encoded as an SSE
+    message once. The encoded bytes are kept in a ring buffer and handed to
+    every subscriber's queue in a single pass on the event loop. Subscribers
+    that fall `max_pending` messages behind are disconnected and can resume
+    from the buffer with the last id they saw, without touching the database.
+    """
+
+    def __init__(self, buffer_size: int = DISCOVERY_FEED_BUFFER, max_pending: int = DISCOVERY_FEED_MAX_PENDING):
+        self.max_pending = max_pending
+        self._buffer: deque = deque(maxlen=buffer_size)  # (id, encoded message)
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, session_class=Session) -> None:
+        """Publish first discoveries committed through sessions of `session_class`."""
+        event.listen(session_class, "after_flush", self._collect)
+        event.listen(session_class, "after_commit", self._publish_committed)
+        event.listen(session_class, "after_rollback", self._discard)
+
+    def _collect(self, session: Session, flush_context) -> None:
+        ids = [
+            obj.id for obj in session.new
+            if isinstance(obj, DiscoveryHistory) and obj.is_first_discovery
+        ]
+        if not ids:
+            return
+        # Shape the events while the rows are visible inside the transaction;
+        # nothing may be queried once it has committed
+        rows = query_discovery_rows(session).filter(DiscoveryHistory.id.in_(ids)).all()
+        session.info.setdefault(_PENDING_KEY, []).extend(discovery_row_to_dict(row) for row in rows)
+
+    def _publish_committed(self, session: Session) -> None:
+        for discovery in sorted(session.info.pop(_PENDING_KEY, []), key=lambda d: d["id"]):
+            self.publish(discovery)
+
+    def _discard(self, session: Session) -> None:
+        session.info.pop(_PENDING_KEY, None)
+
+    def publish(self, discovery: Dict[str, Any]) -> None:
+        """Add a discovery to the buffer and fan it out. Safe to call from any thread."""
+        message = sse_event("discovery", discovery, event_id=discovery["id"])
+        with self._lock:
+            self._buffer.append((discovery["id"], message))
+            loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._fan_out, discovery["id"], message)
+
+    def subscribe(self, last_id: Optional[int] = None) -> Subscriber:
+        """
+        Register a subscriber. Must be called from the event loop.
+
+        With `last_id` the buffered discoveries after it are queued first;
+        without it only new discoveries are delivered.
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            newest = self._buffer[-1][0] if self._buffer else 0
+            backlog = [message for event_id, message in self._buffer if last_id is not None and event_id > last_id]
+        subscriber = Subscriber(last_id=newest)
+        for message in backlog:
+            subscriber.queue.put_nowait(message)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    async def stream(self, subscriber: Subscriber, keepalive: float = DISCOVERY_FEED_KEEPALIVE) -> AsyncIterator[bytes]:
+        """Yield a subscriber's SSE messages until it is dropped or the client goes away."""
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _fan_out(self, event_id: int, message: bytes) -> None:
+        # Runs on the event loop, so subscribers cannot change underneath it
+        for subscriber in list(self._subscribers):
+            if event_id <= subscriber.last_id:
+                continue  # Already queued from the backlog
+            if subscriber.queue.qsize() >= self.max_pending:
+                self._drop(subscriber)
+                continue
+            subscriber.last_id = event_id
+            subscriber.queue.put_nowait(message)
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        logger.info("Dropping slow discovery feed subscriber")
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        # Free the pending messages and wake the consumer so it closes the stream
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
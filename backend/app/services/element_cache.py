@@ -0,0 +1,48 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+# Maximum number of recipes kept in the process-wide recipe cache
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "100000"))
+
+RecipeKey = Tuple[str, Tuple[int, int]]  # (language, normalized pair)
+
+class RecipeCache:
+    """
+    Process-wide LRU cache of known recipes.
+
+    Maps `(language, pair_key)` to the result element as an immutable
+    projected row (the `ELEMENT_COLUMNS` fields), so entries can be shared
+    between sessions and threads. Recipes are never changed or deleted once
+    stored, so entries do not need invalidation; unknown pairs are not cached.
+    """
+
+    def __init__(self, max_size: int = RECIPE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[RecipeKey, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, lang: str, key: Tuple[int, int]) -> Optional[Any]:
+        with self._lock:
+            row = self._entries.get((lang, key))
+            if row is not None:
+                self._entries.move_to_end((lang, key))
+            return row
+
+    def put_many(self, items: Iterable[Tuple[RecipeKey, Any]]) -> None:
+        with self._lock:
+            for recipe_key, row in items:
+                self._entries[recipe_key] = row
+                self._entries.move_to_end(recipe_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+recipe_cache = RecipeCache()
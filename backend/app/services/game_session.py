@@ -0,0 +1,160 @@
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.db.database import SessionLocal
+from app.models.element import DBElement, player_elements
+from app.services.combination_service import (
+    Pair,
+    combination_result,
+    find_known_results,
+    pair_key,
+    store_llm_result,
+    unlock_element_for_player,
+    update_player_stats,
+)
+from app.services.player_cache import ensure_player
+
+logger = logging.getLogger(__name__)
+
+class GameSession:
+    """
+    Per-connection state for a player's WebSocket game session.
+
+    The player row, their unlocked element ids, the elements they have used
+    and the recipes they have hit are kept in memory for the lifetime of the
+    connection, so combining a known recipe usually needs no database reads.
+    Successful-combination counts are buffered and written together with the
+    next unlock or when the session closes.
+
+    Methods are synchronous and not thread-safe; the WebSocket handler runs
+    them in a thread pool one at a time. Each one ends its transaction before
+    returning, so an idle connection holds no pooled database connection.
+    """
+
+    def __init__(self, player_name: str, session_factory=SessionLocal):
+        self.player_name = player_name
+        self.db = session_factory()
+        self.inventory: Set[int] = set()
+        self.elements: Dict[int, Tuple[str, str]] = {}  # id -> (name, language)
+        self.recipes: Dict[Tuple[str, Pair], Dict[str, Any]] = {}  # (lang, pair) -> result element
+        self.pending_successful = 0
+
+    @contextmanager
+    def _transaction(self):
+        """Commit the work of one message, or roll it back if it fails."""
+        try:
+            yield
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def load(self) -> None:
+        """Resolve (or create) the player and load their inventory."""
+        with self._transaction():
+            player_id = ensure_player(self.db, self.player_name)
+            self.inventory = {
+                row.element_id
+                for row in self.db.execute(
+                    player_elements.select().where(player_elements.c.player_id == player_id)
+                )
+            }
+
+    def _get_elements(self, *element_ids: int) -> Dict[int, Tuple[str, str]]:
+        missing = [element_id for element_id in element_ids if element_id not in self.elements]
+        if missing:
+            for row in self.db.query(DBElement.id, DBElement.name, DBElement.language).filter(
+                DBElement.id.in_(missing)
+            ):
+                self.elements[row.id] = (row.name, row.language)
+        return {element_id: self.elements[element_id] for element_id in element_ids if element_id in self.elements}
+
+    def resolve(self, element1_id: int, element2_id: int, lang: str) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """
+        Try to answer a combination without the LLM.
+
+        Returns `(response, None)` when the pair is invalid or a known recipe,
+        or `(None, (element1_name, element2_name))` when the LLM is needed.
+        """
+        with self._transaction():
+            return self._resolve(element1_id, element2_id, lang)
+
+    def _resolve(self, element1_id: int, element2_id: int, lang: str) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        elements = self._get_elements(element1_id, element2_id)
+        if element1_id not in elements or element2_id not in elements:
+            return combination_result(element1_id, element2_id, error="One or both elements not found"), None
+        if elements[element1_id][1] != lang or elements[element2_id][1] != lang:
+            error = f"Elements must be in the same language as the request ({lang})"
+            return combination_result(element1_id, element2_id, error=error), None
+
+        key = pair_key(element1_id, element2_id)
+        result = self.recipes.get((lang, key))
+        if result is None:
+            result_element = find_known_results(self.db, [key], lang).get(key)
+            if result_element is None:
+                return None, (elements[element1_id][0], elements[element2_id][0])
+            result = combination_result(element1_id, element2_id, result_element)["result"]
+            self.recipes[(lang, key)] = result
+
+        self._record_success(result["id"])
+        response = combination_result(element1_id, element2_id)
+        response.update(result_id=result["id"], result=result)
+        return response, None
+
+    def store_generated(self, element1_id: int, element2_id: int, lang: str, llm_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist an LLM result for a pair and return the response to send."""
+        with self._transaction():
+            return self._store_generated(element1_id, element2_id, lang, llm_result)
+
+    def _store_generated(self, element1_id: int, element2_id: int, lang: str, llm_result: Dict[str, Any]) -> Dict[str, Any]:
+        key = pair_key(element1_id, element2_id)
+
+        # Another connection may have stored the recipe in the meantime
+        result_element = find_known_results(self.db, [key], lang).get(key)
+        is_new_discovery = False
+        if result_element is None:
+            result_element, is_new_discovery, error = store_llm_result(
+                self.db, key, lang, llm_result, self.player_name
+            )
+            if error:
+                self.db.rollback()
+                return combination_result(element1_id, element2_id, error=error)
+
+        response = combination_result(
+            element1_id, element2_id, result_element,
+            is_new_discovery=is_new_discovery, is_first_discovery=is_new_discovery
+        )
+        self.recipes[(lang, key)] = response["result"]
+        self._record_success(result_element.id)
+        return response
+
+    def _record_success(self, result_id: int) -> None:
+        self.pending_successful += 1
+        if result_id in self.inventory:
+            return
+
+        # New unlocks are written straight away together with buffered stats
+        unlock_element_for_player(self.db, self.player_name, result_id)
+        self.inventory.add(result_id)
+        self._flush_stats(elements_unlocked=1)
+
+    def _flush_stats(self, **extra: int) -> None:
+        update_player_stats(
+            self.db, self.player_name,
+            successful_combinations=self.pending_successful,
+            **extra
+        )
+        self.db.commit()
+        self.pending_successful = 0
+
+    def close(self) -> None:
+        """Write any buffered stats and release the database session."""
+        try:
+            if self.pending_successful:
+                self._flush_stats()
+        except Exception as e:
+            logger.error(f"Failed to flush stats for {self.player_name}: {e}")
+            self.db.rollback()
+        finally:
+            self.db.close()
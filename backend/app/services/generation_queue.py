@@ -0,0 +1,227 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.db.database import SessionLocal
+from app.services.combination_service import (
+    Pair,
+    combination_result,
+    find_known_results,
+    pair_key,
+    record_player_success,
+    store_llm_result,
+)
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of generation jobs waiting for a worker
+GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "100"))
+# Number of worker threads, i.e. concurrent LLM calls for queued jobs
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+# How many finished jobs are kept around for polling
+GENERATION_JOB_RETENTION = int(os.getenv("GENERATION_JOB_RETENTION", "1000"))
+
+class QueueFull(Exception):
+    """Raised when a job cannot be accepted because the queue is at capacity."""
+
+@dataclass
+class GenerationJob:
+    """A queued LLM generation for one pair of elements in one language."""
+    id: str
+    element1_id: int
+    element2_id: int
+    element1_name: str
+    element2_name: str
+    lang: str
+    prompt_name: str
+    status: str = "queued"  # queued, running, completed or failed
+    players: List[str] = field(default_factory=list)
+    result: Optional[Dict[str, Any]] = None
+    created_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Shape the job like the `CombinationJob` schema."""
+        return {"job_id": self.id, "status": self.status, "result": self.result}
+
+class GenerationQueue:
+    """
+    In-process queue of combination generations served by a pool of worker threads.
+
+    Requests for a pair that is already queued or running in the same
+    language and prompt are attached to the existing job instead of
+    creating a new one. Each worker uses its own database session, stores
+    the result like `/combine` does and unlocks it for every player that
+    asked for the pair. Worker threads are started on the first submit.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[..., Dict[str, Any]],
+        session_factory=SessionLocal,
+        workers: int = GENERATION_WORKERS,
+        max_size: int = GENERATION_QUEUE_SIZE,
+        retention: int = GENERATION_JOB_RETENTION,
+    ):
+        self.generate = generate
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.retention = retention
+        self._queue: "queue.Queue[Optional[GenerationJob]]" = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, GenerationJob]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, Pair], GenerationJob] = {}
+        self._finished: deque = deque()
+        self._threads: List[threading.Thread] = []
+
+    def submit(
+        self,
+        element1_id: int,
+        element2_id: int,
+        element1_name: str,
+        element2_name: str,
+        lang: str = "en",
+        prompt_name: str = "default",
+        player_name: Optional[str] = None,
+    ) -> GenerationJob:
+        """
+        Queue a generation, or join the pending job for the same pair.
+
+        Raises `QueueFull` if a new job is needed and the queue is at capacity.
+        """
+        key = (lang, prompt_name, pair_key(element1_id, element2_id))
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is None:
+                job = GenerationJob(
+                    id=uuid.uuid4().hex,
+                    element1_id=element1_id,
+                    element2_id=element2_id,
+                    element1_name=element1_name,
+                    element2_name=element2_name,
+                    lang=lang,
+                    prompt_name=prompt_name,
+                )
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    raise QueueFull(f"Generation queue is full ({self._queue.maxsize} jobs)")
+                self._jobs[job.id] = job
+                self._inflight[key] = job
+                self._start_workers()
+            if player_name and player_name not in job.players:
+                job.players.append(player_name)
+        return job
+
+    def find(self, element1_id: int, element2_id: int, lang: str = "en", prompt_name: str = "default") -> Optional[GenerationJob]:
+        """Return the queued or running job for a pair, if there is one."""
+        with self._lock:
+            return self._inflight.get((lang, prompt_name, pair_key(element1_id, element2_id)))
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        """Return a job by id, or None if it is unknown or has been evicted."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self._queue.qsize()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers once the jobs already queued are done."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start_workers(self) -> None:
+        # Called with the lock held
+        if self._threads:
+            return
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"generation-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            except Exception as e:
+                logger.error(f"Generation job {job.id} failed: {e}")
+                self._finish(job, "failed", combination_result(
+                    job.element1_id, job.element2_id, error="Failed to generate a new element."
+                ))
+
+    def _run(self, job: GenerationJob) -> None:
+        job.status = "running"
+        key = pair_key(job.element1_id, job.element2_id)
+        db = self.session_factory()
+        try:
+            # The recipe may have been stored since the job was queued
+            result_element = find_known_results(db, [key], job.lang).get(key)
+            is_new_discovery = False
+            if result_element is None:
+                llm_result = self.generate(
+                    job.element1_name,
+                    job.element2_name,
+                    lang=job.lang,
+                    prompt_name=job.prompt_name,
+                )
+                first_player = job.players[0] if job.players else None
+                result_element, is_new_discovery, error = store_llm_result(
+                    db, key, job.lang, llm_result, first_player
+                )
+                if error:
+                    db.rollback()
+                    self._finish(job, "completed", combination_result(job.element1_id, job.element2_id, error=error))
+                    return
+
+            # The job leaves _inflight only once the recipe is committed, so a
+            # new job for the pair finds it; players who joined while the
+            # previous players were committed are unlocked in another round
+            recorded = 0
+            while True:
+                with self._lock:
+                    players = job.players[recorded:]
+                for player_name in players:
+                    record_player_success(db, player_name, result_element.id)
+                db.commit()
+                recorded += len(players)
+                with self._lock:
+                    if len(job.players) == recorded:
+                        self._inflight.pop((job.lang, job.prompt_name, key), None)
+                        break
+
+            self._finish(job, "completed", combination_result(
+                job.element1_id,
+                job.element2_id,
+                result_element,
+                is_new_discovery=is_new_discovery,
+                is_first_discovery=is_new_discovery
+            ))
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _finish(self, job: GenerationJob, status: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            job.result = result
+            job.status = status
+            self._inflight.pop((job.lang, job.prompt_name, pair_key(job.element1_id, job.element2_id)), None)
+            self._finished.append(job.id)
+            while len(self._finished) > self.retention:
+                self._jobs.pop(self._finished.popleft(), None)
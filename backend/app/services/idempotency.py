@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Tuple
+
+from fastapi import HTTPException, Response
+
+# How long a stored result answers retries with the same key
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+# Maximum number of keys kept; the oldest finished ones are evicted first
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# How long a retry waits for the original request to finish before giving up with 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+# Maximum number of retries waiting at once; each blocks a threadpool worker, more get 409 right away
+IDEMPOTENCY_MAX_WAITERS = int(os.getenv("IDEMPOTENCY_MAX_WAITERS", "8"))
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    expires_at: float
+    done: threading.Event = field(default_factory=threading.Event)
+    status_code: int = 200
+    body: bytes = b""
+    headers: Dict[str, str] = field(default_factory=dict)
+    failed: bool = False
+
+def request_fingerprint(*parts: str) -> str:
+    """Hash the parts of a request that must match for a key to be reused."""
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+class IdempotencyStore:
+    """
+    Bounded in-memory store of responses by `Idempotency-Key`.
+
+    The first request with a key runs and its response is kept for
+    `ttl` seconds. Retries with the same key get that response back; a retry
+    that arrives while the first request is still running waits for it
+    instead of doing the work again. Requests that raise (an
+    `HTTPException` such as a 429, or an error) are not stored, so they
+    can be retried.
+
+    Only finished entries are evicted when `max_keys` is reached, so a
+    retry never re-runs a request that is still in progress; the store
+    briefly holds more keys while that many requests run. Waiting retries
+    block the calling (threadpool) thread, so at most `max_waiters` wait at
+    once and the rest get 409 immediately.
+    """
+
+    def __init__(
+        self,
+        ttl: float = IDEMPOTENCY_TTL_SECONDS,
+        max_keys: int = IDEMPOTENCY_MAX_KEYS,
+        wait: float = IDEMPOTENCY_WAIT_SECONDS,
+        max_waiters: int = IDEMPOTENCY_MAX_WAITERS,
+    ):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.wait = wait
+        self.max_waiters = max_waiters
+        self._waiters = 0
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def run(self, scope: str, key: str, fingerprint: str, handler: Callable[[], Response]) -> Response:
+        """
+        Return the stored response for `(scope, key)`, or call `handler` and store its response.
+
+        Raises 422 if the key was used with a different request and 409 if
+        the original request is still running after the wait, or right away
+        when `max_waiters` retries are already waiting.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            # A running request's entry is kept past its TTL, so it still answers its retries
+            if entry is not None and entry.done.is_set() and entry.expires_at <= now:
+                del self._entries[(scope, key)]
+                entry = None
+            owner = entry is None
+            waiter = False
+            if owner:
+                entry = _Entry(fingerprint=fingerprint, expires_at=now + self.ttl)
+                self._entries[(scope, key)] = entry
+                self._evict()
+            elif entry.fingerprint == fingerprint and not entry.done.is_set():
+                if self._waiters >= self.max_waiters:
+                    raise self._in_progress()
+                self._waiters += 1
+                waiter = True
+
+        if entry.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+        if owner:
+            return self._execute(scope, key, entry, handler)
+
+        if waiter:
+            try:
+                finished = entry.done.wait(self.wait)
+            finally:
+                with self._lock:
+                    self._waiters -= 1
+            if not finished:
+                raise self._in_progress()
+        if entry.failed:
+            # The original attempt failed and was forgotten; run this one instead
+            return self.run(scope, key, fingerprint, handler)
+        return Response(
+            content=entry.body,
+            status_code=entry.status_code,
+            headers={**entry.headers, "Idempotent-Replayed": "true"}
+        )
+
+    @staticmethod
+    def _in_progress() -> HTTPException:
+        return HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+            headers={"Retry-After": "1"}
+        )
+
+    def _evict(self) -> None:
+        # Called with the lock held; entries of running requests are kept
+        excess = len(self._entries) - self.max_keys
+        if excess <= 0:
+            return
+        finished = (entry_key for entry_key, entry in self._entries.items() if entry.done.is_set())
+        for entry_key in list(islice(finished, excess)):
+            del self._entries[entry_key]
+
+    def _execute(self, scope: str, key: str, entry: _Entry, handler: Callable[[], Response]) -> Response:
+        try:
+            response = handler()
+        except BaseException:
+            # Let the client retry the failed request with the same key
+            with self._lock:
+                if self._entries.get((scope, key)) is entry:
+                    del self._entries[(scope, key)]
+            entry.failed = True
+            entry.done.set()
+            raise
+
+        entry.status_code = response.status_code
+        entry.body = bytes(response.body)
+        entry.headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in ("content-length", "set-cookie")
+        }
+        entry.done.set()
+        return response
+
+    def __len__(self) -> int:
+        return len(self._entries)
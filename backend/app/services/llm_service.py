@@ -1,13 +1,12 @@
 import os
 import json
 import re
-import redis
 import logging
+import threading
 import traceback
-from functools import lru_cache
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, Optional, Tuple
 from dotenv import load_dotenv
-from langchain.llms import OpenAI, HuggingFaceEndpoint
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -16,51 +15,113 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# LLM responses kept in memory when Redis is not configured
+LLM_MEMORY_CACHE_SIZE = int(os.getenv("LLM_MEMORY_CACHE_SIZE", "1000"))
+
+def find_json_object(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Find the first complete top-level JSON object in `text`.
+    
+    Returns `(start, end)` so that `text[start:end]` is the object, or None
+    if no object has been closed yet. Braces inside strings are ignored.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+    return None
+
+def llm_settings() -> Tuple[str, str, Dict[str, Any]]:
+    """Return the provider, model name and generation parameters configured in the environment"""
+    llm_provider = os.getenv("LLM_PROVIDER", "huggingface").lower()
+    if llm_provider == "openai":
+        return llm_provider, "gpt-4o-mini", {"temperature": 0.7}
+    if llm_provider == "huggingface":
+        model_name = os.getenv("LLM_MODEL", "lightblue/suzume-llama-3-8B-multilingual")
+        return llm_provider, model_name, {
+            "temperature": 0.5,
+            "max_new_tokens": 150,
+            "do_sample": True,
+        }
+    raise ValueError(f"Unsupported LLM provider: {llm_provider}")
+
 class LLMService:
-    def __init__(self):
+    def __init__(self, prompt_service=None):
         # Determine which LLM provider to use
-        llm_provider = os.getenv("LLM_PROVIDER", "huggingface").lower()
+        self.provider, self.model_name, self.generation_params = llm_settings()
         
-        if llm_provider == "openai":
+        if self.provider == "openai":
             # Initialize OpenAI LLM
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY environment variable is not set")
             
+            # Provider SDKs are imported only for the configured provider
+            from langchain.llms.openai import OpenAI
+            
             self.llm = OpenAI(
-                temperature=0.7,
                 openai_api_key=api_key,
-                model_name="gpt-4o-mini"
+                model_name=self.model_name,
+                **self.generation_params
             )
-        elif llm_provider == "huggingface":
+            # langchain's OpenAI streams natively
+            self.stream_client = None
+        else:
             # Initialize Hugging Face LLM
             api_key = os.getenv("LLM_API_KEY")
-            model_name = os.getenv("LLM_MODEL", "lightblue/suzume-llama-3-8B-multilingual")
             
             if not api_key:
                 raise ValueError("LLM_API_KEY environment variable is not set")
             
+            from langchain.llms.huggingface_endpoint import HuggingFaceEndpoint
+            
             self.llm = HuggingFaceEndpoint(
-                endpoint_url=f"https://api-inference.huggingface.co/models/{model_name}",
+                endpoint_url=f"https://api-inference.huggingface.co/models/{self.model_name}",
                 huggingfacehub_api_token=api_key,
                 task="text-generation",
-                model_kwargs={
-                    "temperature": 0.5,
-                    "max_new_tokens": 150,
-                    "do_sample": True,
-                }
+                model_kwargs=dict(self.generation_params)
             )
-        else:
-            raise ValueError(f"Unsupported LLM provider: {llm_provider}")
+            
+            # HuggingFaceEndpoint has no native streaming: its stream() returns the
+            # whole completion as one chunk, so streaming goes through the inference client
+            from huggingface_hub import InferenceClient
+            
+            self.stream_client = InferenceClient(model=self.model_name, api_key=api_key)
         
         # Define the prompt template for element combinations
         self.combination_template = self._get_prompt_template()
         
+        # Responses by formatted prompt, used when Redis is not available
+        self.memory_cache: "OrderedDict[str, str]" = OrderedDict()
+        self.memory_cache_lock = threading.Lock()
+        
         # Initialize Redis cache if available
         redis_url = os.getenv("REDIS_URL")
         self.cache_enabled = redis_url is not None
         if self.cache_enabled:
             try:
+                import redis
+                
                 self.redis = redis.from_url(redis_url)
                 logger.info("Redis cache initialized successfully")
             except Exception as e:
@@ -70,7 +131,7 @@ class LLMService:
         # Load prompt service if available
         try:
             from app.services.prompt_service import PromptService
-            self.prompt_service = PromptService()
+            self.prompt_service = prompt_service or PromptService()
             self.use_prompt_service = True
         except (ImportError, Exception) as e:
             logger.warning(f"Prompt service not available: {e}")
@@ -97,6 +158,14 @@ class LLMService:
                 return None
         return None
     
+    def is_cached(self, element1: str, element2: str, lang: str = "en", prompt_name: str = "default") -> bool:
+        """Return True if a combination can be answered from the cache without calling the LLM"""
+        if self.cache_enabled:
+            return self._get_from_cache(element1, element2, lang) is not None
+        prompt = self._get_formatted_prompt(element1, element2, lang, prompt_name)
+        with self.memory_cache_lock:
+            return prompt in self.memory_cache
+    
     def _save_to_cache(self, element1: str, element2: str, result: Dict[str, Any], lang: str = "en") -> None:
         """Save a result to the cache"""
         if not self.cache_enabled:
@@ -105,18 +174,29 @@ class LLMService:
         cache_key = self._get_cache_key(element1, element2, lang)
         self.redis.set(cache_key, json.dumps(result), ex=60*60*24*7)  # Cache for 1 week
     
-    # Update the memory cache to include language
-    @lru_cache(maxsize=1000)
-    def _memory_cache(self, element1: str, element2: str, lang: str = "en", prompt_name: str = "default") -> str:
-        """In-memory cache fallback when Redis is not available"""
-        # Generate the prompt
-        prompt = self._get_formatted_prompt(element1, element2, lang, prompt_name)
-        # Get response from LLM
-        return self._get_llm_response(prompt)
+    # Keyed by the formatted prompt, so a reloaded or edited template misses the cache
+    def _memory_cache(self, prompt: str) -> str:
+        """In-memory LRU cache fallback when Redis is not available"""
+        with self.memory_cache_lock:
+            response = self.memory_cache.get(prompt)
+            if response is not None:
+                self.memory_cache.move_to_end(prompt)
+                return response
+        
+        response = self._get_llm_response(prompt)
+        with self.memory_cache_lock:
+            self.memory_cache[prompt] = response
+            while len(self.memory_cache) > LLM_MEMORY_CACHE_SIZE:
+                self.memory_cache.popitem(last=False)
+        return response
     
     def _get_formatted_prompt(self, element1: str, element2: str, lang: str = "en", prompt_name: str = "default") -> str:
         """Get a formatted prompt for element combination"""
         try:
+            # The prompt service keeps the templates in memory and reloads them when their files change
+            if self.use_prompt_service:
+                return self.prompt_service.format_prompt(lang, prompt_name, element1, element2)
+
             # Try to load language-specific prompts
             prompt_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts", f"{lang}.json")
             if os.path.exists(prompt_file):
@@ -140,6 +220,33 @@ class LLMService:
         """Get a response from the LLM"""
         return self.llm(prompt)
     
+    def _get_llm_response_with_usage(self, prompt: str) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Get a response from the LLM with the token usage reported by the provider, if any"""
+        generation = self.llm.generate([prompt])
+        token_usage = (generation.llm_output or {}).get("token_usage") or {}
+        usage = None
+        if "prompt_tokens" in token_usage or "completion_tokens" in token_usage:
+            usage = {
+                "prompt_tokens": token_usage.get("prompt_tokens"),
+                "completion_tokens": token_usage.get("completion_tokens"),
+            }
+        return generation.generations[0][0].text, usage
+    
+    def _stream_llm_response(self, prompt: str) -> Iterator[str]:
+        """Yield the LLM's response in chunks as the provider generates them"""
+        if self.stream_client is None:
+            yield from self.llm.stream(prompt)
+            return
+        
+        try:
+            tokens = self.stream_client.text_generation(prompt, stream=True, **self.generation_params)
+        except Exception as e:
+            # Models not served by a streaming backend only answer in one piece
+            logger.warning(f"Streaming not available for {self.model_name}, sending the whole response at once: {e}")
+            yield self._get_llm_response(prompt)
+            return
+        yield from tokens
+    
     def _get_prompt_template(self):
         """Get the prompt template for combining elements."""
         return """You are the Infinite Alchemist, a game about combining elements to create new ones.
@@ -197,169 +304,224 @@ Now, combine {element1} and {element2}:"""
         # If not in cache, use the LLM
         try:
             # Use in-memory cache or direct LLM call
+            prompt = self._get_formatted_prompt(element1, element2, lang, prompt_name)
             if self.cache_enabled:
-                prompt = self._get_formatted_prompt(element1, element2, lang, prompt_name)
                 response = self._get_llm_response(prompt)
             else:
-                # Use the memory cache with language support
-                response = self._memory_cache(element1, element2, lang, prompt_name)
+                response = self._memory_cache(prompt)
             
             # Log the full LLM response for debugging
             logger.info(f"\n\n==== LLM RESPONSE FOR {element1} + {element2} ({lang}) ====")
-            logger.info(f"PROMPT: {self._get_formatted_prompt(element1, element2, lang, prompt_name)}")
+            logger.info(f"PROMPT: {prompt}")
             logger.info(f"RESPONSE: {response}")
             logger.info("==== END LLM RESPONSE ====\n\n")
             
-            # Try to parse the response as JSON
+            return self._parse_llm_response(response, element1, element2, lang)
+        except Exception as e:
+            return self._error_result(e, element1, element2, lang)
+    
+    def stream_combine_elements(self, element1: str, element2: str, lang: str = "en", prompt_name: str = "default") -> Iterator[Dict[str, Any]]:
+        """
+        Stream the LLM's answer for a combination.
+        
+        Yields `{"type": "token", "text": ...}` events while the model
+        generates, then exactly one `{"type": "result", "result": ...}` event
+        with the same dictionary `combine_elements` would return. Generation
+        is stopped as soon as the first JSON object in the output closes.
+        
+        OpenAI streams through langchain and Hugging Face through the
+        `huggingface_hub` inference client; models that cannot stream
+        deliver the whole completion as a single token event.
+        """
+        cached_result = self._get_from_cache(element1, element2, lang)
+        if cached_result:
+            logger.info(f"Cache hit for {element1} + {element2} ({lang})")
+            yield {"type": "result", "result": cached_result}
+            return
+        
+        try:
+            prompt = self._get_formatted_prompt(element1, element2, lang, prompt_name)
+            response = ""
+            span = None
+            stream = self._stream_llm_response(prompt)
             try:
-                # Clean up the response - extract JSON from various formats
-                cleaned_response = response
-                
-                # Method 1: Extract JSON from markdown code blocks
-                if "```" in response:
-                    # Look for JSON code blocks
-                    json_blocks = re.findall(r'```(?:json)?(.*?)```', response, re.DOTALL)
-                    if json_blocks:
-                        cleaned_response = json_blocks[0].strip()
-                
-                # Method 2: Look for JSON-like structures with curly braces
-                else:
-                    # Find the first opening brace and the last closing brace
-                    start_idx = response.find('{')
-                    end_idx = response.rfind('}')
-                    
-                    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                        cleaned_response = response[start_idx:end_idx+1]
-                
-                # Fix common JSON issues
-                # 1. Fix unquoted emoji values
-                cleaned_response = re.sub(r'"emoji":\s*([^",}\s]+)', r'"emoji": "\1"', cleaned_response)
-                
-                # 2. Fix missing quotes around keys
-                cleaned_response = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', cleaned_response)
-                
-                # 3. Fix trailing commas
-                cleaned_response = re.sub(r',\s*}', '}', cleaned_response)
-                
-                # 4. Fix missing quotes around string values
-                cleaned_response = re.sub(r':\s*([^",\d{}\[\]\s][^",{}\[\]\s]*)\s*([,}])', r': "\1"\2', cleaned_response)
-                
-                # Log the cleaned response
-                logger.info(f"CLEANED RESPONSE: {cleaned_response}")
+                for chunk in stream:
+                    response += chunk
+                    yield {"type": "token", "text": chunk}
+                    span = find_json_object(response)
+                    if span:
+                        break
+            finally:
+                # Closing the stream early stops the provider from generating further tokens
+                stream.close()
+            
+            logger.info(f"STREAMED RESPONSE FOR {element1} + {element2} ({lang}): {response}")
+            if span:
+                response = response[span[0]:span[1]]
+            result = self._parse_llm_response(response, element1, element2, lang)
+        except Exception as e:
+            result = self._error_result(e, element1, element2, lang)
+        
+        yield {"type": "result", "result": result}
+    
+    def _parse_llm_response(self, response: str, element1: str, element2: str, lang: str = "en") -> Dict[str, Any]:
+        """
+        Parse a raw LLM response into a combination result and cache it.
+        
+        Falls back to regex extraction, and finally to a refusal, when the
+        response is not valid JSON.
+        """
+        # Try to parse the response as JSON
+        try:
+            # Clean up the response - extract JSON from various formats
+            cleaned_response = response
+            
+            # Method 1: Extract JSON from markdown code blocks
+            if "```" in response:
+                # Look for JSON code blocks
+                json_blocks = re.findall(r'```(?:json)?(.*?)```', response, re.DOTALL)
+                if json_blocks:
+                    cleaned_response = json_blocks[0].strip()
+            
+            # Method 2: Look for JSON-like structures with curly braces
+            else:
+                # Find the first opening brace and the last closing brace
+                start_idx = response.find('{')
+                end_idx = response.rfind('}')
                 
-                # Parse the JSON
+                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+                    cleaned_response = response[start_idx:end_idx+1]
+            
+            # Fix common JSON issues
+            # 1. Fix unquoted emoji values
+            cleaned_response = re.sub(r'"emoji":\s*([^",}\s]+)', r'"emoji": "\1"', cleaned_response)
+            
+            # 2. Fix missing quotes around keys
+            cleaned_response = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', cleaned_response)
+            
+            # 3. Fix trailing commas
+            cleaned_response = re.sub(r',\s*}', '}', cleaned_response)
+            
+            # 4. Fix missing quotes around string values
+            cleaned_response = re.sub(r':\s*([^",\d{}\[\]\s][^",{}\[\]\s]*)\s*([,}])', r': "\1"\2', cleaned_response)
+            
+            # Log the cleaned response
+            logger.info(f"CLEANED RESPONSE: {cleaned_response}")
+            
+            # Parse the JSON
+            try:
+                result = json.loads(cleaned_response)
+            except json.JSONDecodeError:
+                # If standard parsing fails, try a more lenient approach with ast.literal_eval
+                import ast
+                # Replace single quotes with double quotes for JSON compatibility
+                eval_ready = cleaned_response.replace("'", '"')
+                # Use literal_eval to safely evaluate the string as a Python dict
                 try:
-                    result = json.loads(cleaned_response)
-                except json.JSONDecodeError:
-                    # If standard parsing fails, try a more lenient approach with ast.literal_eval
-                    import ast
-                    # Replace single quotes with double quotes for JSON compatibility
-                    eval_ready = cleaned_response.replace("'", '"')
-                    # Use literal_eval to safely evaluate the string as a Python dict
-                    try:
-                        result_dict = ast.literal_eval(eval_ready)
-                        # Convert to proper JSON format
-                        result = json.loads(json.dumps(result_dict))
-                    except (SyntaxError, ValueError) as e:
-                        logger.error(f"Failed to parse with ast.literal_eval: {e}")
-                        raise json.JSONDecodeError(f"Failed to parse JSON: {e}", cleaned_response, 0)
-                
-                # Log the parsed result
-                logger.info(f"PARSED RESULT: {result}")
-                
-                # Ensure required fields are present
-                if "valid" in result and result["valid"] == False:
-                    # This is a refusal response
-                    if "reason" not in result:
-                        result["reason"] = "Эта комбинация невозможна." if lang == "ru" else "This combination is not possible."
-                    
-                    # Save to cache
-                    self._save_to_cache(element1, element2, result, lang)
-                    return result
-                
-                # For valid combinations
-                if "result" not in result:
-                    # Try to extract result from other fields if present
-                    if "name" in result:
-                        result["result"] = result["name"]
-                    elif "element" in result:
-                        result["result"] = result["element"]
-                    else:
-                        raise ValueError("Response missing 'result' field and no alternative fields found")
-                
-                # Add default emoji if missing
-                if "emoji" not in result:
-                    result["emoji"] = "✨"
-                
-                # Ensure valid is set
-                if "valid" not in result:
-                    result["valid"] = True
+                    result_dict = ast.literal_eval(eval_ready)
+                    # Convert to proper JSON format
+                    result = json.loads(json.dumps(result_dict))
+                except (SyntaxError, ValueError) as e:
+                    logger.error(f"Failed to parse with ast.literal_eval: {e}")
+                    raise json.JSONDecodeError(f"Failed to parse JSON: {e}", cleaned_response, 0)
+            
+            # Log the parsed result
+            logger.info(f"PARSED RESULT: {result}")
+            
+            # Ensure required fields are present
+            if "valid" in result and result["valid"] == False:
+                # This is a refusal response
+                if "reason" not in result:
+                    result["reason"] = "Эта комбинация невозможна." if lang == "ru" else "This combination is not possible."
                 
                 # Save to cache
                 self._save_to_cache(element1, element2, result, lang)
-                    
                 return result
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"ERROR PARSING JSON RESPONSE: {e}")
-                logger.error(f"RAW RESPONSE: {response}")
-                logger.error(f"CLEANED RESPONSE: {cleaned_response}")
-                
-                # Try to extract any text that might be a result
-                result_match = re.search(r'(?:result|name|element)["\s:]+([^"}\s]+)', cleaned_response, re.IGNORECASE)
-                emoji_match = re.search(r'(?:emoji)["\s:]+([^"}\s]+)', cleaned_response, re.IGNORECASE)
+            
+            # For valid combinations
+            if "result" not in result:
+                # Try to extract result from other fields if present
+                if "name" in result:
+                    result["result"] = result["name"]
+                elif "element" in result:
+                    result["result"] = result["element"]
+                else:
+                    raise ValueError("Response missing 'result' field and no alternative fields found")
+            
+            # Add default emoji if missing
+            if "emoji" not in result:
+                result["emoji"] = "✨"
+            
+            # Ensure valid is set
+            if "valid" not in result:
+                result["valid"] = True
+            
+            # Save to cache
+            self._save_to_cache(element1, element2, result, lang)
                 
-                if result_match:
-                    # We found something that looks like a result, try to use it
-                    logger.info(f"Extracted potential result from failed JSON: {result_match.group(1)}")
-                    
-                    result = {
-                        "valid": True,
-                        "result": result_match.group(1),
-                        "emoji": emoji_match.group(1) if emoji_match else "✨",
-                        "parsed_from_error": True
-                    }
-                    
-                    # Save to cache
-                    self._save_to_cache(element1, element2, result, lang)
-                    return result
+            return result
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"ERROR PARSING JSON RESPONSE: {e}")
+            logger.error(f"RAW RESPONSE: {response}")
+            logger.error(f"CLEANED RESPONSE: {cleaned_response}")
+            
+            # Try to extract any text that might be a result
+            result_match = re.search(r'(?:result|name|element)["\s:]+([^"}\s]+)', cleaned_response, re.IGNORECASE)
+            emoji_match = re.search(r'(?:emoji)["\s:]+([^"}\s]+)', cleaned_response, re.IGNORECASE)
+            
+            if result_match:
+                # We found something that looks like a result, try to use it
+                logger.info(f"Extracted potential result from failed JSON: {result_match.group(1)}")
                 
-                # If we can't extract a result, treat it as a refusal
-                refusal = {
-                    "valid": False,
-                    "reason": "Не удалось обработать ответ модели." if lang == "ru" else "Failed to process model response.",
-                    "error_details": str(e)
+                result = {
+                    "valid": True,
+                    "result": result_match.group(1),
+                    "emoji": emoji_match.group(1) if emoji_match else "✨",
+                    "parsed_from_error": True
                 }
                 
                 # Save to cache
-                self._save_to_cache(element1, element2, refusal, lang)
-                
-                return refusal
-                
-        except Exception as e:
-            logger.error(f"ERROR IN LLM SERVICE: {e}")
-            logger.error(f"TRACEBACK: {traceback.format_exc()}")
-            
-            # Try to create a meaningful response even in case of error
-            error_message = str(e)
-            
-            # Check if this is a timeout or connection error
-            if "timeout" in error_message.lower() or "connection" in error_message.lower():
-                reason = "Сервер не отвечает. Пожалуйста, попробуйте позже." if lang == "ru" else "Server timeout. Please try again later."
-            elif "rate limit" in error_message.lower() or "too many requests" in error_message.lower():
-                reason = "Слишком много запросов. Пожалуйста, попробуйте позже." if lang == "ru" else "Rate limit exceeded. Please try again later."
-            else:
-                reason = f"Произошла ошибка: {error_message}" if lang == "ru" else f"An error occurred: {error_message}"
+                self._save_to_cache(element1, element2, result, lang)
+                return result
             
+            # If we can't extract a result, treat it as a refusal
             refusal = {
                 "valid": False,
-                "reason": reason,
-                "error_type": type(e).__name__
+                "reason": "Не удалось обработать ответ модели." if lang == "ru" else "Failed to process model response.",
+                "error_details": str(e)
             }
             
-            # Try to save to cache, but don't fail if that also errors
-            try:
-                self._save_to_cache(element1, element2, refusal, lang)
-            except Exception as cache_error:
-                logger.error(f"Failed to save error to cache: {cache_error}")
-                
-            return refusal 
\ No newline at end of file
+            # Save to cache
+            self._save_to_cache(element1, element2, refusal, lang)
+            
+            return refusal
+    
+    def _error_result(self, e: Exception, element1: str, element2: str, lang: str = "en") -> Dict[str, Any]:
+        """Turn an exception raised while calling the LLM into a cached refusal."""
+        logger.error(f"ERROR IN LLM SERVICE: {e}")
+        logger.error(f"TRACEBACK: {traceback.format_exc()}")
+        
+        # Try to create a meaningful response even in case of error
+        error_message = str(e)
+        
+        # Check if this is a timeout or connection error
+        if "timeout" in error_message.lower() or "connection" in error_message.lower():
+            reason = "Сервер не отвечает. Пожалуйста, попробуйте позже." if lang == "ru" else "Server timeout. Please try again later."
+        elif "rate limit" in error_message.lower() or "too many requests" in error_message.lower():
+            reason = "Слишком много запросов. Пожалуйста, попробуйте позже." if lang == "ru" else "Rate limit exceeded. Please try again later."
+        else:
+            reason = f"Произошла ошибка: {error_message}" if lang == "ru" else f"An error occurred: {error_message}"
+        
+        refusal = {
+            "valid": False,
+            "reason": reason,
+            "error_type": type(e).__name__
+        }
+        
+        # Try to save to cache, but don't fail if that also errors
+        try:
+            self._save_to_cache(element1, element2, refusal, lang)
+        except Exception as cache_error:
+            logger.error(f"Failed to save error to cache: {cache_error}")
+            
+        return refusal 
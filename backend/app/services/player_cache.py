@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.upsert import insert_ignoring_conflicts
+from app.models.element import PlayerStats
+
+# Seconds a player's id is reused before it is looked up again (0 disables the cache)
+PLAYER_CACHE_TTL = float(os.getenv("PLAYER_CACHE_TTL", "300"))
+# Seconds a name without a player is remembered as unknown
+PLAYER_CACHE_NEGATIVE_TTL = float(os.getenv("PLAYER_CACHE_NEGATIVE_TTL", "5"))
+# Maximum number of player names kept in the process-wide player cache
+PLAYER_CACHE_SIZE = int(os.getenv("PLAYER_CACHE_SIZE", "100000"))
+
+# Session.info key of the players inserted or found by an insert in the session's open transaction
+_PENDING_KEY = "pending_players"
+
+class PlayerCache:
+    """
+    Process-wide LRU cache of player names to player ids.
+
+    Only the identity is cached: counters and inventory versions change on
+    every combination, so they are read and updated by id instead. Names
+    without a player are cached as None for `negative_ttl` seconds, so a
+    player created by another process is found soon after.
+    """
+
+    def __init__(
+        self,
+        max_size: int = PLAYER_CACHE_SIZE,
+        ttl: float = PLAYER_CACHE_TTL,
+        negative_ttl: float = PLAYER_CACHE_NEGATIVE_TTL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, Tuple[Optional[int], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, player_name: str) -> Tuple[bool, Optional[int]]:
+        """Return `(found, player_id)`; a found None means the name is known to have no player."""
+        with self._lock:
+            entry = self._entries.get(player_name)
+            if entry is None:
+                return False, None
+            if entry[1] <= time.monotonic():
+                del self._entries[player_name]
+                return False, None
+            self._entries.move_to_end(player_name)
+            return True, entry[0]
+
+    def put(self, player_name: str, player_id: Optional[int]) -> None:
+        ttl = self.ttl if player_id is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[player_name] = (player_id, time.monotonic() + ttl)
+            self._entries.move_to_end(player_name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget(self, player_name: str) -> None:
+        with self._lock:
+            self._entries.pop(player_name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+player_cache = PlayerCache()
+
+def _pending_players(db: Session) -> Dict[str, int]:
+    return db.info.setdefault(_PENDING_KEY, {})
+
+def get_player_id(db: Session, player_name: str) -> Optional[int]:
+    """Return the id of a player, or None if there is no player with that name."""
+    pending = db.info.get(_PENDING_KEY)
+    if pending and player_name in pending:
+        return pending[player_name]
+
+    found, player_id = player_cache.get(player_name)
+    if found:
+        return player_id
+
+    player_id = db.query(PlayerStats.id).filter(PlayerStats.player_name == player_name).scalar()
+    player_cache.put(player_name, player_id)
+    return player_id
+
+def ensure_player(db: Session, player_name: str, provision: bool = True) -> int:
+    """
+    Return the id of a player, creating the player if needed.
+
+    Creation is a single `INSERT ... ON CONFLICT DO NOTHING`, so concurrent
+    requests for a new name do not fail. A player created here gets the
+    basic elements of every language in the same transaction, unless
+    `provision` is False (the caller provisions instead). Runs inside the
+    caller's transaction; the caller commits, and the id is only cached
+    once that commit succeeds.
+    """
+    player_id = get_player_id(db, player_name)
+    if player_id is not None:
+        return player_id
+
+    statement = insert_ignoring_conflicts(db, PlayerStats.__table__)
+    if statement is not None:
+        created = db.execute(statement.values(player_name=player_name)).rowcount > 0
+    else:
+        db.add(PlayerStats(player_name=player_name))
+        db.flush()
+        created = True
+
+    # When the insert found a player created by another transaction since the
+    # lookup, its id is cached on commit too, like that of a player created here
+    player_id = db.query(PlayerStats.id).filter(PlayerStats.player_name == player_name).scalar()
+    _pending_players(db)[player_name] = player_id
+    if created and provision:
+        # Imported here because init_db imports this module
+        from app.db.init_db import provision_basic_elements
+        provision_basic_elements(db, PlayerStats.id == player_id)
+    return player_id
+
+@event.listens_for(Session, "after_commit")
+def _cache_pending_players(session: Session) -> None:
+    for player_name, player_id in session.info.pop(_PENDING_KEY, {}).items():
+        player_cache.put(player_name, player_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_pending_players(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.services.llm_service import llm_settings
+
+logger = logging.getLogger(__name__)
+
+# off: always call the LLM; replay: only use recorded responses (offline);
+# record: always call the LLM and record the response; record_missing: replay
+# recorded responses and call the LLM (and record) only for the rest
+CASSETTE_MODES = ("off", "replay", "record", "record_missing")
+
+# Cassette used by the prompt tester
+PROMPT_CASSETTE_MODE = os.getenv("PROMPT_CASSETTE_MODE", "off").lower()
+PROMPT_CASSETTE_PATH = os.getenv(
+    "PROMPT_CASSETTE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts", "results", "cassette.jsonl")
+)
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no response was recorded for a prompt."""
+
+def cassette_key(provider: Optional[str], model: Optional[str], params: Dict[str, Any], prompt: str) -> str:
+    """Key a response by provider, model, generation parameters and the formatted prompt."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    identity = json.dumps([provider, model, params, prompt_hash], sort_keys=True, default=str)
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+class Cassette:
+    """
+    Recorded LLM responses, replayed instead of calling the provider.
+
+    Stored as JSON lines appended to `path`; when a key was recorded more
+    than once, the last recording wins. Lets parser and validator changes
+    be re-tested against the same responses without network or tokens.
+    """
+
+    def __init__(self, path: str = PROMPT_CASSETTE_PATH, mode: str = PROMPT_CASSETTE_MODE):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unsupported cassette mode: {mode} (expected one of {', '.join(CASSETTE_MODES)})")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.recorded = 0
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    entries = {}
+                    if os.path.exists(self.path):
+                        with open(self.path, encoding="utf-8") as f:
+                            for line_number, line in enumerate(f, 1):
+                                if not line.strip():
+                                    continue
+                                try:
+                                    entry = json.loads(line)
+                                    entries[entry["key"]] = entry
+                                except (json.JSONDecodeError, KeyError):
+                                    logger.warning(f"Skipping unreadable cassette line {line_number} in {self.path}")
+                    self._entries = entries
+        return self._entries
+
+    def respond(
+        self,
+        provider: Optional[str],
+        model: Optional[str],
+        params: Dict[str, Any],
+        prompt: str,
+        call: Callable[[], Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Return the recorded call for the prompt, or `call()` the LLM as the mode allows.
+
+        `call` returns a dict with the `response` text and any measurements
+        (latency, token usage) to record with it; replays return the recorded
+        dict with `replayed` set.
+        """
+        if self.mode == "off":
+            return call()
+
+        key = cassette_key(provider, model, params, prompt)
+        if self.mode in ("replay", "record_missing"):
+            entry = self._load().get(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                return {**entry, "replayed": True}
+            if self.mode == "replay":
+                raise CassetteMiss(f"No recorded response for this prompt with {provider}/{model}")
+
+        recording = call()
+        self._record({
+            **recording,
+            "key": key,
+            "provider": provider,
+            "model": model,
+            "params": params,
+            "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            "recorded_at": time.time(),
+        })
+        return recording
+
+    def _record(self, entry: Dict[str, Any]) -> None:
+        entries = self._load()
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            entries[entry["key"]] = entry
+            self.recorded += 1
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+class ReplayLLM:
+    """
+    Stands in for `LLMService` when every response must come from a cassette.
+
+    Has the provider, model and parameters configured in the environment, so
+    it finds the same recordings, but no client: nothing is imported or
+    authenticated and a prompt that was not recorded raises `CassetteMiss`.
+    """
+
+    def __init__(self):
+        self.provider, self.model_name, self.generation_params = llm_settings()
+
+    def _get_llm_response(self, prompt: str) -> str:
+        raise CassetteMiss(f"No recorded response for this prompt with {self.provider}/{self.model_name}")
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.services.prompt_stats import prompt_report
+
+# SQLite file holding the results of every prompt test run
+PROMPT_RESULTS_DB = os.getenv(
+    "PROMPT_RESULTS_DB",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts", "results", "prompt_results.db")
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    provider TEXT,
+    model TEXT,
+    prompts INTEGER NOT NULL,
+    test_cases INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS case_results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    lang TEXT NOT NULL,
+    name TEXT NOT NULL,
+    case_index INTEGER NOT NULL,
+    case_key TEXT NOT NULL,
+    element1 TEXT NOT NULL,
+    element2 TEXT NOT NULL,
+    expected TEXT,
+    prompt TEXT,
+    response TEXT,
+    result TEXT,
+    success INTEGER NOT NULL,
+    error TEXT,
+    failure TEXT,
+    notes TEXT,
+    created_at REAL NOT NULL,
+    template_hash TEXT,
+    reused_from TEXT,
+    latency_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    tokens_estimated INTEGER,
+    cost REAL,
+    parse_path TEXT,
+    replayed INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_case_results_run ON case_results (run_id, lang, name, case_index);
+CREATE INDEX IF NOT EXISTS ix_case_results_case ON case_results (lang, name, case_key, run_id);
+CREATE INDEX IF NOT EXISTS ix_case_results_template ON case_results (lang, name, template_hash);
+"""
+
+# Per-case measurements passed to `add_case` as `metrics`
+METRIC_COLUMNS = ("latency_ms", "prompt_tokens", "completion_tokens", "tokens_estimated", "cost", "parse_path", "replayed")
+
+_SUMMARY_QUERY = """
+SELECT lang, name,
+       COUNT(*) AS cases,
+       SUM(success) AS successes,
+       SUM(failure = 'error') AS errors,
+       SUM(failure = 'invalid_json') AS invalid_json,
+       SUM(reused_from IS NOT NULL) AS reused
+FROM case_results
+WHERE run_id = ?
+GROUP BY lang, name
+ORDER BY lang, name
+"""
+
+def case_key(element1: str, element2: str, expected: Optional[str]) -> str:
+    """Identify a test case by its content, so the same case can be matched across runs."""
+    content = "\0".join([element1, element2, expected if expected is not None else "\0"])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+def template_hash(template: str) -> str:
+    """Identify a prompt template by its content, so results can be reused until it changes."""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+def new_run_id() -> str:
+    """Build a run id that starts with the UTC start time, so ids are readable and sortable."""
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:6]}"
+
+class PromptResultStore:
+    """
+    Append-only SQLite store of prompt test results.
+
+    Every run gets a row in `runs` and one row per (prompt, test case) in
+    `case_results`, with the formatted prompt, raw response, parsed result
+    and evaluation. Rows are never updated, so earlier runs stay available
+    for comparison. Safe to share between the tester's worker threads.
+    """
+
+    def __init__(self, path: str = PROMPT_RESULTS_DB):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def start_run(self, prompts: int, test_cases: int, provider: Optional[str] = None, model: Optional[str] = None) -> str:
+        run_id = new_run_id()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, started_at, provider, model, prompts, test_cases) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, time.time(), provider, model, prompts, test_cases)
+            )
+        return run_id
+
+    def finish_run(self, run_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def add_case(
+        self,
+        run_id: str,
+        lang: str,
+        name: str,
+        case_index: int,
+        case_result: Dict[str, Any],
+        failure: Optional[str] = None,
+        prompt: Optional[str] = None,
+        response: Optional[str] = None,
+        notes: Optional[List[str]] = None,
+        template: Optional[str] = None,
+        metrics: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Append the result of one test case, as returned by `PromptTester`.
+        
+        `template` is the hash of the case's template together with the
+        generation parameters and evaluation code (stored as `template_hash`)
+        and `metrics` holds any of the `METRIC_COLUMNS` measured for it.
+        """
+        element1, element2, expected = case_result["element1"], case_result["element2"], case_result["expected"]
+        result = case_result.get("result")
+        metrics = metrics or {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"""
+                INSERT INTO case_results (
+                    run_id, lang, name, case_index, case_key, element1, element2, expected,
+                    prompt, response, result, success, error, failure, notes, created_at, template_hash,
+                    {", ".join(METRIC_COLUMNS)}
+                ) VALUES ({", ".join("?" * (17 + len(METRIC_COLUMNS)))})
+                """,
+                (
+                    run_id, lang, name, case_index, case_key(element1, element2, expected),
+                    element1, element2, expected, prompt, response,
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    int(bool(case_result["success"])), case_result.get("error"), failure,
+                    json.dumps(notes or [], ensure_ascii=False), time.time(), template,
+                    *(metrics.get(column) for column in METRIC_COLUMNS),
+                )
+            )
+
+    def reusable_cases(
+        self,
+        lang: str,
+        name: str,
+        template: str,
+        provider: Optional[str],
+        model: Optional[str],
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the latest stored result of each test case for a prompt template, by case key.
+
+        Only results from the same template hash (which also covers the
+        generation parameters and evaluation code), provider and model count.
+        Cases that failed with an error (rather than a bad answer) are left
+        out so they are run again.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT c.* FROM case_results c
+                JOIN runs r ON r.run_id = c.run_id
+                WHERE c.lang = ? AND c.name = ? AND c.template_hash = ?
+                  AND r.provider IS ? AND r.model IS ?
+                  AND (c.failure IS NULL OR c.failure != 'error')
+                ORDER BY c.id
+                """,
+                (lang, name, template, provider, model)
+            ).fetchall()
+        # Later rows replace earlier ones, leaving the latest result of each case
+        return {row["case_key"]: self._case_to_dict(row) for row in rows}
+
+    def reuse_case(self, run_id: str, case_index: int, previous: Dict[str, Any]) -> None:
+        """Append a copy of a stored case result to another run, pointing back at the run that produced it."""
+        with self._lock, self._conn:
+            columns = [
+                row["name"] for row in self._conn.execute("PRAGMA table_info(case_results)")
+                if row["name"] not in ("id", "run_id", "case_index", "created_at", "reused_from")
+            ]
+            column_list = ", ".join(columns)
+            self._conn.execute(
+                f"""
+                INSERT INTO case_results (run_id, case_index, created_at, reused_from, {column_list})
+                SELECT ?, ?, ?, COALESCE(reused_from, run_id), {column_list}
+                FROM case_results WHERE id = ?
+                """,
+                (run_id, case_index, time.time(), previous["id"])
+            )
+
+    def list_runs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM runs ORDER BY started_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def has_run(self, run_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is not None
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Return a run with the success rate, errors and invalid JSON count of each prompt."""
+        with self._lock:
+            run = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if run is None:
+                return None
+            summaries = self._conn.execute(_SUMMARY_QUERY, (run_id,)).fetchall()
+        return {
+            **dict(run),
+            "results": [
+                {
+                    "lang": row["lang"],
+                    "name": row["name"],
+                    "cases": row["cases"],
+                    "success_rate": row["successes"] / row["cases"],
+                    "errors": row["errors"],
+                    "invalid_json": row["invalid_json"],
+                    "reused": row["reused"],
+                }
+                for row in summaries
+            ],
+        }
+
+    def get_cases(
+        self,
+        run_id: str,
+        lang: Optional[str] = None,
+        name: Optional[str] = None,
+        key: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the stored test cases of a run, optionally for one prompt or one case."""
+        query = "SELECT * FROM case_results WHERE run_id = ?"
+        params: List[Any] = [run_id]
+        for column, value in (("lang", lang), ("name", name), ("case_key", key)):
+            if value is not None:
+                query += f" AND {column} = ?"
+                params.append(value)
+        query += " ORDER BY lang, name, case_index"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._case_to_dict(row) for row in rows]
+
+    def run_report(self, run_id: str) -> List[Dict[str, Any]]:
+        """Return success, latency percentiles, tokens, cost and parse paths for each prompt of a run."""
+        by_prompt: Dict[tuple, List[Dict[str, Any]]] = {}
+        for case in self.get_cases(run_id):
+            by_prompt.setdefault((case["lang"], case["name"]), []).append(case)
+        return [
+            {"lang": lang, "name": name, **prompt_report(cases)}
+            for (lang, name), cases in by_prompt.items()
+        ]
+
+    def compare_runs(self, base_run_id: str, other_run_id: str) -> Dict[str, Any]:
+        """
+        Compare two runs prompt by prompt.
+
+        Returns the success rate of each prompt in both runs and the test
+        cases (matched by content) whose outcome changed between them.
+        """
+        with self._lock:
+            base = {(row["lang"], row["name"]): row for row in self._conn.execute(_SUMMARY_QUERY, (base_run_id,))}
+            other = {(row["lang"], row["name"]): row for row in self._conn.execute(_SUMMARY_QUERY, (other_run_id,))}
+            changed = self._conn.execute(
+                """
+                SELECT a.lang, a.name, a.element1, a.element2, a.expected,
+                       a.success AS base_success, b.success AS other_success
+                FROM case_results a
+                JOIN case_results b
+                  ON b.run_id = ? AND b.lang = a.lang AND b.name = a.name AND b.case_key = a.case_key
+                WHERE a.run_id = ? AND a.success != b.success
+                ORDER BY a.lang, a.name, a.case_index
+                """,
+                (other_run_id, base_run_id)
+            ).fetchall()
+
+        def rate(row) -> Optional[float]:
+            return row["successes"] / row["cases"] if row is not None else None
+
+        prompts = []
+        for lang, name in sorted(set(base) | set(other)):
+            base_rate, other_rate = rate(base.get((lang, name))), rate(other.get((lang, name)))
+            prompts.append({
+                "lang": lang,
+                "name": name,
+                "base_success_rate": base_rate,
+                "other_success_rate": other_rate,
+                "delta": other_rate - base_rate if base_rate is not None and other_rate is not None else None,
+            })
+        return {
+            "base_run_id": base_run_id,
+            "other_run_id": other_run_id,
+            "prompts": prompts,
+            "changed_cases": [
+                {**dict(row), "base_success": bool(row["base_success"]), "other_success": bool(row["other_success"])}
+                for row in changed
+            ],
+        }
+
+    @staticmethod
+    def _case_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        case = dict(row)
+        case["result"] = json.loads(case["result"]) if case["result"] is not None else None
+        case["notes"] = json.loads(case["notes"]) if case["notes"] else []
+        for flag in ("success", "tokens_estimated", "replayed"):
+            if case[flag] is not None:
+                case[flag] = bool(case[flag])
+        return case
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,23 +1,45 @@
 import os
 import json
-from typing import Dict, List, Optional, Tuple
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, writes are then only serialized within a process
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Seconds between checks of the prompt files for changes made by other processes (0 checks on every read)
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "2"))
+
+# Key in each {lang}.json holding the language's version, bumped on every save
+VERSION_KEY = "__version__"
+
 class PromptService:
     """
     Service for managing and testing element combination prompts.
     This allows us to experiment with different prompts and store the best ones.
+
+    Each language is stored in `{lang}.json` with a version that increases on
+    every save. Files are replaced atomically (write to a temporary file, then
+    rename) under a file lock, so concurrent writers never lose each other's
+    prompts and readers never see a half-written file. Other processes pick up
+    changes by polling the files' stat at most every `reload_interval` seconds.
     """
     
-    def __init__(self, prompts_dir: Optional[str] = None):
+    def __init__(self, prompts_dir: Optional[str] = None, reload_interval: float = PROMPT_RELOAD_INTERVAL):
         """
         Initialize the prompt service.
         
         Args:
             prompts_dir: Directory to store prompt templates. If None, uses default location.
+            reload_interval: Seconds between checks for prompt files changed by other processes.
         """
         if prompts_dir is None:
             # Use a default directory in the app folder
@@ -34,6 +56,13 @@ class PromptService:
             "ru": self._create_default_russian_prompt(),
         }
         
+        self.reload_interval = reload_interval
+        self.versions: Dict[str, int] = {}
+        # Stat signature of each loaded file, to notice when it was replaced
+        self._signatures: Dict[str, Tuple[int, int, int]] = {}
+        self._checked_at = time.monotonic()
+        self._lock = threading.RLock()
+        
         # Load saved prompts if they exist
         self.prompts = self._load_prompts()
         
@@ -116,52 +145,146 @@ class PromptService:
         # Load each JSON file in the prompts directory
         for file_path in self.prompts_dir.glob("*.json"):
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lang_prompts = json.load(f)
-                    lang = file_path.stem  # Use filename as language code
-                    prompts[lang] = lang_prompts
+                lang = file_path.stem  # Use filename as language code
+                signature = self._signature(file_path)
+                self.versions[lang], prompts[lang] = self._read_file(file_path)
+                self._signatures[lang] = signature
             except Exception as e:
                 logger.error(f"Error loading prompts from {file_path}: {e}")
         
         # If no prompts were loaded, use the defaults
         if not prompts:
+            self.prompts = prompts
             for lang, prompt in self.default_prompts.items():
-                prompts[lang] = {"default": prompt}
                 self._save_prompt(lang, "default", prompt)
                 
             # Add the alternative prompt
-            prompts["en"]["alternative"] = self._create_alternative_english_prompt()
-            self._save_prompt("en", "alternative", prompts["en"]["alternative"])
+            self._save_prompt("en", "alternative", self._create_alternative_english_prompt())
         
         return prompts
     
-    def _save_prompt(self, lang: str, name: str, prompt: str) -> None:
+    @staticmethod
+    def _signature(file_path: Path) -> Tuple[int, int, int]:
+        # A rename gives the file a new inode, so replaced files are noticed even within the mtime resolution
+        stat = file_path.stat()
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    
+    @staticmethod
+    def _read_file(file_path: Path) -> Tuple[int, Dict[str, str]]:
+        """Read a language file into its version (0 for files written before versioning) and prompts."""
+        with open(file_path, "r", encoding="utf-8") as f:
+            lang_prompts = json.load(f)
+        version = lang_prompts.pop(VERSION_KEY, 0)
+        return version, lang_prompts
+    
+    @contextmanager
+    def _file_lock(self, lang: str) -> Iterator[None]:
+        """Serialize writers of a language file across threads and, where supported, processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.prompts_dir / f".{lang}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _save_prompt(self, lang: str, name: str, prompt: str) -> int:
         """
         Save a prompt to the prompts directory.
         
+        The file is re-read under the lock, so prompts saved by other
+        processes since it was loaded are kept, and the merged prompts
+        become this service's copy of the language.
+        
         Args:
             lang: Language code
             name: Name of the prompt
             prompt: The prompt template
+            
+        Returns:
+            The language's new version
         """
         file_path = self.prompts_dir / f"{lang}.json"
         
-        # Load existing prompts for this language if the file exists
-        if file_path.exists():
+        with self._file_lock(lang):
+            # Load existing prompts for this language if the file exists
+            version, lang_prompts = 0, {}
+            if file_path.exists():
+                try:
+                    version, lang_prompts = self._read_file(file_path)
+                except Exception as e:
+                    logger.error(f"Error reading prompts from {file_path}, rewriting it: {e}")
+            
+            # Add or update the prompt
+            lang_prompts[name] = prompt
+            version = max(version, self.versions.get(lang, 0)) + 1
+            
+            # Write a temporary file next to the target and rename it over the target
+            fd, tmp_path = tempfile.mkstemp(dir=self.prompts_dir, prefix=f".{lang}.", suffix=".tmp")
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lang_prompts = json.load(f)
-            except Exception:
-                lang_prompts = {}
-        else:
-            lang_prompts = {}
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({VERSION_KEY: version, **lang_prompts}, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            
+            self.prompts[lang] = lang_prompts
+            self.versions[lang] = version
+            self._signatures[lang] = self._signature(file_path)
+        
+        return version
+    
+    def reload(self, force: bool = False) -> List[str]:
+        """
+        Reload the language files that changed on disk since they were loaded.
+        
+        Without `force`, the files are only checked once per `reload_interval`.
+        
+        Returns:
+            The languages that were (re)loaded
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return []
         
-        # Add or update the prompt
-        lang_prompts[name] = prompt
+        changed = []
+        with self._lock:
+            self._checked_at = now
+            for file_path in self.prompts_dir.glob("*.json"):
+                lang = file_path.stem
+                try:
+                    signature = self._signature(file_path)
+                    if self._signatures.get(lang) == signature:
+                        continue
+                    version, lang_prompts = self._read_file(file_path)
+                except Exception as e:
+                    logger.error(f"Error reloading prompts from {file_path}: {e}")
+                    continue
+                # Replace the language's dict as a whole, so concurrent readers see either version
+                self.prompts[lang] = lang_prompts
+                self.versions[lang] = version
+                self._signatures[lang] = signature
+                changed.append(lang)
+        
+        if changed:
+            logger.info(f"Reloaded prompts for {', '.join(sorted(changed))}")
+        return changed
+    
+    def get_version(self, lang: str) -> int:
+        """
+        Get the current version of a language's prompts (0 if never saved with a version).
         
-        # Save the updated prompts
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(lang_prompts, f, ensure_ascii=False, indent=2)
+        Args:
+            lang: Language code
+        """
+        self.reload()
+        return self.versions.get(lang, 0)
     
     def get_prompt(self, lang: str = "en", name: str = "default") -> str:
         """
@@ -174,6 +297,8 @@ class PromptService:
         Returns:
             The prompt template
         """
+        self.reload()
+        
         # If the language doesn't exist, fall back to English
         if lang not in self.prompts:
             lang = "en"
@@ -184,7 +309,7 @@ class PromptService:
             
         return self.prompts[lang][name]
     
-    def add_prompt(self, lang: str, name: str, prompt: str) -> None:
+    def add_prompt(self, lang: str, name: str, prompt: str) -> int:
         """
         Add a new prompt template.
         
@@ -192,14 +317,15 @@ class PromptService:
             lang: Language code
             name: Name of the prompt
             prompt: The prompt template
+            
+        Returns:
+            The language's new version
         """
-        # Add to in-memory prompts
-        if lang not in self.prompts:
-            self.prompts[lang] = {}
-        self.prompts[lang][name] = prompt
+        if name == VERSION_KEY:
+            raise ValueError(f"'{VERSION_KEY}' is reserved and cannot be used as a prompt name")
         
-        # Save to file
-        self._save_prompt(lang, name, prompt)
+        # Save to file, which also updates the in-memory prompts
+        return self._save_prompt(lang, name, prompt)
     
     def list_prompts(self, lang: Optional[str] = None) -> Dict[str, List[str]]:
         """
@@ -211,6 +337,7 @@ class PromptService:
         Returns:
             Dictionary of prompt names by language
         """
+        self.reload()
         result = {}
         
         if lang:
@@ -0,0 +1,157 @@
+"""
+Benchmark figures for prompt test runs: token estimates, latency
+percentiles, cost and significance tests for comparing two prompts.
+"""
+
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, token counts fall back to a character estimate
+    tiktoken = None
+
+# Price in USD per 1000 prompt (input) and completion (output) tokens, used to estimate test costs
+PROMPT_COST_PER_1K_INPUT = float(os.getenv("PROMPT_COST_PER_1K_INPUT", "0"))
+PROMPT_COST_PER_1K_OUTPUT = float(os.getenv("PROMPT_COST_PER_1K_OUTPUT", "0"))
+
+_encoding = None
+
+def estimate_tokens(text: str) -> int:
+    """Count tokens with tiktoken's cl100k encoding if installed, otherwise assume ~4 characters per token."""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return max(1, round(len(text) / 4))
+
+def estimate_cost(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> float:
+    return (
+        (prompt_tokens or 0) * PROMPT_COST_PER_1K_INPUT +
+        (completion_tokens or 0) * PROMPT_COST_PER_1K_OUTPUT
+    ) / 1000
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """The q-th percentile (0-100) with linear interpolation, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def prompt_report(cases: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Summarize the stored test cases of one prompt: success, latency, tokens, cost and parse paths."""
+    cases = list(cases)
+    latencies = [case["latency_ms"] for case in cases if case.get("latency_ms") is not None]
+    completion_tokens = [case["completion_tokens"] for case in cases if case.get("completion_tokens") is not None]
+    prompt_tokens = [case["prompt_tokens"] for case in cases if case.get("prompt_tokens") is not None]
+    parse_paths: Dict[str, int] = {}
+    for case in cases:
+        path = case.get("parse_path") or "none"
+        parse_paths[path] = parse_paths.get(path, 0) + 1
+
+    return {
+        "cases": len(cases),
+        "success_rate": sum(1 for case in cases if case["success"]) / len(cases) if cases else 0.0,
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p95_ms": percentile(latencies, 95),
+        "prompt_tokens_mean": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
+        "completion_tokens_mean": sum(completion_tokens) / len(completion_tokens) if completion_tokens else None,
+        "tokens_estimated": sum(1 for case in cases if case.get("tokens_estimated")),
+        "cost": sum(case.get("cost") or 0 for case in cases),
+        "parse_paths": parse_paths,
+    }
+
+def mcnemar_exact(only_a: int, only_b: int) -> float:
+    """
+    Two-sided exact McNemar p-value for paired pass/fail outcomes.
+
+    `only_a` and `only_b` count the cases that passed with one prompt and
+    failed with the other; cases with the same outcome carry no information.
+    """
+    discordant = only_a + only_b
+    if discordant == 0:
+        return 1.0
+    tail = sum(math.comb(discordant, k) for k in range(min(only_a, only_b) + 1)) / 2 ** discordant
+    return min(1.0, 2 * tail)
+
+def wilcoxon_signed_rank(differences: Sequence[float]) -> Optional[float]:
+    """
+    Two-sided p-value of the Wilcoxon signed-rank test (normal approximation).
+
+    `differences` are paired differences such as latency(a) - latency(b)
+    per test case. Zero differences are dropped and tied magnitudes get
+    their average rank. Returns None with fewer than 6 non-zero pairs,
+    where the approximation is meaningless.
+    """
+    nonzero = [d for d in differences if d != 0]
+    n = len(nonzero)
+    if n < 6:
+        return None
+
+    ordered = sorted(nonzero, key=abs)
+    ranks: List[float] = [0.0] * n
+    tie_correction = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and abs(ordered[j + 1]) == abs(ordered[i]):
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[k] = average_rank
+        ties = j - i + 1
+        tie_correction += ties ** 3 - ties
+        i = j + 1
+
+    positive = sum(rank for rank, d in zip(ranks, ordered) if d > 0)
+    mean = n * (n + 1) / 4
+    variance = n * (n + 1) * (2 * n + 1) / 24 - tie_correction / 48
+    if variance <= 0:
+        return 1.0
+    z = (positive - mean) / math.sqrt(variance)
+    return math.erfc(abs(z) / math.sqrt(2))
+
+def compare_prompts(cases_a: Iterable[Dict[str, Any]], cases_b: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare two prompts on the test cases they share (matched by case key).
+
+    Success is compared with an exact McNemar test and latency and
+    completion tokens with Wilcoxon signed-rank tests. Small p-values
+    (e.g. below 0.05) mean the difference is unlikely to be noise.
+    """
+    by_key_a = {case["case_key"]: case for case in cases_a}
+    pairs = [(by_key_a[case["case_key"]], case) for case in cases_b if case["case_key"] in by_key_a]
+
+    only_a = sum(1 for a, b in pairs if a["success"] and not b["success"])
+    only_b = sum(1 for a, b in pairs if b["success"] and not a["success"])
+
+    def paired_differences(field: str) -> List[float]:
+        return [a[field] - b[field] for a, b in pairs if a.get(field) is not None and b.get(field) is not None]
+
+    latency_differences = paired_differences("latency_ms")
+    token_differences = paired_differences("completion_tokens")
+    return {
+        "paired_cases": len(pairs),
+        "a": prompt_report(a for a, _ in pairs),
+        "b": prompt_report(b for _, b in pairs),
+        "success": {
+            "only_a": only_a,
+            "only_b": only_b,
+            "p_value": mcnemar_exact(only_a, only_b),
+        },
+        "latency_ms": {
+            "median_difference": percentile(latency_differences, 50),
+            "p_value": wilcoxon_signed_rank(latency_differences),
+        },
+        "completion_tokens": {
+            "median_difference": percentile(token_differences, 50),
+            "p_value": wilcoxon_signed_rank(token_differences),
+        },
+    }
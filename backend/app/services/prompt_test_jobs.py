@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.sse import sse_event
+from app.services.prompt_tester import PromptTester
+
+logger = logging.getLogger(__name__)
+
+# Number of prompt test runs executed at the same time
+PROMPT_TEST_MAX_RUNNING = int(os.getenv("PROMPT_TEST_MAX_RUNNING", "2"))
+# Maximum number of prompt test runs waiting to start
+PROMPT_TEST_QUEUE_SIZE = int(os.getenv("PROMPT_TEST_QUEUE_SIZE", "10"))
+# How many finished prompt test jobs are kept around for polling
+PROMPT_TEST_JOB_RETENTION = int(os.getenv("PROMPT_TEST_JOB_RETENTION", "100"))
+# Seconds between progress checks of a streamed job, and between keepalive comments
+PROMPT_TEST_PROGRESS_INTERVAL = float(os.getenv("PROMPT_TEST_PROGRESS_INTERVAL", "0.5"))
+PROMPT_TEST_STREAM_KEEPALIVE = float(os.getenv("PROMPT_TEST_STREAM_KEEPALIVE", "15"))
+
+TestCase = Tuple[str, str, Optional[str]]
+
+class PromptJobQueueFull(Exception):
+    """Raised when a prompt test job cannot be accepted because the queue is at capacity."""
+
+@dataclass
+class PromptTestJob:
+    """A prompt test run of one prompt (`name` set) or of all prompts of `lang` (or every language)."""
+    id: str
+    lang: Optional[str]
+    name: Optional[str]
+    test_cases: List[TestCase]
+    incremental: bool = True
+    status: str = "queued"  # queued, running, completed or failed
+    done: int = 0
+    total: int = 0
+    successes: int = 0
+    run_id: Optional[str] = None
+    results: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    # Bumped on every change, so streams know when to send an update
+    version: int = 0
+
+    def advance(self, done: int, total: int, successes: int) -> None:
+        self.done, self.total, self.successes = done, total, successes
+        self.version += 1
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "success_rate": self.successes / self.done if self.done else 0.0,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.progress(),
+            "lang": self.lang,
+            "name": self.name,
+            "run_id": self.run_id,
+            "results": self.results,
+            "error": self.error,
+        }
+
+class PromptTestRunner:
+    """
+    Runs prompt tests as background jobs on a small pool of worker threads.
+
+    Each job carries its own copy of the test cases, so concurrent jobs and
+    changes to the tester's default cases do not affect each other. At most
+    `workers` runs execute at a time (each with the tester's own case
+    concurrency); further jobs wait in a bounded queue.
+    """
+
+    def __init__(
+        self,
+        tester: PromptTester,
+        workers: int = PROMPT_TEST_MAX_RUNNING,
+        max_size: int = PROMPT_TEST_QUEUE_SIZE,
+        retention: int = PROMPT_TEST_JOB_RETENTION,
+    ):
+        self.tester = tester
+        self.workers = max(1, workers)
+        self.retention = retention
+        self._queue: "queue.Queue[Optional[PromptTestJob]]" = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, PromptTestJob]" = OrderedDict()
+        self._finished: deque = deque()
+        self._threads: List[threading.Thread] = []
+
+    def submit(
+        self,
+        lang: Optional[str] = None,
+        name: Optional[str] = None,
+        test_cases: Optional[List[TestCase]] = None,
+        incremental: bool = True,
+    ) -> PromptTestJob:
+        """
+        Queue a test run; `test_cases` defaults to a copy of the tester's current cases.
+
+        Raises `PromptJobQueueFull` if the queue is at capacity.
+        """
+        job = PromptTestJob(
+            id=uuid.uuid4().hex,
+            lang=lang,
+            name=name,
+            test_cases=list(test_cases if test_cases is not None else self.tester.test_cases),
+            incremental=incremental,
+        )
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise PromptJobQueueFull(f"Prompt test queue is full ({self._queue.maxsize} jobs)")
+            self._jobs[job.id] = job
+            self._start_workers()
+        return job
+
+    def get(self, job_id: str) -> Optional[PromptTestJob]:
+        """Return a job by id, or None if it is unknown or has been evicted."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def stream(self, job: PromptTestJob) -> AsyncIterator[bytes]:
+        """Yield SSE `progress` messages for a job, then a `completed` or `failed` message."""
+        version = -1
+        last_sent = time.monotonic()
+        while True:
+            if job.version != version:
+                version = job.version
+                last_sent = time.monotonic()
+                yield sse_event("progress", job.progress())
+            if job.status in ("completed", "failed"):
+                yield sse_event(job.status, job.to_dict())
+                return
+            if time.monotonic() - last_sent >= PROMPT_TEST_STREAM_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield b": keepalive\n\n"
+            await asyncio.sleep(PROMPT_TEST_PROGRESS_INTERVAL)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers once the jobs already queued are done."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start_workers(self) -> None:
+        # Called with the lock held
+        if self._threads:
+            return
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"prompt-test-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.status = "running"
+            job.version += 1
+            try:
+                if job.name is not None:
+                    results = [self.tester.test_prompt(
+                        job.lang, job.name,
+                        incremental=job.incremental, test_cases=job.test_cases, progress=job.advance
+                    )]
+                else:
+                    results = self.tester.test_all_prompts(
+                        job.lang,
+                        incremental=job.incremental, test_cases=job.test_cases, progress=job.advance
+                    )
+                self._finish(job, "completed", results=results)
+            except Exception as e:
+                logger.error(f"Prompt test job {job.id} failed: {e}")
+                self._finish(job, "failed", error=str(e))
+
+    def _finish(self, job: PromptTestJob, status: str, results: Optional[List[Dict[str, Any]]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            job.results = results
+            job.run_id = results[0]["run_id"] if results else None
+            job.error = error
+            job.status = status
+            job.version += 1
+            self._finished.append(job.id)
+            while len(self._finished) > self.retention:
+                self._jobs.pop(self._finished.popleft(), None)
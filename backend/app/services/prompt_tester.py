@@ -1,28 +1,65 @@
+import hashlib
+import inspect
 import json
 import logging
 import os
-from typing import Dict, List, Tuple, Any, Optional
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple, Any, Optional
 from app.services.prompt_service import PromptService
 from app.services.llm_service import LLMService
+from app.services.prompt_cassette import Cassette
+from app.services.prompt_results import PromptResultStore, case_key, template_hash
+from app.services.prompt_stats import estimate_cost, estimate_tokens
+from app.services.rate_limiter import MemoryBuckets
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of test cases sent to the LLM at the same time
+PROMPT_TEST_WORKERS = int(os.getenv("PROMPT_TEST_WORKERS", "4"))
+# Requests per minute allowed to each LLM provider during prompt tests (0 disables the limit)
+PROMPT_TEST_REQUESTS_PER_MINUTE = float(os.getenv("PROMPT_TEST_REQUESTS_PER_MINUTE", "60"))
+# Number of requests that may go out back to back before the rate limit applies
+PROMPT_TEST_RATE_BURST = float(os.getenv("PROMPT_TEST_RATE_BURST", "4"))
+
+ProgressCallback = Callable[[int, int, int], None]  # (done, total, successes)
+
+# Shared by every tester in the process, so concurrent runs respect one limit per provider
+_provider_buckets = MemoryBuckets()
+
 class PromptTester:
     """
     Service for testing different prompts with the LLM.
     This allows us to evaluate which prompts produce the best results.
     """
     
-    def __init__(self, prompt_service: Optional[PromptService] = None, llm_service: Optional[LLMService] = None):
+    def __init__(
+        self,
+        prompt_service: Optional[PromptService] = None,
+        llm_service: Optional[LLMService] = None,
+        workers: int = PROMPT_TEST_WORKERS,
+        requests_per_minute: float = PROMPT_TEST_REQUESTS_PER_MINUTE,
+        result_store: Optional[PromptResultStore] = None,
+        cassette: Optional[Cassette] = None,
+    ):
         """
         Initialize the prompt tester.
         
         Args:
             prompt_service: Service for managing prompts
             llm_service: Service for interacting with the LLM
+            workers: Maximum number of test cases in flight
+            requests_per_minute: Rate limit per LLM provider (0 disables it)
+            result_store: Where test results are stored (default: `PROMPT_RESULTS_DB`)
+            cassette: Recorded LLM responses to replay (default: `PROMPT_CASSETTE_MODE`)
         """
         self.prompt_service = prompt_service or PromptService()
         self.llm_service = llm_service or LLMService()
+        self.workers = workers
+        self.requests_per_minute = requests_per_minute
         
         # Test cases for evaluating prompts
         self.test_cases = [
@@ -48,181 +85,322 @@ class PromptTester:
             ("", "", None),
         ]
         
-        # Create results directory if it doesn't exist
-        self.results_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts", "results")
-        os.makedirs(self.results_dir, exist_ok=True)
+        # Every run is appended to the result store
+        self.result_store = result_store if result_store is not None else PromptResultStore()
+        
+        # Recorded responses can stand in for the LLM
+        self.cassette = cassette if cassette is not None else Cassette()
     
-    def test_prompt(self, lang: str, name: str) -> Dict[str, Any]:
+    def test_prompt(
+        self,
+        lang: str,
+        name: str,
+        workers: Optional[int] = None,
+        incremental: bool = True,
+        test_cases: Optional[List[Tuple[str, str, Optional[str]]]] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
         """
         Test a prompt with various element combinations.
         
         Args:
             lang: Language code
             name: Name of the prompt
+            workers: Maximum number of test cases in flight (default: `self.workers`)
+            incremental: Reuse stored results of unchanged test cases while the template, generation parameters and evaluation code are unchanged
+            test_cases: Test cases to run instead of `self.test_cases`
+            progress: Called as `progress(done, total, successes)` after each test case
             
         Returns:
             Dictionary with test results
         """
+        return self._run_prompts([(lang, name)], workers, incremental, test_cases, progress)[0]
+    
+    def _run_prompts(
+        self,
+        prompts: List[Tuple[str, str]],
+        workers: Optional[int] = None,
+        incremental: bool = True,
+        test_cases: Optional[List[Tuple[str, str, Optional[str]]]] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Run every test case against every prompt in `prompts` as one stored run.
+        
+        When `incremental` is set, a (prompt, case) pair whose case content
+        and `_reuse_fingerprint` match a stored result for the same provider
+        and model is copied into this run instead of being sent to the LLM again.
+        
+        The remaining pairs share one pool of at most `workers` threads, so a
+        slow prompt does not hold up the others. Results come back in the
+        order of `prompts`, with test cases in the order of `self.test_cases`,
+        however the calls finish.
+        """
+        test_cases = list(test_cases if test_cases is not None else self.test_cases)
+        total = len(prompts) * len(test_cases)
+        counts = {"done": 0, "successes": 0}
+        progress_lock = threading.Lock()
+        
+        def report(outcome: Tuple[Dict[str, Any], Optional[str]]) -> Tuple[Dict[str, Any], Optional[str]]:
+            if progress is not None:
+                with progress_lock:
+                    counts["done"] += 1
+                    counts["successes"] += int(bool(outcome[0]["success"]))
+                    progress(counts["done"], total, counts["successes"])
+            return outcome
+        
+        if progress is not None:
+            progress(0, total, 0)
+        provider = getattr(self.llm_service, "provider", None)
+        model = getattr(self.llm_service, "model_name", None)
+        run_id = self.result_store.start_run(len(prompts), len(test_cases), provider=provider, model=model)
+        
+        outcomes: List[Optional[Tuple[Dict[str, Any], Optional[str]]]] = []
+        jobs = []
+        for lang, name in prompts:
+            fingerprint = self._reuse_fingerprint(lang, name)
+            stored_cases = {}
+            if incremental and fingerprint is not None:
+                stored_cases = self.result_store.reusable_cases(lang, name, fingerprint, provider, model)
+            
+            for case_index, case in enumerate(test_cases):
+                stored = stored_cases.get(case_key(*case))
+                if stored is not None:
+                    self.result_store.reuse_case(run_id, case_index, stored)
+                    outcomes.append(report(self._stored_outcome(stored)))
+                else:
+                    jobs.append((len(outcomes), (run_id, lang, name, case_index, case, fingerprint)))
+                    outcomes.append(None)
+        
+        if jobs:
+            max_workers = max(1, min(workers or self.workers, len(jobs)))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prompt-test") as pool:
+                # map() yields in submission order, which keeps the results deterministic
+                for (position, _), outcome in zip(jobs, pool.map(lambda job: report(self._run_case(*job[1])), jobs)):
+                    outcomes[position] = outcome
+        self.result_store.finish_run(run_id)
+        
+        results = []
+        for index, (lang, name) in enumerate(prompts):
+            prompt_outcomes = outcomes[index * len(test_cases):(index + 1) * len(test_cases)]
+            results.append(self._summarize(run_id, lang, name, prompt_outcomes))
+        return results
+    
+    def _reuse_fingerprint(self, lang: str, name: str) -> Optional[str]:
+        """
+        Hash what a prompt's results depend on besides the test case, or None if its template cannot be loaded.
+        
+        That is the template, the LLM's generation parameters and the code
+        that parses and validates responses, so changing any of them re-runs
+        the prompt's cases instead of reusing their stored results.
+        """
+        try:
+            template = self.prompt_service.get_prompt(lang, name)
+        except Exception as e:
+            logger.warning(f"Cannot load template {lang}/{name}, its results will not be reused: {e}")
+            return None
+        generation_params = json.dumps(getattr(self.llm_service, "generation_params", {}), sort_keys=True, default=str)
+        return template_hash("\0".join([template, generation_params, _evaluation_code_hash()]))
+    
+    @staticmethod
+    def _stored_outcome(stored: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Rebuild a test case outcome from a stored result."""
+        case_result = {
+            "element1": stored["element1"],
+            "element2": stored["element2"],
+            "expected": stored["expected"],
+            "result": stored["result"],
+            "success": stored["success"],
+            "reused_from": stored["reused_from"] or stored["run_id"],
+        }
+        if stored["error"] is not None:
+            case_result["error"] = stored["error"]
+        return case_result, stored["failure"]
+    
+    def _summarize(self, run_id: str, lang: str, name: str, outcomes: List[Tuple[Dict[str, Any], Optional[str]]]) -> Dict[str, Any]:
+        """Build the results of one prompt from its case outcomes."""
         results = {
+            "run_id": run_id,
             "lang": lang,
             "name": name,
-            "test_cases": [],
+            "test_cases": [case for case, _ in outcomes],
             "success_rate": 0.0,
-            "errors": 0,
-            "invalid_json": 0,
+            "errors": sum(1 for _, failure in outcomes if failure == "error"),
+            "invalid_json": sum(1 for _, failure in outcomes if failure == "invalid_json"),
+            "reused": sum(1 for case, _ in outcomes if "reused_from" in case),
         }
         
-        total_tests = len(self.test_cases)
-        successful_tests = 0
-        
-        # Create a directory for this prompt's results
-        prompt_results_dir = os.path.join(self.results_dir, f"{lang}_{name}")
-        os.makedirs(prompt_results_dir, exist_ok=True)
-        
-        for element1, element2, expected in self.test_cases:
-            # Format the prompt
-            try:
-                formatted_prompt = self.prompt_service.format_prompt(lang, name, element1, element2)
-            except Exception as e:
-                logger.error(f"Error formatting prompt: {e}")
-                results["test_cases"].append({
-                    "element1": element1,
-                    "element2": element2,
-                    "expected": expected,
-                    "result": None,
-                    "error": str(e),
-                    "success": False,
-                })
-                results["errors"] += 1
-                continue
-            
-            # Get response from LLM
-            try:
-                # Save the formatted prompt to a file
-                prompt_file = os.path.join(prompt_results_dir, f"{element1}_{element2}_prompt.txt")
-                with open(prompt_file, "w", encoding="utf-8") as f:
-                    f.write(formatted_prompt)
-                
-                # Get the response
-                response = self.llm_service._get_llm_response(formatted_prompt)
-                
-                # Save the raw response to a file
-                response_file = os.path.join(prompt_results_dir, f"{element1}_{element2}_response.txt")
-                with open(response_file, "w", encoding="utf-8") as f:
-                    f.write(response)
-                
-                # Try to parse as JSON
-                try:
-                    # Clean up the response - remove any markdown code blocks or extra text
-                    cleaned_response = response
-                    if "```json" in response:
-                        # Extract content between ```json and ```
-                        import re
-                        json_blocks = re.findall(r'```(?:json)?(.*?)```', response, re.DOTALL)
-                        if json_blocks:
-                            cleaned_response = json_blocks[0].strip()
-                    
-                    result = json.loads(cleaned_response)
-                except json.JSONDecodeError:
-                    logger.warning(f"Invalid JSON response for {element1} + {element2}: {response}")
-                    results["test_cases"].append({
-                        "element1": element1,
-                        "element2": element2,
-                        "expected": expected,
-                        "result": response,
-                        "error": "Invalid JSON response",
-                        "success": False,
-                    })
-                    results["invalid_json"] += 1
-                    
-                    # Try to extract information from non-JSON response
-                    import re
-                    
-                    # Look for patterns like "result: X" or "The result is X"
-                    result_patterns = [
-                        r'result[:\s]+["\']*([^"\',\n]+)["\',]',
-                        r'result is[:\s]+["\']*([^"\',\n]+)["\',]',
-                        r'would be[:\s]+["\']*([^"\',\n]+)["\',]',
-                        r'created[:\s]+["\']*([^"\',\n]+)["\',]',
-                    ]
-                    
-                    result_name = None
-                    for pattern in result_patterns:
-                        match = re.search(pattern, response, re.IGNORECASE)
-                        if match:
-                            result_name = match.group(1).strip()
-                            break
-                    
-                    # If we couldn't find a result, use a default
-                    if not result_name:
-                        continue
-                    
-                    # Create a fallback result
-                    result = {
-                        "result": result_name,
-                        "emoji": "✨",
-                        "raw_response": response
-                    }
-                    
-                    # Save the extracted result
-                    result_file = os.path.join(prompt_results_dir, f"{element1}_{element2}_extracted.json")
-                    with open(result_file, "w", encoding="utf-8") as f:
-                        json.dump(result, f, indent=2)
-                    
-                    # Continue with validation
-                    
-            except Exception as e:
-                logger.error(f"Error getting LLM response: {e}")
-                results["test_cases"].append({
-                    "element1": element1,
-                    "element2": element2,
-                    "expected": expected,
-                    "result": None,
-                    "error": str(e),
-                    "success": False,
-                })
-                results["errors"] += 1
-                continue
+        # Calculate success rate
+        if outcomes:
+            results["success_rate"] = sum(1 for case, _ in outcomes if case["success"]) / len(outcomes)
             
-            # Check if the result is valid
-            success = self._validate_result(result, element1, element2, expected)
-            if success:
-                successful_tests += 1
-                
-            # Save the result and evaluation
-            result_file = os.path.join(prompt_results_dir, f"{element1}_{element2}_result.json")
-            with open(result_file, "w", encoding="utf-8") as f:
-                json.dump(result, f, indent=2)
-                
-            eval_file = os.path.join(prompt_results_dir, f"{element1}_{element2}_eval.json")
-            eval_result = {
-                "element1": element1,
-                "element2": element2,
-                "expected": expected,
-                "success": success,
-                "notes": self._get_validation_notes(result, element1, element2, expected)
+        return results
+    
+    def _wait_for_provider(self) -> None:
+        """Block until the LLM provider's rate limit allows another request."""
+        if self.requests_per_minute <= 0:
+            return
+        provider = getattr(self.llm_service, "provider", "default")
+        bucket = [(f"provider:{provider}", PROMPT_TEST_RATE_BURST, self.requests_per_minute / 60.0)]
+        while True:
+            wait = _provider_buckets.acquire(bucket)
+            if not wait:
+                return
+            time.sleep(wait)
+    
+    def _get_response(self, prompt: str) -> Dict[str, Any]:
+        """
+        Get the LLM response to a prompt, from the cassette when it has one.
+        
+        Returns the `response` text with the call's `latency_ms` (excluding
+        rate limit waits) and the token `usage` reported by the provider, if any.
+        """
+        def call() -> Dict[str, Any]:
+            self._wait_for_provider()
+            started = time.perf_counter()
+            get_with_usage = getattr(self.llm_service, "_get_llm_response_with_usage", None)
+            if get_with_usage is not None:
+                response, usage = get_with_usage(prompt)
+            else:
+                response, usage = self.llm_service._get_llm_response(prompt), None
+            return {
+                "response": response,
+                "latency_ms": (time.perf_counter() - started) * 1000,
+                "usage": usage,
             }
-            with open(eval_file, "w", encoding="utf-8") as f:
-                json.dump(eval_result, f, indent=2)
-                
-            results["test_cases"].append({
-                "element1": element1,
-                "element2": element2,
-                "expected": expected,
-                "result": result,
-                "success": success,
-            })
         
-        # Calculate success rate
-        if total_tests > 0:
-            results["success_rate"] = successful_tests / total_tests
-            
-        # Save the overall results
-        overall_results_file = os.path.join(prompt_results_dir, "overall_results.json")
-        with open(overall_results_file, "w", encoding="utf-8") as f:
-            json.dump(results, f, indent=2)
+        return self.cassette.respond(
+            getattr(self.llm_service, "provider", None),
+            getattr(self.llm_service, "model_name", None),
+            getattr(self.llm_service, "generation_params", {}),
+            prompt,
+            call
+        )
+    
+    @staticmethod
+    def _call_metrics(prompt: str, call: Dict[str, Any]) -> Dict[str, Any]:
+        """Latency, token counts and cost of an LLM call, estimating tokens the provider did not report."""
+        usage = call.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        estimated = prompt_tokens is None or completion_tokens is None
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(call["response"])
+        return {
+            "latency_ms": call.get("latency_ms"),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_estimated": int(estimated),
+            "cost": estimate_cost(prompt_tokens, completion_tokens),
+            "replayed": int(bool(call.get("replayed"))),
+        }
+    
+    def _run_case(
+        self,
+        run_id: str,
+        lang: str,
+        name: str,
+        case_index: int,
+        case: Tuple[str, str, Optional[str]],
+        template: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Run one test case against one prompt and store its result.
+        
+        Returns the test case result and the kind of failure to count
+        ("error", "invalid_json" or None).
+        """
+        element1, element2, expected = case
+        case_result = {
+            "element1": element1,
+            "element2": element2,
+            "expected": expected,
+            "result": None,
+            "success": False,
+        }
+        failure = None
+        formatted_prompt = None
+        response = None
+        notes: List[str] = []
+        metrics: Dict[str, Any] = {}
+        
+        try:
+            # Format the prompt and get the response from the LLM
+            formatted_prompt = self.prompt_service.format_prompt(lang, name, element1, element2)
+            call = self._get_response(formatted_prompt)
+            response = call["response"]
+            metrics = self._call_metrics(formatted_prompt, call)
+        except Exception as e:
+            logger.error(f"Error testing {element1} + {element2} with {lang}/{name}: {e}")
+            case_result["error"] = str(e)
+            failure = "error"
+        else:
+            result, metrics["parse_path"] = self._parse_response(element1, element2, response)
+            if result is None or "raw_response" in result:
+                case_result["error"] = "Invalid JSON response"
+                failure = "invalid_json"
+            if result is None:
+                case_result["result"] = response
+            else:
+                # Check if the result is valid
+                case_result["result"] = result
+                case_result["success"] = self._validate_result(result, element1, element2, expected)
+                notes = self._get_validation_notes(result, element1, element2, expected)
+        
+        self.result_store.add_case(
+            run_id, lang, name, case_index, case_result,
+            failure=failure, prompt=formatted_prompt, response=response, notes=notes,
+            template=template, metrics=metrics
+        )
+        return case_result, failure
+    
+    def _parse_response(self, element1: str, element2: str, response: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        Parse an LLM response into a result.
+        
+        Falls back to pulling the result name out of free text when the
+        response is not JSON; such results keep the text in `raw_response`.
+        Returns the result (None if nothing could be extracted) and the
+        parse path that produced it: "json", "markdown_json", "regex" or "none".
+        """
+        parse_path = "json"
+        try:
+            # Clean up the response - remove any markdown code blocks or extra text
+            cleaned_response = response
+            if "```json" in response:
+                # Extract content between ```json and ```
+                json_blocks = re.findall(r'```(?:json)?(.*?)```', response, re.DOTALL)
+                if json_blocks:
+                    cleaned_response = json_blocks[0].strip()
+                    parse_path = "markdown_json"
             
-        return results
+            result = json.loads(cleaned_response)
+            if isinstance(result, dict):
+                return result, parse_path
+        except json.JSONDecodeError:
+            pass
+        logger.warning(f"Invalid JSON response for {element1} + {element2}: {response}")
+        
+        # Look for patterns like "result: X" or "The result is X"
+        result_patterns = [
+            r'result[:\s]+["\']*([^"\',\n]+)["\',]',
+            r'result is[:\s]+["\']*([^"\',\n]+)["\',]',
+            r'would be[:\s]+["\']*([^"\',\n]+)["\',]',
+            r'created[:\s]+["\']*([^"\',\n]+)["\',]',
+        ]
+        
+        for pattern in result_patterns:
+            match = re.search(pattern, response, re.IGNORECASE)
+            if match:
+                # Create a fallback result
+                return {
+                    "result": match.group(1).strip(),
+                    "emoji": "✨",
+                    "raw_response": response
+                }, "regex"
+        return None, "none"
     
     def _validate_result(self, result: Dict[str, Any], element1: str, element2: str, expected: Optional[str]) -> bool:
         """
@@ -320,37 +498,44 @@ class PromptTester:
             
         return notes
     
-    def test_all_prompts(self, lang: Optional[str] = None) -> List[Dict[str, Any]]:
+    def test_all_prompts(
+        self,
+        lang: Optional[str] = None,
+        workers: Optional[int] = None,
+        incremental: bool = True,
+        test_cases: Optional[List[Tuple[str, str, Optional[str]]]] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Test all available prompts.
         
         Args:
             lang: Optional language code to filter by
+            workers: Maximum number of test cases in flight (default: `self.workers`)
+            incremental: Reuse stored results of unchanged test cases while the templates, generation parameters and evaluation code are unchanged
+            test_cases: Test cases to run instead of `self.test_cases`
+            progress: Called as `progress(done, total, successes)` after each test case
             
         Returns:
             List of test results for each prompt
         """
-        results = []
-        
         # Get available prompts
         available_prompts = self.prompt_service.list_prompts(lang)
+        prompts = [
+            (test_lang, name)
+            for test_lang, prompt_names in available_prompts.items()
+            for name in prompt_names
+        ]
         
-        # Test each prompt
-        for test_lang, prompt_names in available_prompts.items():
-            for name in prompt_names:
-                result = self.test_prompt(test_lang, name)
-                results.append(result)
+        # Test all prompts concurrently, as one run
+        results = self._run_prompts(prompts, workers, incremental, test_cases, progress)
                 
-        # Sort results by success rate
+        # Sort results by success rate (stable, so ties keep the prompt order)
         results.sort(key=lambda x: x["success_rate"], reverse=True)
         
-        # Save the overall comparison
-        comparison_file = os.path.join(self.results_dir, "prompt_comparison.json")
-        with open(comparison_file, "w", encoding="utf-8") as f:
-            json.dump(results, f, indent=2)
-        
         return results
     
+
     def add_test_case(self, element1: str, element2: str, expected: Optional[str] = None) -> None:
         """
         Add a new test case.
@@ -365,202 +550,16 @@ class PromptTester:
     def clear_test_cases(self) -> None:
         """Clear all test cases."""
         self.test_cases = []
-    
-    def _process_response(self, element1: str, element2: str, expected: Optional[str], response: str, output_dir: str) -> Dict[str, Any]:
-        """
-        Process a response from the LLM.
-        
-        Args:
-            element1: First element
-            element2: Second element
-            expected: Expected result, or None if no specific expectation
-            response: Raw response from the LLM
-            output_dir: Directory to save results
-            
-        Returns:
-            Dictionary with test case results
-        """
+
+@lru_cache(maxsize=1)
+def _evaluation_code_hash() -> str:
+    """Hash the code turning an LLM response into a test case result."""
+    methods = (PromptTester._parse_response, PromptTester._validate_result, PromptTester._get_validation_notes)
+    digest = hashlib.sha256()
+    for method in methods:
         try:
-            # Clean up the response - remove any markdown code blocks or extra text
-            cleaned_response = response
-            if "```json" in response:
-                # Extract content between ```json and ```
-                import re
-                json_blocks = re.findall(r'```(?:json)?(.*?)```', response, re.DOTALL)
-                if json_blocks:
-                    cleaned_response = json_blocks[0].strip()
-            
-            # Parse the JSON
-            result = json.loads(cleaned_response)
-            
-            # Save the result
-            result_file = os.path.join(output_dir, f"{element1}_{element2}_result.json")
-            with open(result_file, "w", encoding="utf-8") as f:
-                json.dump(result, f, indent=2)
-            
-            # Validate the result
-            success = self._validate_result(result, element1, element2, expected)
-            
-            # Save the evaluation
-            eval_file = os.path.join(output_dir, f"{element1}_{element2}_eval.json")
-            eval_result = {
-                "element1": element1,
-                "element2": element2,
-                "expected": expected,
-                "success": success,
-                "notes": self._get_validation_notes(result, element1, element2, expected)
-            }
-            with open(eval_file, "w", encoding="utf-8") as f:
-                json.dump(eval_result, f, indent=2)
-            
-            return {
-                "element1": element1,
-                "element2": element2,
-                "expected": expected,
-                "result": result,
-                "success": success,
-            }
-            
-        except json.JSONDecodeError:
-            logger.warning(f"Invalid JSON response for {element1} + {element2}: {response}")
-            
-            # Try to extract information from non-JSON response
-            import re
-            
-            # Extract result name
-            result_name = None
-            
-            # Look for "Result:" pattern
-            result_match = re.search(r'Result:?\s*([^\n]+)', response, re.IGNORECASE)
-            if result_match:
-                result_name = result_match.group(1).strip()
-            
-            # If no result found, look for other patterns
-            if not result_name:
-                # Look for patterns like "result: X" or "The result is X"
-                result_patterns = [
-                    r'result[:\s]+["\']*([^"\',\n]+)["\',]',
-                    r'result is[:\s]+["\']*([^"\',\n]+)["\',]',
-                    r'would be[:\s]+["\']*([^"\',\n]+)["\',]',
-                    r'created[:\s]+["\']*([^"\',\n]+)["\',]',
-                    r'Element Name:?\s*([^\n]+)',
-                    r'Name:?\s*([^\n]+)',
-                    r'\*\*Name:\*\*\s*([^\n]+)',
-                    r'\*\*Result:\*\*\s*([^\n]+)',
-                ]
-                
-                for pattern in result_patterns:
-                    match = re.search(pattern, response, re.IGNORECASE)
-                    if match:
-                        result_name = match.group(1).strip()
-                        break
-            
-            # Extract emoji
-            emoji = "✨"  # Default emoji
-            emoji_match = re.search(r'Emoji:?\s*([^\n]+)', response, re.IGNORECASE)
-            if emoji_match:
-                emoji_text = emoji_match.group(1).strip()
-                # Extract just the emoji character if possible
-                emoji_char_match = re.search(r'([\u2600-\u27BF\U0001F300-\U0001F64F\U0001F680-\U0001F6FF\u2700-\u27BF])', emoji_text)
-                if emoji_char_match:
-                    emoji = emoji_char_match.group(1)
-                else:
-                    emoji = emoji_text
-            else:
-                # Look for emoji at the beginning of the response
-                emoji_char_match = re.search(r'^([\u2600-\u27BF\U0001F300-\U0001F64F\U0001F680-\U0001F6FF\u2700-\u27BF]+)', response.strip())
-                if emoji_char_match:
-                    emoji = emoji_char_match.group(1)
-                else:
-                    # Look for emoji in the response
-                    emoji_char_match = re.search(r'([\u2600-\u27BF\U0001F300-\U0001F64F\U0001F680-\U0001F6FF\u2700-\u27BF]+)', response)
-                    if emoji_char_match:
-                        emoji = emoji_char_match.group(1)
-            
-            # If we couldn't find a result, use a default
-            if not result_name:
-                # Look for any capitalized word that might be the result
-                capitalized_words = re.findall(r'\b([A-Z][a-z]+)\b', response)
-                if capitalized_words:
-                    # Filter out common words and the input elements
-                    common_words = ["Result", "Emoji", "Element", "Name", element1, element2]
-                    filtered_words = [word for word in capitalized_words if word not in common_words]
-                    if filtered_words:
-                        result_name = filtered_words[0]
-            
-            # If still no result, try to extract from the response
-            if not result_name:
-                # Split the response into lines and look for short lines that might be the result
-                lines = response.strip().split('\n')
-                for line in lines:
-                    line = line.strip()
-                    # Skip empty lines and lines with common words
-                    if not line or any(word in line.lower() for word in ["result", "emoji", "element", "name"]):
-                        continue
-                    # Skip lines that are too long
-                    if len(line) > 30:
-                        continue
-                    # Skip lines with the input elements
-                    if element1.lower() in line.lower() or element2.lower() in line.lower():
-                        continue
-                    # This might be the result
-                    result_name = line
-                    break
-            
-            # If still no result, use "Unknown"
-            if not result_name:
-                result_name = "Unknown"
-            
-            # Clean up the result name
-            result_name = result_name.strip()
-            # Remove any markdown formatting
-            result_name = re.sub(r'\*\*|\*|`|_', '', result_name)
-            # Remove any leading/trailing punctuation
-            result_name = re.sub(r'^[^\w]+|[^\w]+$', '', result_name)
-            
-            # Create a fallback result
-            result = {
-                "result": result_name,
-                "emoji": emoji,
-                "raw_response": response  # Include the raw response for debugging
-            }
-            
-            # Save the extracted result
-            extracted_file = os.path.join(output_dir, f"{element1}_{element2}_extracted.json")
-            with open(extracted_file, "w", encoding="utf-8") as f:
-                json.dump(result, f, indent=2)
-            
-            # Validate the result
-            success = self._validate_result(result, element1, element2, expected)
-            
-            # Save the evaluation
-            eval_file = os.path.join(output_dir, f"{element1}_{element2}_eval.json")
-            eval_result = {
-                "element1": element1,
-                "element2": element2,
-                "expected": expected,
-                "success": success,
-                "notes": self._get_validation_notes(result, element1, element2, expected)
-            }
-            with open(eval_file, "w", encoding="utf-8") as f:
-                json.dump(eval_result, f, indent=2)
-            
-            return {
-                "element1": element1,
-                "element2": element2,
-                "expected": expected,
-                "result": response,
-                "error": "Invalid JSON response",
-                "success": False,
-            }
-            
-        except Exception as e:
-            logger.error(f"Error processing response: {e}")
-            return {
-                "element1": element1,
-                "element2": element2,
-                "expected": expected,
-                "result": None,
-                "error": str(e),
-                "success": False,
-            } 
\ No newline at end of file
+            digest.update(inspect.getsource(method).encode("utf-8"))
+        except (OSError, TypeError):
+            # No source available (e.g. a frozen build); the bytecode changes with it
+            digest.update(method.__code__.co_code)
+    return digest.hexdigest()[:16]
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sustained rate and burst size of each bucket. A rate of 0 disables the bucket.
+RATE_LIMIT_PLAYER_PER_MINUTE = float(os.getenv("RATE_LIMIT_PLAYER_PER_MINUTE", "20"))
+RATE_LIMIT_PLAYER_BURST = float(os.getenv("RATE_LIMIT_PLAYER_BURST", "10"))
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "60"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+RATE_LIMIT_GLOBAL_PER_MINUTE = float(os.getenv("RATE_LIMIT_GLOBAL_PER_MINUTE", "600"))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", "60"))
+# Share buckets between workers through Redis instead of process memory
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+Bucket = Tuple[str, float, float]  # (key, capacity, tokens per second)
+
+@dataclass
+class BucketLimit:
+    per_minute: float
+    burst: float
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0 and self.burst > 0
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+class MemoryBuckets:
+    """Token buckets in process memory, evicting the least recently used keys."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def acquire(self, buckets: List[Bucket]) -> float:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, capacity, rate in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                levels.append((key, tokens))
+            if wait:
+                return wait
+
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - 1, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+# Takes one token from every bucket, or from none if any of them is empty.
+# KEYS are the bucket keys; ARGV is the current time followed by capacity and
+# rate for each key. Returns the seconds to wait as a string, "0" on success.
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'updated', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+"""
+
+class RedisBuckets:
+    """Token buckets in Redis, updated atomically by a Lua script."""
+
+    def __init__(self, redis_url: str, prefix: str = "rate_limit:"):
+        import redis
+
+        self.prefix = prefix
+        self.redis = redis.from_url(redis_url)
+        self._script = self.redis.register_script(_ACQUIRE_SCRIPT)
+
+    def acquire(self, buckets: List[Bucket]) -> float:
+        args = [time.time()]
+        for _, capacity, rate in buckets:
+            args.extend([capacity, rate])
+        try:
+            wait = self._script(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+        except Exception as e:
+            # Fail open: an unavailable limiter must not take the game down
+            logger.error(f"Rate limit check failed: {e}")
+            return 0.0
+        return float(wait)
+
+class RateLimiter:
+    """
+    Token-bucket limits for requests that reach the LLM.
+
+    A request takes one token from the player's bucket, the client IP's
+    bucket and the global bucket, or from none of them if any is empty.
+    """
+
+    def __init__(
+        self,
+        player: BucketLimit,
+        ip: BucketLimit,
+        global_: BucketLimit,
+        backend=None,
+    ):
+        self.player = player
+        self.ip = ip
+        self.global_ = global_
+        self.backend = backend or MemoryBuckets()
+
+    def acquire(self, player_name: Optional[str] = None, client_ip: Optional[str] = None) -> float:
+        """Take a token. Returns 0 if allowed, otherwise the seconds until a retry can succeed."""
+        buckets: List[Bucket] = []
+        if player_name and self.player.enabled:
+            buckets.append((f"player:{player_name}", self.player.burst, self.player.rate))
+        if client_ip and self.ip.enabled:
+            buckets.append((f"ip:{client_ip}", self.ip.burst, self.ip.rate))
+        if self.global_.enabled:
+            buckets.append(("global", self.global_.burst, self.global_.rate))
+        if not buckets:
+            return 0.0
+        return self.backend.acquire(buckets)
+
+def create_rate_limiter() -> RateLimiter:
+    """Build the LLM rate limiter from the `RATE_LIMIT_*` environment variables."""
+    backend = None
+    if RATE_LIMIT_REDIS_URL:
+        try:
+            backend = RedisBuckets(RATE_LIMIT_REDIS_URL)
+            logger.info("Rate limiter using Redis")
+        except Exception as e:
+            logger.error(f"Failed to initialize Redis rate limiter, using memory: {e}")
+
+    return RateLimiter(
+        player=BucketLimit(RATE_LIMIT_PLAYER_PER_MINUTE, RATE_LIMIT_PLAYER_BURST),
+        ip=BucketLimit(RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST),
+        global_=BucketLimit(RATE_LIMIT_GLOBAL_PER_MINUTE, RATE_LIMIT_GLOBAL_BURST),
+        backend=backend,
+    )
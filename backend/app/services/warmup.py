@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.serialization import ELEMENT_COLUMNS
+from app.db.database import SessionLocal
+from app.models.element import DBElement, element_combinations, player_elements
+from app.services.element_cache import recipe_cache
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to skip warm-up and report ready immediately
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() not in ("0", "false", "no")
+# Number of most-used recipes preloaded into the recipe cache
+WARMUP_TOP_RECIPES = int(os.getenv("WARMUP_TOP_RECIPES", "5000"))
+
+class WarmupState:
+    """Progress of the startup warm-up, read by the readiness endpoint."""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.stats: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready.is_set() else "warming_up",
+            "warmup": self.stats,
+            "error": self.error,
+        }
+
+warmup_state = WarmupState()
+
+def _recipe_rows(db: Session):
+    """Query of stored recipes as recipe cache rows: the pair, its language and the result's columns."""
+    return db.query(
+        element_combinations.c.element1_id,
+        element_combinations.c.element2_id,
+        element_combinations.c.language.label("recipe_language"),
+        *ELEMENT_COLUMNS,
+    ).join(DBElement, DBElement.id == element_combinations.c.result_id)
+
+def _cache_recipes(rows) -> int:
+    recipe_cache.put_many(
+        ((row.recipe_language, (row.element1_id, row.element2_id)), row) for row in rows
+    )
+    return len(rows)
+
+def warm_up(session_factory=SessionLocal, top_recipes: int = WARMUP_TOP_RECIPES) -> Dict[str, Any]:
+    """
+    Fill the in-process caches from the database.
+
+    Loads the recipes combining two basic elements of a language (the first
+    combinations every new player tries), the `top_recipes` recipes whose
+    results are unlocked by the most players, and the prompt templates (by
+    building the shared prompt and LLM services).
+    """
+    from app.core.services import get_llm_service, get_prompt_service
+
+    started = time.perf_counter()
+    stats: Dict[str, Any] = {}
+    db = session_factory()
+    try:
+        basic_ids = db.query(DBElement.id).filter(DBElement.is_basic == True)
+        stats["basic_recipes"] = _cache_recipes(_recipe_rows(db).filter(
+            element_combinations.c.element1_id.in_(basic_ids),
+            element_combinations.c.element2_id.in_(basic_ids),
+        ).all())
+
+        if top_recipes > 0:
+            usage = db.query(
+                player_elements.c.element_id,
+                func.count().label("players"),
+            ).group_by(player_elements.c.element_id).subquery()
+            stats["recipes"] = _cache_recipes(_recipe_rows(db).outerjoin(
+                usage, usage.c.element_id == element_combinations.c.result_id
+            ).order_by(
+                func.coalesce(usage.c.players, 0).desc()
+            ).limit(top_recipes).all())
+    finally:
+        db.close()
+
+    prompt_service = get_prompt_service()
+    stats["prompts"] = sum(len(names) for names in prompt_service.list_prompts().values())
+    try:
+        get_llm_service()
+        stats["llm_service"] = True
+    except Exception as e:
+        # A missing provider configuration should not keep the API from serving cached data
+        logger.warning(f"LLM service not available during warm-up: {e}")
+        stats["llm_service"] = False
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+def start_warm_up(state: WarmupState = warmup_state) -> None:
+    """Run `warm_up` in a background thread and mark `state` ready when it ends."""
+    if not WARMUP_ENABLED:
+        state.ready.set()
+        return
+
+    def run():
+        try:
+            state.stats = warm_up()
+            logger.info(f"Warm-up finished: {state.stats}")
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}")
+            state.error = str(e)
+        finally:
+            # A failed warm-up only means colder caches; the API still works
+            state.ready.set()
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
@@ -0,0 +1,102 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.endpoints import discoveries
+from app.db.database import Base, get_db
+from app.models.element import DBElement, DiscoveryHistory, PlayerStats
+from app.services.player_cache import player_cache
+
+def make_client(discovery_count: int):
+    """Build an app serving the discoveries router on a fresh in-memory database."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    player_cache.clear()
+    db = TestingSession()
+    players = [PlayerStats(player_name=f"player{i}") for i in range(3)]
+    db.add_all(players)
+    db.flush()
+    for i in range(discovery_count):
+        element = DBElement(name=f"Element {i}", emoji="✨", language="en")
+        db.add(element)
+        db.flush()
+        db.add(DiscoveryHistory(
+            element_id=element.id,
+            player_id=players[i % 3].id,
+            is_first_discovery=(i % 2 == 0),
+        ))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        session = TestingSession()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app = FastAPI()
+    app.include_router(discoveries.router, prefix="/api/discoveries")
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app), engine
+
+def count_selects(engine, client, url):
+    """Return the response for `url` and the number of SELECTs it issued."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return response, len(statements)
+
+def test_discovery_feeds_use_constant_query_count():
+    client, engine = make_client(60)
+
+    for url in ["/api/discoveries/", "/api/discoveries/first", "/api/discoveries/player/player1"]:
+        # The first request for a player resolves the name into the player cache
+        client.get(url)
+        small, small_queries = count_selects(engine, client, f"{url}?limit=2")
+        large, large_queries = count_selects(engine, client, f"{url}?limit=50")
+
+        assert small.status_code == 200
+        assert large.status_code == 200
+        assert len(large.json()["discoveries"]) > len(small.json()["discoveries"])
+        assert small_queries == large_queries == 1
+
+def test_discovery_cursor_pages_do_not_overlap():
+    client, _ = make_client(7)
+
+    seen = []
+    url = "/api/discoveries/?limit=3"
+    while url:
+        page = client.get(url).json()
+        seen.extend(d["id"] for d in page["discoveries"])
+        url = f"/api/discoveries/?limit=3&cursor={page['next_cursor']}" if page["next_cursor"] else None
+
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+def test_discovery_includes_element():
+    client, _ = make_client(1)
+
+    discovery = client.get("/api/discoveries/element/1/first").json()
+    assert discovery["element"]["name"] == "Element 0"
+    assert discovery["element"]["discovered_by"] is None
+    assert discovery["player_name"] == "player0"
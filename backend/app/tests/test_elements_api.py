@@ -0,0 +1,243 @@
+import sys
+import threading
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import orjson
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.endpoints import elements, players
+from app.core.services import override_service, reset_services
+from app.db.database import Base, get_db
+from app.db.init_db import LANGUAGE_BASIC_ELEMENTS
+from app.db.versions import bump_language_version
+from app.models.element import DBElement, PlayerStats
+from app.services.element_cache import recipe_cache
+from app.services.game_session import GameSession
+from app.services.idempotency import IdempotencyStore
+from app.services.player_cache import player_cache
+from app.services.rate_limiter import BucketLimit, RateLimiter
+
+class FakeLLMService:
+    """Answers every pair with an element named after both inputs, counting the calls."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def is_cached(self, element1, element2, lang="en", prompt_name="default"):
+        return False
+
+    def combine_elements(self, element1, element2, lang="en", prompt_name="default"):
+        with self._lock:
+            self.calls.append((element1, element2))
+        return {"result": f"{element1}{element2}", "emoji": "✨"}
+
+def make_client(extra_elements: int = 0, players_count: int = 0):
+    """Build an app serving the elements and players routers on a fresh in-memory database."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    player_cache.clear()
+    recipe_cache.clear()
+    db = TestingSession()
+    for lang, basic_elements in LANGUAGE_BASIC_ELEMENTS.items():
+        db.add_all(DBElement(**element) for element in basic_elements)
+        bump_language_version(db, lang)
+    db.add_all(DBElement(name=f"Element {i}", language="en") for i in range(extra_elements))
+    db.add_all(PlayerStats(player_name=f"player{i}") for i in range(players_count))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        session = TestingSession()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    reset_services()
+    llm = FakeLLMService()
+    override_service("llm_service", llm)
+
+    app = FastAPI()
+    app.include_router(elements.router, prefix="/api/elements")
+    app.include_router(players.router, prefix="/api/players")
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app), TestingSession, llm
+
+def all_pages(client, url, key):
+    """Follow `next_cursor` from the first page to the last, returning every page's ids."""
+    pages = []
+    response = client.get(url).json()
+    pages.append([item["id"] for item in response[key]])
+    while response["next_cursor"]:
+        response = client.get(url, params={"cursor": response["next_cursor"]}).json()
+        pages.append([item["id"] for item in response[key]])
+    return pages
+
+def test_cursor_pages_do_not_overlap():
+    client, _, _ = make_client(extra_elements=10, players_count=7)
+
+    element_pages = all_pages(client, "/api/elements/?language=en&limit=3", "elements")
+    element_ids = [element_id for page in element_pages for element_id in page]
+    assert len(element_pages) == 5
+    assert element_ids == sorted(set(element_ids)) and len(element_ids) == 14
+
+    player_pages = all_pages(client, "/api/players/?limit=3", "stats")
+    player_ids = [player_id for page in player_pages for player_id in page]
+    assert player_ids == sorted(set(player_ids)) and len(player_ids) == 7
+
+def test_matching_if_none_match_returns_304():
+    client, _, _ = make_client()
+
+    first = client.get("/api/elements/?language=en")
+    etag = first.headers["ETag"]
+    cached = client.get("/api/elements/?language=en", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    # A new element changes the language version, and so the ETag
+    client.post("/api/elements/", json={"name": "Steam", "emoji": "♨️", "language": "en"})
+    changed = client.get("/api/elements/?language=en", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.json()["elements"]) == 5
+
+    inventory = client.get("/api/elements/player/alice")
+    assert client.get("/api/elements/player/alice", headers={"If-None-Match": inventory.headers["ETag"]}).status_code == 304
+
+def test_delta_since_version_returns_only_newer_unlocks():
+    client, _, _ = make_client()
+    assert client.get("/api/elements/player/alice/delta").json() == {"version": 0, "elements": []}
+
+    client.get("/api/players/alice")
+    full = client.get("/api/elements/player/alice/delta").json()
+    assert len(full["elements"]) == 8
+    version = full["version"]
+
+    combined = client.post("/api/elements/combine", json={"element1_id": 1, "element2_id": 2, "player_name": "alice"}).json()
+    delta = client.get(f"/api/elements/player/alice/delta?since={version}").json()
+    assert delta["version"] == version + 1
+    assert [element["id"] for element in delta["elements"]] == [combined["result_id"]]
+
+    assert client.get(f"/api/elements/player/alice/delta?since={version + 1}").json() == {"version": version + 1, "elements": []}
+
+def test_batch_streams_one_ndjson_line_per_pair():
+    client, _, llm = make_client()
+
+    response = client.post("/api/elements/combine/batch", json={
+        "player_name": "alice",
+        "pairs": [
+            {"element1_id": 1, "element2_id": 2},
+            {"element1_id": 2, "element2_id": 1},
+            {"element1_id": 3, "element2_id": 4},
+            {"element1_id": 1, "element2_id": 99},
+        ],
+    })
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    results = {line["index"]: line for line in lines}
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[3]["error"] == "One or both elements not found"
+    # Both orders of a pair are one LLM call and one result
+    assert results[0]["result_id"] == results[1]["result_id"] != results[2]["result_id"]
+    assert sorted(llm.calls) == [("Earth", "Air"), ("Water", "Fire")]
+
+    # Now known, the pair is answered without the LLM
+    again = client.post("/api/elements/combine/batch", json={"pairs": [{"element1_id": 1, "element2_id": 2}]})
+    assert orjson.loads(again.content)["result_id"] == results[0]["result_id"]
+    assert len(llm.calls) == 2
+
+def test_websocket_session_combines_and_answers_known_recipes(monkeypatch):
+    client, TestingSession, llm = make_client()
+    monkeypatch.setattr(elements, "GameSession", lambda player_name: GameSession(player_name, session_factory=TestingSession))
+
+    with client.websocket_connect("/api/elements/ws/alice") as websocket:
+        websocket.send_text('{"type": "combine", "request_id": 1, "element1_id": 1, "element2_id": 2}')
+        assert orjson.loads(websocket.receive_bytes()) == {"type": "generating", "request_id": 1}
+        generated = orjson.loads(websocket.receive_bytes())
+        assert (generated["type"], generated["request_id"], generated["is_first_discovery"]) == ("result", 1, True)
+
+        websocket.send_text('{"type": "combine", "request_id": 2, "element1_id": 2, "element2_id": 1}')
+        known = orjson.loads(websocket.receive_bytes())
+        assert (known["type"], known["request_id"], known["result_id"]) == ("result", 2, generated["result_id"])
+
+        websocket.send_text('{"type": "combine", "request_id": 3}')
+        assert orjson.loads(websocket.receive_bytes())["type"] == "error"
+
+    assert llm.calls == [("Water", "Fire")]
+    # Buffered stats are written when the session closes
+    db = TestingSession()
+    player = db.query(PlayerStats).filter(PlayerStats.player_name == "alice").one()
+    assert player.successful_combinations == 2
+
+def test_websocket_session_releases_its_connection_between_messages(tmp_path):
+    # A file database gets a real connection pool that counts checkouts
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    player_cache.clear()
+    recipe_cache.clear()
+    db = Session()
+    db.add_all(DBElement(**element) for element in LANGUAGE_BASIC_ELEMENTS["en"])
+    db.commit()
+    db.close()
+
+    session = GameSession("alice", session_factory=Session)
+    session.load()
+    assert engine.pool.checkedout() == 0
+    session.store_generated(1, 2, "en", {"result": "Steam", "emoji": "♨️"})
+    assert engine.pool.checkedout() == 0
+    # A known recipe already in the inventory writes nothing
+    response, _ = session.resolve(2, 1, "en")
+    assert response["result"]["name"] == "Steam"
+    assert engine.pool.checkedout() == 0
+    response, _ = session.resolve(1, 99, "en")
+    assert response["error"] and engine.pool.checkedout() == 0
+    session.close()
+    engine.dispose()
+
+def test_combinations_over_the_rate_limit_get_429_with_retry_after():
+    client, _, llm = make_client()
+    override_service("rate_limiter", RateLimiter(
+        player=BucketLimit(per_minute=1, burst=1), ip=BucketLimit(0, 0), global_=BucketLimit(0, 0)
+    ))
+
+    assert client.post("/api/elements/combine", json={"element1_id": 1, "element2_id": 2, "player_name": "alice"}).status_code == 200
+    limited = client.post("/api/elements/combine", json={"element1_id": 3, "element2_id": 4, "player_name": "alice"})
+    assert limited.status_code == 429
+    assert 1 <= int(limited.headers["Retry-After"]) <= 60
+    # Known recipes and other players are not limited by alice's bucket
+    assert client.post("/api/elements/combine", json={"element1_id": 1, "element2_id": 2, "player_name": "alice"}).status_code == 200
+    assert client.post("/api/elements/combine", json={"element1_id": 3, "element2_id": 4, "player_name": "bob"}).status_code == 200
+    assert len(llm.calls) == 2
+
+def test_repeated_idempotency_key_replays_the_first_combination(monkeypatch):
+    client, _, llm = make_client()
+    monkeypatch.setattr(elements, "idempotency_store", IdempotencyStore())
+    body = {"element1_id": 1, "element2_id": 2, "player_name": "alice"}
+
+    first = client.post("/api/elements/combine", json=body, headers={"Idempotency-Key": "combine-1"})
+    retry = client.post("/api/elements/combine", json=body, headers={"Idempotency-Key": "combine-1"})
+
+    assert retry.json() == first.json() and first.json()["is_first_discovery"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(llm.calls) == 1
+    other = client.post("/api/elements/combine", json={**body, "element2_id": 3}, headers={"Idempotency-Key": "combine-1"})
+    assert other.status_code == 422
+
+    # Keys are per player: bob's "combine-1" is his own action
+    bob = client.post("/api/elements/combine", json={**body, "element2_id": 3, "player_name": "bob"}, headers={"Idempotency-Key": "combine-1"})
+    assert bob.status_code == 200 and "Idempotent-Replayed" not in bob.headers
+    assert bob.json()["result_id"] != first.json()["result_id"]
+    assert len(llm.calls) == 2
@@ -0,0 +1,108 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+from app.models.element import DBElement, PlayerStats, element_combinations, player_elements
+from app.services.element_cache import recipe_cache
+from app.services.generation_queue import GenerationQueue
+from app.services.player_cache import player_cache
+
+def make_queue(generate):
+    """A generation queue on a fresh in-memory database holding Water and Fire."""
+    player_cache.clear()
+    recipe_cache.clear()
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    db.add_all([DBElement(id=1, name="Water", language="en"), DBElement(id=2, name="Fire", language="en")])
+    db.commit()
+    return GenerationQueue(generate, session_factory=Session, workers=1), db
+
+def unlocked_by(db, player_name):
+    rows = db.query(player_elements.c.element_id).join(
+        PlayerStats, PlayerStats.id == player_elements.c.player_id
+    ).filter(PlayerStats.player_name == player_name)
+    return [row.element_id for row in rows]
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.status in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_concurrent_submits_for_a_pair_share_one_job():
+    release = threading.Event()
+    calls = []
+
+    def generate(element1, element2, lang, prompt_name):
+        calls.append((element1, element2))
+        release.wait(5)
+        return {"result": "Steam", "emoji": "♨️"}
+
+    generation_queue, db = make_queue(generate)
+    jobs = []
+    threads = [
+        threading.Thread(target=lambda name=name: jobs.append(
+            generation_queue.submit(1, 2, "Water", "Fire", player_name=name)
+        ))
+        for name in ("alice", "bob")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The reversed pair is the same combination
+    jobs.append(generation_queue.submit(2, 1, "Fire", "Water", player_name="carol"))
+    release.set()
+    generation_queue.shutdown()
+
+    assert len({job.id for job in jobs}) == 1
+    assert calls == [("Water", "Fire")]
+    job = jobs[0]
+    assert job.status == "completed" and job.result["result"]["name"] == "Steam"
+    for name in ("alice", "bob", "carol"):
+        assert unlocked_by(db, name) == [job.result["result_id"]]
+
+def test_job_stays_joinable_until_the_recipe_is_committed():
+    calls = []
+
+    def generate(element1, element2, lang, prompt_name):
+        calls.append((element1, element2))
+        return {"result": "Steam", "emoji": "♨️"}
+
+    generation_queue, db = make_queue(generate)
+    joined = []
+    session_factory = generation_queue.session_factory
+
+    def session_joined_during_commit():
+        session = session_factory()
+
+        @event.listens_for(session, "before_commit")
+        def join(session):
+            # A request for the same pair arriving while the worker commits
+            if not joined:
+                joined.append(generation_queue.submit(1, 2, "Water", "Fire", player_name="bob"))
+
+        return session
+
+    generation_queue.session_factory = session_joined_during_commit
+    job = generation_queue.submit(1, 2, "Water", "Fire", player_name="alice")
+    wait_for(job)
+    generation_queue.shutdown()
+
+    assert joined[0] is job
+    assert calls == [("Water", "Fire")]
+    assert db.query(func.count()).select_from(element_combinations).scalar() == 1
+    assert unlocked_by(db, "bob") == [job.result["result_id"]]
+    assert generation_queue.find(1, 2) is None
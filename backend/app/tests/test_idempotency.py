@@ -0,0 +1,75 @@
+import sys
+import threading
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.services.idempotency import IdempotencyStore
+
+def test_repeated_key_replays_the_first_response():
+    store = IdempotencyStore()
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return Response(content=f"result {len(calls)}", headers={"ETag": "first"})
+
+    first = store.run("/combine", "key-1", "body", handler)
+    replay = store.run("/combine", "key-1", "body", handler)
+
+    assert calls == [1]
+    assert replay.body == first.body == b"result 1"
+    assert replay.headers["ETag"] == "first"
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    with pytest.raises(HTTPException) as error:
+        store.run("/combine", "key-1", "other body", handler)
+    assert error.value.status_code == 422
+
+def test_running_requests_are_not_evicted():
+    store = IdempotencyStore(max_keys=1, wait=5)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append("slow")
+        started.set()
+        release.wait(5)
+        return Response(content="slow")
+
+    thread = threading.Thread(target=store.run, args=("/combine", "running", "body", slow))
+    thread.start()
+    started.wait(5)
+    # More keys than max_keys while the first request runs
+    store.run("/combine", "other-1", "body", lambda: Response(content="1"))
+    store.run("/combine", "other-2", "body", lambda: Response(content="2"))
+    assert len(store) == 2
+
+    release.set()
+    thread.join()
+    # The retry replays the first attempt instead of running it again
+    assert store.run("/combine", "running", "body", slow).body == b"slow"
+    assert calls == ["slow"]
+
+def test_waiting_retries_are_bounded():
+    store = IdempotencyStore(wait=0.05, max_waiters=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return Response(content="slow")
+
+    thread = threading.Thread(target=store.run, args=("/combine", "key", "body", slow))
+    thread.start()
+    started.wait(5)
+    with pytest.raises(HTTPException) as error:
+        store.run("/combine", "key", "body", slow)
+    release.set()
+    thread.join()
+
+    assert error.value.status_code == 409
+    assert error.value.headers["Retry-After"] == "1"
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).parent.parent.parent
+
+# Cumulative import time allowed for `app.main`, in milliseconds
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "3000"))
+
+# Packages that must only be imported when a service is first used
+LAZY_PACKAGES = ("langchain", "langchain_core", "openai", "huggingface_hub", "redis")
+
+@pytest.fixture(scope="module")
+def app_import(tmp_path_factory):
+    """Import `app.main` in a fresh interpreter under `python -X importtime`."""
+    db_path = tmp_path_factory.mktemp("import") / "import.db"
+    # With Redis configured, the rate limiter would import redis if it were built on import
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "RATE_LIMIT_REDIS_URL": "redis://localhost:6379/0"}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+
+    # Lines look like "import time:  self [us] | cumulative | module"
+    cumulative_us = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            cumulative_us[name.strip()] = int(cumulative)
+    return cumulative_us, db_path
+
+def test_app_import_within_budget(app_import):
+    cumulative_us, _ = app_import
+    assert cumulative_us["app.main"] / 1000 < IMPORT_TIME_BUDGET_MS
+
+def test_app_import_skips_provider_sdks(app_import):
+    cumulative_us, _ = app_import
+    imported = {name.split(".")[0] for name in cumulative_us}
+    assert not imported & set(LAZY_PACKAGES)
+
+def test_app_import_does_not_touch_database(app_import):
+    _, db_path = app_import
+    assert not db_path.exists()
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.services.llm_service import LLMService
+
+class FakeInferenceClient:
+    """Streams a completion token by token, recording how far it was consumed."""
+
+    def __init__(self, tokens, error=None):
+        self.tokens = tokens
+        self.error = error
+        self.sent = []
+        self.closed = False
+
+    def text_generation(self, prompt, stream=False, **params):
+        if self.error is not None:
+            raise self.error
+        return self._generate()
+
+    def _generate(self):
+        try:
+            for token in self.tokens:
+                self.sent.append(token)
+                yield token
+        finally:
+            self.closed = True
+
+def make_service(stream_client, llm=None):
+    """An LLMService on fakes, without a provider connection."""
+    service = LLMService.__new__(LLMService)
+    service.provider, service.model_name, service.generation_params = "huggingface", "fake", {"max_new_tokens": 50}
+    service.cache_enabled = False
+    service.stream_client = stream_client
+    service.llm = llm
+    service._get_formatted_prompt = lambda *args: "prompt"
+    return service
+
+def test_huggingface_tokens_are_streamed_until_the_json_closes():
+    client = FakeInferenceClient(['{"result": "Steam",', ' "emoji": "♨️"}', " Steam is hot.", " More text."])
+    events = list(make_service(client).stream_combine_elements("Water", "Fire"))
+
+    assert [event["text"] for event in events if event["type"] == "token"] == ['{"result": "Steam",', ' "emoji": "♨️"}']
+    assert events[-1]["result"]["result"] == "Steam"
+    # The stream was closed before the trailing text was requested
+    assert client.sent == ['{"result": "Steam",', ' "emoji": "♨️"}'] and client.closed
+
+def test_models_that_cannot_stream_send_one_token():
+    client = FakeInferenceClient([], error=ValueError("not served via TGI"))
+    events = list(make_service(client, llm=lambda prompt: '{"result": "Steam", "emoji": "♨️"}').stream_combine_elements("Water", "Fire"))
+
+    assert [event["type"] for event in events] == ["token", "result"]
+    assert events[-1]["result"]["result"] == "Steam"
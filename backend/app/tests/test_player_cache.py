@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+from app.models.element import PlayerStats
+from app.services.player_cache import PlayerCache, ensure_player, get_player_id, player_cache
+
+def make_session():
+    """A session on a fresh in-memory database, with a list collecting its SELECTs."""
+    player_cache.clear()
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    selects = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)(), selects
+
+def test_cache_expires_known_and_unknown_names():
+    cache = PlayerCache(ttl=60, negative_ttl=0)
+    cache.put("alice", 1)
+    cache.put("nobody", None)
+
+    assert cache.get("alice") == (True, 1)
+    # A zero TTL disables negative caching
+    assert cache.get("nobody") == (False, None)
+
+def test_created_players_are_cached_only_after_commit():
+    db, selects = make_session()
+
+    assert get_player_id(db, "alice") is None
+    player_id = ensure_player(db, "alice")
+    assert get_player_id(db, "alice") == player_id
+    assert player_cache.get("alice") == (True, None)
+
+    db.commit()
+    selects.clear()
+    assert ensure_player(db, "alice") == player_id
+    assert selects == []
+
+    ensure_player(db, "bob")
+    db.rollback()
+    assert player_cache.get("bob") == (True, None)
+
+def test_players_created_by_another_transaction_are_cached_only_after_commit(tmp_path):
+    player_cache.clear()
+    engine = create_engine(f"sqlite:///{tmp_path / 'players.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    assert get_player_id(db, "bob") is None
+
+    # Another worker creates bob between the lookup and the insert
+    with Session() as other:
+        other.add(PlayerStats(player_name="bob"))
+        other.commit()
+    player_id = ensure_player(db, "bob")
+    assert player_cache.get("bob") == (True, None)
+    db.rollback()
+    assert player_cache.get("bob") == (True, None)
+
+    assert ensure_player(db, "bob") == player_id
+    db.commit()
+    assert player_cache.get("bob") == (True, player_id)
+    db.close()
+    engine.dispose()
@@ -0,0 +1,46 @@
+import json
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.services.llm_service import LLMService
+from app.services.prompt_service import VERSION_KEY, PromptService
+
+def test_saves_are_versioned_and_seen_by_other_instances(tmp_path):
+    writer = PromptService(str(tmp_path), reload_interval=0)
+    reader = PromptService(str(tmp_path), reload_interval=0)
+    version = reader.get_version("en")
+
+    assert writer.add_prompt("en", "short", "{element1} + {element2}") == version + 1
+    assert reader.get_version("en") == version + 1
+    assert reader.format_prompt("en", "short", "Fire", "Water") == "Fire + Water"
+
+    # A save by the reader keeps the writer's prompt instead of overwriting the file with its own copy
+    reader.add_prompt("en", "other", "{element1}")
+    stored = json.loads((tmp_path / "en.json").read_text(encoding="utf-8"))
+    assert stored[VERSION_KEY] == version + 2
+    assert {"short", "other"} <= set(stored)
+    assert list(tmp_path.glob("*.tmp")) == []
+
+def test_edited_templates_are_not_answered_from_the_llm_memory_cache(tmp_path):
+    prompts = PromptService(str(tmp_path), reload_interval=0)
+    prompts.add_prompt("en", "default", "{element1} + {element2}")
+    llm = LLMService.__new__(LLMService)
+    llm.cache_enabled, llm.memory_cache, llm.memory_cache_lock = False, OrderedDict(), threading.Lock()
+    llm.prompt_service, llm.use_prompt_service = prompts, True
+    sent = []
+    llm._get_llm_response = lambda prompt: sent.append(prompt) or '{"result": "Steam", "emoji": "♨️"}'
+
+    llm.combine_elements("Water", "Fire")
+    assert llm.is_cached("Water", "Fire")
+    llm.combine_elements("Water", "Fire")
+    # Saved by another instance and picked up by the hot reload
+    PromptService(str(tmp_path)).add_prompt("en", "default", "Combine {element1} and {element2}")
+    assert not llm.is_cached("Water", "Fire")
+    assert llm.combine_elements("Water", "Fire")["result"] == "Steam"
+
+    assert sent == ["Water + Fire", "Combine Water and Fire"]
@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.services.prompt_stats import compare_prompts, mcnemar_exact, percentile, wilcoxon_signed_rank
+
+def make_case(key: str, success: bool, latency_ms: float):
+    return {"case_key": key, "success": success, "latency_ms": latency_ms, "completion_tokens": 10}
+
+def test_percentile_interpolates():
+    values = [10, 20, 30, 40, 50]
+    assert percentile(values, 50) == 30
+    assert percentile(values, 95) == pytest.approx(48)
+    assert percentile([], 50) is None
+
+def test_mcnemar_only_counts_discordant_cases():
+    assert mcnemar_exact(0, 0) == 1.0
+    assert mcnemar_exact(3, 3) == 1.0
+    assert mcnemar_exact(0, 6) == pytest.approx(2 / 64)
+
+def test_wilcoxon_needs_enough_pairs():
+    assert wilcoxon_signed_rank([1, 2, 3]) is None
+    assert wilcoxon_signed_rank([1, 2, 3, 4, 5, 6, 7, 8]) < 0.05
+    assert wilcoxon_signed_rank([1, -2, 3, -4, 5, -6, 7, -8]) > 0.5
+
+def test_compare_prompts_pairs_cases_by_key():
+    cases_a = [make_case(str(i), True, 100 + i) for i in range(10)]
+    cases_b = [make_case(str(i), i % 2 == 0, 50 + i) for i in range(12)]
+
+    comparison = compare_prompts(cases_a, cases_b)
+
+    assert comparison["paired_cases"] == 10
+    assert comparison["success"] == {"only_a": 5, "only_b": 0, "p_value": pytest.approx(2 / 32)}
+    assert comparison["latency_ms"]["median_difference"] == 50
+    assert comparison["latency_ms"]["p_value"] < 0.01
@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from app.services.prompt_cassette import Cassette
+from app.services.prompt_results import PromptResultStore
+from app.services.prompt_service import PromptService
+from app.services.prompt_tester import PromptTester
+
+class FakeLLMService:
+    """Answers every prompt with Steam, counting the calls."""
+
+    provider, model_name = "fake", "fake-model"
+
+    def __init__(self):
+        self.generation_params = {"temperature": 0.5}
+        self.calls = 0
+
+    def _get_llm_response(self, prompt):
+        self.calls += 1
+        return '{"result": "Steam", "emoji": "♨️"}'
+
+def test_stored_results_are_reused_until_generation_params_change(tmp_path):
+    prompts = PromptService(str(tmp_path / "prompts"))
+    prompts.add_prompt("en", "default", "{element1} + {element2}")
+    llm = FakeLLMService()
+    tester = PromptTester(
+        prompt_service=prompts, llm_service=llm, requests_per_minute=0,
+        result_store=PromptResultStore(str(tmp_path / "results.db")),
+        cassette=Cassette(str(tmp_path / "cassette.jsonl"), mode="off"),
+    )
+    tester.test_cases = [("Water", "Fire", "Steam"), ("Earth", "Fire", "Lava")]
+
+    tester.test_prompt("en", "default")
+    assert tester.test_prompt("en", "default")["reused"] == 2
+    assert llm.calls == 2
+
+    llm.generation_params["temperature"] = 0.9
+    assert tester.test_prompt("en", "default")["reused"] == 0
+    assert llm.calls == 4
@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+from app.db.init_db import LANGUAGE_BASIC_ELEMENTS, add_basic_elements_to_player, backfill_basic_elements
+from app.models.element import DBElement, PlayerStats, player_elements
+from app.services.player_cache import ensure_player, player_cache
+
+def make_session():
+    """A session on a fresh in-memory database holding the basic elements."""
+    player_cache.clear()
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for elements in LANGUAGE_BASIC_ELEMENTS.values():
+        db.add_all(DBElement(**element) for element in elements)
+    db.commit()
+    return db
+
+def inventory(db, player_name):
+    rows = db.execute(
+        select(player_elements.c.element_id, player_elements.c.seq)
+        .join(PlayerStats, PlayerStats.id == player_elements.c.player_id)
+        .where(PlayerStats.player_name == player_name)
+        .order_by(player_elements.c.element_id)
+    )
+    return [tuple(row) for row in rows]
+
+def test_adding_basic_elements_is_idempotent_and_versioned():
+    db = make_session()
+
+    assert add_basic_elements_to_player(db, "alice", ["en"]) == 4
+    assert add_basic_elements_to_player(db, "alice") == 4
+    assert add_basic_elements_to_player(db, "alice") == 0
+    db.commit()
+
+    player = db.query(PlayerStats).filter(PlayerStats.player_name == "alice").one()
+    assert (player.inventory_version, player.elements_unlocked) == (2, 8)
+    # Each call stamps only the rows it added with the version it created
+    assert [seq for _, seq in inventory(db, "alice")] == [1, 1, 1, 1, 2, 2, 2, 2]
+
+def test_backfill_only_adds_missing_elements():
+    db = make_session()
+    db.add_all(PlayerStats(player_name=f"player{i}") for i in range(5))
+    db.commit()
+    add_basic_elements_to_player(db, "player0")
+    db.commit()
+
+    progress = []
+    assert backfill_basic_elements(db, chunk_size=2, progress=lambda *args: progress.append(args)) == (5, 32)
+    assert progress[-1] == (5, 32)
+    assert len(progress) == 3
+    assert backfill_basic_elements(db, chunk_size=2) == (5, 0)
+    assert len(inventory(db, "player4")) == 8
+
+def test_players_created_on_first_use_get_basic_elements():
+    db = make_session()
+
+    player_id = ensure_player(db, "alice")
+    db.commit()
+    assert len(inventory(db, "alice")) == 8
+    assert db.get(PlayerStats, player_id).inventory_version == 1
+    # An existing player is only looked up
+    assert ensure_player(db, "alice") == player_id
+    assert db.get(PlayerStats, player_id).inventory_version == 1
@@ -0,0 +1,124 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+from app.db.init_db import create_tables, upgrade_schema
+from app.db.versions import bump_inventory_version
+from app.models.element import DiscoveryHistory, PlayerStats, element_combinations, player_elements
+from app.scripts.migrate_player_ids import migrate
+
+# The tables as created by the first release, before any columns were added
+BASELINE_SCHEMA = [
+    """CREATE TABLE elements (
+        id INTEGER NOT NULL, name VARCHAR, emoji VARCHAR, is_basic BOOLEAN, language VARCHAR,
+        created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), created_by VARCHAR,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE player_stats (
+        id INTEGER NOT NULL, player_name VARCHAR, elements_discovered INTEGER, elements_unlocked INTEGER,
+        combinations_tried INTEGER, last_active DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), successful_combinations INTEGER,
+        failed_combinations INTEGER,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE UNIQUE INDEX ix_player_stats_player_name ON player_stats (player_name)",
+    """CREATE TABLE element_combinations (
+        element1_id INTEGER NOT NULL, element2_id INTEGER NOT NULL, result_id INTEGER NOT NULL,
+        language VARCHAR NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), discovered_by VARCHAR,
+        PRIMARY KEY (element1_id, element2_id, result_id, language)
+    )""",
+    """CREATE TABLE player_elements (
+        player_name VARCHAR NOT NULL, element_id INTEGER NOT NULL,
+        unlocked_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        PRIMARY KEY (player_name, element_id)
+    )""",
+    """CREATE TABLE discovery_history (
+        id INTEGER NOT NULL, element_id INTEGER, player_name VARCHAR,
+        discovered_at DATETIME DEFAULT (CURRENT_TIMESTAMP), is_first_discovery BOOLEAN,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX ix_discovery_history_player_name ON discovery_history (player_name)",
+]
+
+def make_baseline_engine():
+    """An in-memory database with the first release's schema and a player."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO player_stats (player_name, elements_unlocked) VALUES ('alice', 4)"))
+        connection.execute(text("INSERT INTO player_elements (player_name, element_id) VALUES ('alice', 1)"))
+    return engine
+
+def upgrade(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+
+def test_upgrade_adds_inventory_version_to_existing_players():
+    engine = make_baseline_engine()
+    upgrade(engine)
+    # Running it again finds nothing to do
+    upgrade(engine)
+
+    db = sessionmaker(bind=engine)()
+    player = db.query(PlayerStats).filter(PlayerStats.player_name == "alice").one()
+    assert (player.inventory_version, player.inventory_updated_at) == (0, None)
+    assert bump_inventory_version(db, player.id) == 1
+
+    index_names = {index["name"] for index in inspect(engine).get_indexes("elements")}
+    assert "ix_elements_language_id" in index_names
+
+def test_upgrade_adds_seq_to_existing_unlocks():
+    engine = make_baseline_engine()
+    upgrade(engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT player_name, element_id, seq FROM player_elements")).all() == [("alice", 1, 0)]
+
+def test_player_id_migration_runs_on_a_baseline_database():
+    engine = make_baseline_engine()
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO elements (id, name, language) VALUES (1, 'Water', 'en'), (2, 'Fire', 'en'), (3, 'Steam', 'en')"))
+        # "bob" only appears by name, without a player_stats row
+        connection.execute(text("INSERT INTO player_elements (player_name, element_id) VALUES ('alice', 3), ('bob', 1)"))
+        connection.execute(text("INSERT INTO discovery_history (element_id, player_name, is_first_discovery) VALUES (3, 'alice', 1), (2, NULL, 0)"))
+        connection.execute(text("INSERT INTO element_combinations (element1_id, element2_id, result_id, language, discovered_by) VALUES (1, 2, 3, 'en', 'alice')"))
+
+    db = sessionmaker(bind=engine)()
+    migrate(db, chunk_size=1)
+    # An interrupted or repeated run picks up where it left off
+    migrate(db, chunk_size=1)
+
+    players = {player.player_name: player.id for player in db.query(PlayerStats)}
+    assert set(players) == {"alice", "bob"}
+    assert db.query(player_elements.c.player_id, player_elements.c.element_id, player_elements.c.seq).order_by(
+        player_elements.c.player_id, player_elements.c.element_id
+    ).all() == [(players["alice"], 1, 0), (players["alice"], 3, 0), (players["bob"], 1, 0)]
+    assert [row.player_id for row in db.query(DiscoveryHistory).order_by(DiscoveryHistory.id)] == [players["alice"], None]
+    assert db.query(element_combinations.c.discovered_by_id).scalar() == players["alice"]
+
+    columns = {column["name"] for column in inspect(engine).get_columns("discovery_history")}
+    assert "player_name" not in columns
+    index_names = {index["name"] for index in inspect(engine).get_indexes("player_elements")}
+    assert "ix_player_elements_player_id_seq" in index_names
+
+def test_startup_refuses_players_keyed_by_name():
+    engine = make_baseline_engine()
+    with pytest.raises(RuntimeError, match="migrate_player_ids"):
+        create_tables(engine)
+    # Nothing was changed before the check
+    assert "language_versions" not in inspect(engine).get_table_names()
+
+    migrate(sessionmaker(bind=engine)(), chunk_size=1)
+    create_tables(engine)
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+from app.db.versions import bump_language_version, get_language_version
+
+def test_first_language_version_tolerates_a_concurrent_insert():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    first, second = Session(), Session()
+    assert get_language_version(second, "de") == (0, None)
+    bump_language_version(first, "de")
+    first.commit()
+    # The second session also saw no version row, but its insert is skipped
+    bump_language_version(second, "de")
+    second.commit()
+
+    version, updated_at = get_language_version(second, "de")
+    assert version == 2 and updated_at is not None
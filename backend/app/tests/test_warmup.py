@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.services import override_service, reset_services
+from app.db.database import Base
+from app.models.element import DBElement, element_combinations
+from app.services.element_cache import recipe_cache
+from app.services.prompt_service import PromptService
+from app.services.warmup import warm_up
+
+def test_warm_up_preloads_recipes_of_basic_elements(tmp_path):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    db.add_all([
+        DBElement(id=1, name="Water", is_basic=True, language="en"),
+        DBElement(id=2, name="Fire", is_basic=True, language="en"),
+        DBElement(id=3, name="Steam", language="en"),
+        DBElement(id=4, name="Cloud", language="en"),
+    ])
+    db.execute(insert(element_combinations), [
+        {"element1_id": 1, "element2_id": 2, "result_id": 3, "language": "en"},
+        {"element1_id": 1, "element2_id": 3, "result_id": 4, "language": "en"},
+    ])
+    db.commit()
+    db.close()
+
+    recipe_cache.clear()
+    reset_services()
+    override_service("prompt_service", PromptService(str(tmp_path)))
+    override_service("llm_service", object())
+    stats = warm_up(Session, top_recipes=0)
+    reset_services()
+
+    assert stats["basic_recipes"] == 1
+    assert recipe_cache.get("en", (1, 2)).name == "Steam"
+    # Only the top recipes, none here, are loaded besides those of basic elements
+    assert recipe_cache.get("en", (1, 3)) is None